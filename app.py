@@ -1,8 +1,12 @@
 # app.py
-from fastapi import FastAPI, HTTPException
+from typing import Optional
+from fastapi import FastAPI, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
-from worker.run_job import run_job_id  # sua função existente
+from worker.run_job import run_job_id, SCHEDULER  # sua função existente
+from worker.llm_gateway import GATEWAY
+from worker.profiles import get_profile
 
 app = FastAPI()
 
@@ -23,16 +27,28 @@ app.add_middleware(
 
 class JobBody(BaseModel):
     job_id: str
+    extraction_profile: Optional[str] = None  # fast | balanced | accurate (vence jobs/job_items)
 
 @app.get("/healthz")
 def healthz():
     return {"ok": True}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    # gateway LLM (limite de concorrência, retries, 429/5xx, circuit breaker) e fila de itens, para o Prometheus
+    return GATEWAY.metrics_text() + SCHEDULER.metrics_text()
+
 @app.post("/process-job")
-def process_job(body: JobBody):
+def process_job(body: JobBody, x_profile: Optional[str] = Header(None)):
+    if body.extraction_profile:
+        try:
+            get_profile(body.extraction_profile)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
     try:
         # roda seu worker síncrono. Se for demorado, considere colocar em thread/task queue.
-        run_job_id(body.job_id)
+        # x-profile: cpu | 1 -> flamegraph (e alocações) de cada documento ao lado do resultado
+        run_job_id(body.job_id, profile=x_profile, extraction_profile=body.extraction_profile)
         return {"ok": True, "job_id": body.job_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
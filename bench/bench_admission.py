@@ -0,0 +1,84 @@
+# bench/bench_admission.py — admissão do escalonador com mistura de carteiras pequenas e documentos pesados:
+# teto fixo de itens (antes: SCHED_MAX_INFLIGHT=3, sem peso) x admissão ponderada por memória/CPU + RSS.
+# Itens simulados: "dormem" o custo estimado (escala --scale) e ocupam memória num RSS simulado, usado
+# pela admissão e para medir o pico; o pesado usa --heavy-real-mb, bem acima do estimado (caches do MuPDF)
+#   python -m bench.bench_admission --small 60 --heavy 6
+import os, sys, time, random, argparse, threading, statistics
+
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from worker.preflight import est_cost, est_weight  # noqa: E402
+from worker.scheduler import ThreadScheduler, Admission, SCHED_MEM_BUDGET_MB, SCHED_RSS_LIMIT_MB  # noqa: E402
+
+IDLE_RSS_MB = 120.0  # worker parado (imports, PyMuPDF, cliente HTTP)
+
+
+def make_items(small: int, heavy: int, seed: int = 0):
+    rng = random.Random(seed)
+    items = [{"id": f"carteira-{i}", "pages": 1, "words": 120, "has_text_layer": True, "est_llm_calls": 2,
+              "file_bytes": 50_000} for i in range(small)]
+    items += [{"id": f"pesado-{i}", "pages": 300, "words": 120_000, "has_text_layer": True, "est_llm_calls": 7,
+               "file_bytes": 7 * 1024 * 1024} for i in range(heavy)]
+    rng.shuffle(items)
+    return items
+
+
+def run(items, sched_kwargs, scale, weighted, heavy_real_mb, seed=0):
+    rng = random.Random(seed)
+    lock = threading.Lock()
+    state = {"rss": IDLE_RSS_MB, "peak": IDLE_RSS_MB}
+    adm = sched_kwargs.pop("admission", None)
+    if adm is not None:
+        adm.rss = lambda: state["rss"]
+    sched = ThreadScheduler(admission=adm, **sched_kwargs)
+    lat = {}
+    t0 = time.perf_counter()
+
+    def work(it):
+        # memória real: carteira = estimada ±30%; pesado = --heavy-real-mb (a estimativa fica curta)
+        mem = heavy_real_mb if it["id"].startswith("pesado") else est_weight(it)[0] * rng.uniform(0.7, 1.3)
+        with lock:
+            state["rss"] += mem
+            state["peak"] = max(state["peak"], state["rss"])
+        time.sleep(est_cost(it) * scale)
+        with lock:
+            state["rss"] -= mem
+        lat[it["id"]] = time.perf_counter() - t0
+
+    futs = [sched.submit("lote", est_cost(it), it, work, weight=est_weight(it) if weighted else None) for it in items]
+    for f in futs:
+        f.result()
+    small = [v for k, v in lat.items() if k.startswith("carteira")]
+    return {"makespan_s": time.perf_counter() - t0, "peak_rss_mb": state["peak"],
+            "small_p50_s": statistics.median(small), "small_p95_s": sorted(small)[int(0.95 * (len(small) - 1))]}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--small", type=int, default=60)
+    ap.add_argument("--heavy", type=int, default=6)
+    ap.add_argument("--heavy-real-mb", type=float, default=250.0)
+    ap.add_argument("--cpus", type=float, default=2.0, help="SCHED_CPU_BUDGET simulado")
+    ap.add_argument("--scale", type=float, default=0.05, help="segundos reais por unidade de custo estimado")
+    args = ap.parse_args()
+
+    items = make_items(args.small, args.heavy)
+    w = {it["id"].split("-")[0]: est_weight(it) for it in items}
+    print(f"{args.small} carteiras (1 pág., 50 KB) + {args.heavy} pesados (300 pág., 7 MB, {args.heavy_real_mb:.0f} MB "
+          f"reais); pesos (MB, CPU): {w}; RSS ocioso {IDLE_RSS_MB:.0f} MB, limite {SCHED_RSS_LIMIT_MB:.0f} MB")
+    cases = (
+        ("teto fixo 3", {"max_inflight": 3, "admission": Admission(float("inf"), float("inf"), 0)}, False),
+        ("teto fixo 8", {"max_inflight": 8, "admission": Admission(float("inf"), float("inf"), 0)}, False),
+        (f"ponderada (teto 8, mem {SCHED_MEM_BUDGET_MB:.0f} MB, {args.cpus:g} CPU)",
+         {"max_inflight": 8, "admission": Admission(cpu_budget=args.cpus)}, True),
+    )
+    for label, kw, weighted in cases:
+        adm = kw["admission"]
+        r = run(items, dict(kw), args.scale, weighted, args.heavy_real_mb)
+        print(f"  [{label:38s}] total={r['makespan_s']:6.2f} s | pico RSS simulado={r['peak_rss_mb']:6.0f} MB "
+              f"| carteiras p50={r['small_p50_s']:5.2f} s p95={r['small_p95_s']:5.2f} s | {adm.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# bench/bench_analysis_cache.py — re-execução com schema editado: cache de análise frio x quente
+#   python -m bench.bench_analysis_cache --pages 3
+# Schema A roda com cache frio; depois o schema B (um campo a mais, um renomeado) roda sem cache e
+# com o cache gravado por A. Os resultados de B precisam ser idênticos nos dois casos. Sem LLM.
+import os, sys, time, shutil, argparse, tempfile, statistics
+
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+os.environ["ANALYSIS_CACHE_DIR"] = tempfile.mkdtemp(prefix="bench_analysis_")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import worker.anchors_reading_span as pipeline  # noqa: E402
+from bench.fixtures import make_pdf, KINDS  # noqa: E402
+
+
+def edited(schema: dict) -> dict:
+    keys = list(schema)
+    out = {("nome_completo" if k == keys[0] else k): v for k, v in schema.items()}
+    out["observacao"] = "Observação"
+    return out
+
+
+def timed(pdf, schema, store):
+    saved = pipeline.ANALYSIS_STORE
+    pipeline.ANALYSIS_STORE = store
+    try:
+        t0 = time.perf_counter()
+        final, meta = pipeline.process_pdf_with_meta(pdf, schema)
+        return (time.perf_counter() - t0) * 1000, final, meta["analysis_cache"]["pages_hit"]
+    finally:
+        pipeline.ANALYSIS_STORE = saved
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", type=int, default=3)
+    ap.add_argument("--docs", type=int, default=4)
+    args = ap.parse_args()
+    pipeline.ENABLE_LLM_FALLBACK = False
+    store = pipeline.ANALYSIS_STORE
+    try:
+        for kind, (_, schema, _) in KINDS.items():
+            cold, nocache, warm, mismatches = [], [], [], 0
+            for n in range(args.docs):
+                pdf = make_pdf(kind, n, pages=args.pages)
+                cold.append(timed(pdf, schema, store)[0])
+                ms_off, ref, _ = timed(pdf, edited(schema), None)
+                ms_on, got, hits = timed(pdf, edited(schema), store)
+                nocache.append(ms_off)
+                warm.append(ms_on)
+                mismatches += ref != got
+            print(f"[{kind} {args.pages}p] schema A (frio) {statistics.median(cold):6.0f} ms | schema B: "
+                  f"sem cache {statistics.median(nocache):6.0f} ms, cache quente {statistics.median(warm):6.0f} ms "
+                  f"(páginas do cache={hits}) | resultados diferentes={mismatches}")
+        size = sum(e.stat().st_size for e in os.scandir(store.root))
+        print(f"cache: {len(os.listdir(store.root))} entradas, {size / 1024:.0f} KB em {store.root}")
+    finally:
+        shutil.rmtree(os.environ["ANALYSIS_CACHE_DIR"], ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# bench/bench_gateway.py — gateway LLM (AIMD, retry, circuit breaker) contra o stand-in com falhas injetadas
+#   python -m bench.bench_gateway --docs 24 --workers 12
+# Fases: saudável -> tempestade de 429/5xx -> queda total (breaker abre) -> recuperação (half-open fecha)
+import os, sys, time, argparse, statistics
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+os.environ.setdefault("LLM_BREAKER_COOLDOWN_S", "2")
+os.environ.setdefault("LLM_RETRY_CAP_S", "1")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import worker.anchors_reading_span as pipeline  # noqa: E402
+from worker.deadline import Deadline  # noqa: E402
+GATEWAY = pipeline.GATEWAY  # a instância que a pipeline usa (worker.llm_gateway ou llm_gateway)
+from bench.fixtures import make_pdf, OAB_SCHEMA, TELA_SCHEMA  # noqa: E402
+from bench.fake_llm_server import serve  # noqa: E402
+
+PHASES = [
+    ("saudavel", {"outage": False, "rate_limit_rate": 0.0, "error_rate": 0.0}),
+    ("429+5xx", {"outage": False, "rate_limit_rate": 0.3, "error_rate": 0.2}),
+    ("queda", {"outage": True}),
+    ("recuperacao", {"outage": False, "rate_limit_rate": 0.0, "error_rate": 0.0}),
+]
+
+def run_phase(docs, workers, deadline_s):
+    def one(i):
+        kind, schema = (("oab", OAB_SCHEMA), ("tela", TELA_SCHEMA))[i % 2]
+        t0 = time.perf_counter()
+        final, meta = pipeline.process_pdf_with_meta(make_pdf(kind, i), schema, deadline=Deadline(deadline_s))
+        return (time.perf_counter() - t0) * 1000, meta["llm"]["by_outcome"], sum(v is not None for v in final.values())
+    with ThreadPoolExecutor(workers) as ex:
+        return list(ex.map(one, range(docs)))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--docs", type=int, default=24)
+    ap.add_argument("--workers", type=int, default=12)
+    ap.add_argument("--deadline", type=float, default=10.0)
+    ap.add_argument("--capacity", type=int, default=4)
+    args = ap.parse_args()
+
+    server, fake, url = serve(0, latency_ms=250, capacity=args.capacity)
+    from openai import OpenAI
+    pipeline.set_llm_client(OpenAI(base_url=url, api_key="test", max_retries=0))
+
+    for name, cfg in PHASES:
+        fake.cfg.update(cfg)
+        if name == "recuperacao":
+            time.sleep(float(os.environ["LLM_BREAKER_COOLDOWN_S"]) + 0.2)
+        t0 = time.perf_counter()
+        res = run_phase(args.docs, args.workers, args.deadline)
+        wall = time.perf_counter() - t0
+        lat = sorted(r[0] for r in res)
+        outcomes = {}
+        for _, o, _ in res:
+            for k, v in o.items():
+                outcomes[k] = outcomes.get(k, 0) + v
+        m = GATEWAY.metrics()
+        print(f"[{name}] wall={wall:.1f}s p50={statistics.median(lat):.0f}ms p95={lat[int(0.95*(len(lat)-1))]:.0f}ms "
+              f"campos/doc={statistics.mean(r[2] for r in res):.1f} outcomes={outcomes}")
+        print(f"    gateway: state={m['state']} limit={m['concurrency_limit']} retries={m['retries']} "
+              f"429={m['rate_limited']} 5xx={m['server_errors']} short_circuited={m['short_circuited']} "
+              f"opens={m['breaker_opens']} | server: {dict((k, fake.stats[k]) for k in ('requests', '429', '500', '503', 'max_inflight'))}")
+    print("\n" + GATEWAY.metrics_text())
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
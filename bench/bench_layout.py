@@ -0,0 +1,83 @@
+# bench/bench_layout.py — clusters de layout dentro de um job: ficha cadastral densa (mesmo gerador, valores
+# diferentes) processada com e sem o LayoutCache: heurísticas por documento (ms), chaves semeadas x resolvidas
+# e se o resultado é idêntico ao da resolução completa
+#   python -m bench.bench_layout --docs 40
+import os, sys, time, argparse, statistics
+
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+os.environ.setdefault("ANALYSIS_CACHE", "0")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import fitz  # noqa: E402
+import worker.anchors_reading_span as pipeline  # noqa: E402
+from bench.fixtures import make_pdf, OAB_SCHEMA  # noqa: E402
+from worker import layout  # noqa: E402
+
+# ficha densa: rótulos em duas colunas (rótulo: valor); algumas chaves do schema não aparecem literais
+# no documento (caem nas âncoras genéricas), outras não existem (ausentes)
+_FIELDS = [
+    ("Nome Completo", "nome_completo"), ("CPF", "cpf"), ("RG", "rg"), ("Órgão Emissor", "orgao_emissor"),
+    ("Data de Nascimento", "data_nascimento"), ("Naturalidade", "naturalidade"), ("Nacionalidade", "nacionalidade"),
+    ("Estado Civil", "estado_civil"), ("Nome da Mãe", "nome_mae"), ("Nome do Pai", "nome_pai"),
+    ("E-mail", "email"), ("Celular", "telefone_celular"), ("CEP", "cep"), ("Logradouro", "logradouro"),
+    ("Número", "numero"), ("Complemento", "complemento"), ("Bairro", "bairro"), ("Cidade", "cidade"),
+    ("UF", "uf"), ("Profissão", "profissao"), ("Empregador", "empregador"), ("Cargo", "cargo"),
+    ("Renda Mensal", "renda_mensal"), ("Banco", "banco"), ("Agência", "agencia"), ("Conta", "conta"),
+]
+FORM_SCHEMA = {k: None for _, k in _FIELDS}
+FORM_SCHEMA.update({"data_admissao": None, "chave_pix": None, "nome_social": None, "observacoes": None})
+
+
+def form_truth(n: int) -> dict:
+    """Valores impressos na ficha n (chaves fora da ficha: None)."""
+    out = {k: None for k in FORM_SCHEMA}
+    out.update({key: f"{key.upper()[:10]} {n * 7 + i}" for i, (_, key) in enumerate(_FIELDS)})
+    return out
+
+
+def make_form(n: int) -> bytes:
+    doc = fitz.open()
+    p = doc.new_page()
+    p.insert_text((40, 50), "FICHA CADASTRAL DE CLIENTE", fontsize=14, fontname="hebo")
+    for i, (label, key) in enumerate(_FIELDS):
+        x, y = (40 if i % 2 == 0 else 310), 90 + (i // 2) * 34
+        p.insert_text((x, y), f"{label}:", fontname="hebo")
+        p.insert_text((x, y + 14), f"{key.upper()[:10]} {n * 7 + i}")
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def run(pdfs, schema, cache):
+    ms, out = [], []
+    with layout.use_layouts(cache):
+        for pdf in pdfs:
+            t0 = time.perf_counter()
+            final, meta = pipeline.process_pdf_with_meta(pdf, schema, profile="fast")
+            ms.append((time.perf_counter() - t0) * 1000)
+            out.append(final)
+    return ms, out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--docs", type=int, default=40)
+    args = ap.parse_args()
+
+    cases = (("ficha densa", [make_form(n) for n in range(args.docs)], FORM_SCHEMA),
+             ("carteira OAB", [make_pdf("oab", n) for n in range(args.docs)], OAB_SCHEMA))
+    run(cases[0][1][:2], FORM_SCHEMA, None)  # aquecimento (imports, fontes)
+    print(f"{args.docs} documentos por cenário, perfil fast (só heurísticas)")
+    for name, pdfs, schema in cases:
+        base_ms, base = run(pdfs, schema, None)
+        cache = layout.LayoutCache()
+        lay_ms, got = run(pdfs, schema, cache)
+        same = sum(a == b for a, b in zip(base, got))
+        print(f"  [{name:12s}] sem reuso p50={statistics.median(base_ms):6.1f} ms | com reuso "
+              f"p50={statistics.median(lay_ms):6.1f} ms ({statistics.median(base_ms) / statistics.median(lay_ms):.2f}x) "
+              f"| resultados idênticos {same}/{len(pdfs)}")
+        print(f"  {'':14s} {cache.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# bench/bench_logging.py — custo de log por documento: print síncrono por evento vs logger estruturado em fila
+#   python -m bench.bench_logging --docs 200 --fields 12 --threads 3
+import os, sys, time, argparse, tempfile, threading, logging, statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from worker import log as wlog  # noqa: E402
+
+def _doc_events(fields: int):
+    # padrão de eventos de um documento: 1 por campo (fast-path/valor) + bulk + json + item.done
+    for i in range(fields):
+        yield "field", {"key": f"campo_{i}", "chars": 14, "ms": 3}
+    yield "bulk", {"keys": fields, "filled": fields // 2, "ms": 420}
+    yield "json", {"keys": fields, "filled": fields, "ms": 900}
+    yield "done", {"status": "done", "ms": 1500}
+
+def run_print(fd, docs, fields):
+    # antes: print() por evento com stdout sem buffer (PYTHONUNBUFFERED=1 no container) → 1 write por linha
+    out = open(fd, "w", buffering=1, closefd=False)
+    per_doc = []
+    for d in range(docs):
+        t0 = time.perf_counter()
+        for kind, f in _doc_events(fields):
+            print(f"[{kind.upper()}] doc={d} " + " ".join(f"{k}={v}" for k, v in f.items()), file=out, flush=True)
+        per_doc.append(time.perf_counter() - t0)
+    return per_doc
+
+def run_structured(docs, fields, logger):
+    per_doc = []
+    for d in range(docs):
+        t0 = time.perf_counter()
+        with wlog.log_context(job_id="bench", item_id=str(d)):
+            for kind, f in _doc_events(fields):
+                if kind == "field":
+                    wlog.log_field_event(logger, "llm.value", **f)
+                else:
+                    wlog.log_event(logger, logging.INFO, f"llm.{kind}", **f)
+        per_doc.append(time.perf_counter() - t0)
+    return per_doc
+
+def _threads(fn, n):
+    res = [None] * n
+    def w(i):
+        res[i] = fn()
+    ts = [threading.Thread(target=w, args=(i,)) for i in range(n)]
+    t0 = time.perf_counter()
+    for t in ts: t.start()
+    for t in ts: t.join()
+    return time.perf_counter() - t0, [x for r in res for x in r]
+
+def _fmt(name, wall, per_doc):
+    q = statistics.quantiles(per_doc, n=100)
+    print(f"{name:<12} wall={wall*1000:8.1f}ms  por_doc p50={q[49]*1e6:7.1f}us  p95={q[94]*1e6:7.1f}us  "
+          f"total_na_thread={sum(per_doc)*1000:7.1f}ms")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--docs", type=int, default=200)
+    ap.add_argument("--fields", type=int, default=12)
+    ap.add_argument("--threads", type=int, default=3)  # = Semaphore(3) do worker
+    ap.add_argument("--sink", choices=("pipe", "file"), default="pipe")
+    ap.add_argument("--drain-kb-per-ms", type=float, default=4.0)  # vazão do coletor de logs (pipe)
+    args = ap.parse_args()
+
+    path, stop = None, threading.Event()
+    if args.sink == "file":
+        with tempfile.NamedTemporaryFile("w", suffix=".log", delete=False) as sink:
+            path = sink.name
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND)
+    else:
+        # stdout de container: pipe lido por um coletor com vazão limitada (backpressure no write)
+        rfd, fd = os.pipe()
+        chunk = max(1, int(args.drain_kb_per_ms * 1024))
+        def drain():
+            while not stop.is_set():
+                try:
+                    if not os.read(rfd, chunk):
+                        break
+                except OSError:
+                    break
+                time.sleep(0.001)
+        threading.Thread(target=drain, daemon=True).start()
+    try:
+        wall, per = _threads(lambda: run_print(fd, args.docs, args.fields), args.threads)
+        _fmt("print", wall, per)
+
+        logger = wlog.get_logger("worker.bench")
+        wlog._listener.handlers[0].setStream(open(fd, "w", closefd=False))
+        wall, per = _threads(lambda: run_structured(args.docs, args.fields, logger), args.threads)
+        t0 = time.perf_counter()
+        wlog.flush_logs()
+        _fmt("structured", wall, per)
+        print(f"{'':<12} (drenagem do listener em background: {(time.perf_counter()-t0)*1000:.1f}ms, "
+              f"LOG_FIELD_SAMPLE={wlog.LOG_FIELD_SAMPLE})")
+    finally:
+        stop.set()
+        os.close(fd)
+        if path:
+            os.unlink(path)
+
+if __name__ == "__main__":
+    main()
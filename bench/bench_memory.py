@@ -0,0 +1,67 @@
+# bench/bench_memory.py — pico de RSS e tempo com PDF grande: bytes em memória x arquivo em disco
+#   python -m bench.bench_memory --pages 30 --concurrency 3
+# Cada cenário roda num subprocesso novo (ru_maxrss é o pico do processo inteiro). Sem LLM.
+import os, sys, json, time, argparse, tempfile, subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def child(mode: str, pdf_path: str, concurrency: int):
+    os.environ["LOG_LEVEL"] = "ERROR"
+    sys.path.insert(0, ROOT)
+    import resource
+    import worker.anchors_reading_span as pipeline
+    from bench.fixtures import OAB_SCHEMA
+    pipeline.ENABLE_LLM_FALLBACK = False
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    def one(_):
+        # modo bytes = comportamento antigo (download() inteiro em memória)
+        src = open(pdf_path, "rb").read() if mode == "bytes" else pdf_path
+        final, meta = pipeline.process_pdf_with_meta(src, OAB_SCHEMA)
+        return final, meta
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as ex:
+        res = list(ex.map(one, range(concurrency)))
+    wall = time.perf_counter() - t0
+    final, meta = res[0]
+    print(json.dumps({
+        "base_mb": round(base), "peak_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024),
+        "wall_s": round(wall, 2), "memory": meta.get("memory"), "cpf": final.get("cpf"),
+    }))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", type=int, default=30)
+    ap.add_argument("--px", type=int, default=1400)
+    ap.add_argument("--concurrency", type=int, default=3)
+    ap.add_argument("--pdf", help="usa um PDF existente em vez de gerar")
+    ap.add_argument("--child", nargs=3, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        return child(args.child[0], args.child[1], int(args.child[2]))
+
+    pdf = args.pdf
+    if not pdf:
+        from bench.fixtures import make_scanned_pdf
+        pdf = os.path.join(tempfile.gettempdir(), f"bench_scanned_{args.pages}p.pdf")
+        if not os.path.exists(pdf):
+            make_scanned_pdf(pdf, pages=args.pages, px=args.px)
+    print(f"PDF: {pdf} ({os.path.getsize(pdf) / 1e6:.0f} MB)")
+    for conc in (1, args.concurrency):
+        for mode in ("bytes", "path"):
+            out = subprocess.run([sys.executable, "-m", "bench.bench_memory", "--child", mode, pdf, str(conc)],
+                                 cwd=ROOT, capture_output=True, text=True)
+            if out.returncode:
+                print(f"[{mode} x{conc}] falhou:\n{out.stderr[-2000:]}")
+                continue
+            r = json.loads(out.stdout.strip().splitlines()[-1])
+            print(f"[{mode:5s} x{conc}] pico RSS={r['peak_mb']} MB (base {r['base_mb']} MB) wall={r['wall_s']}s "
+                  f"memory={r['memory']} cpf={r['cpf']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# bench/bench_normalize.py — normalizador determinístico (worker/normalize.py): documentos com valores em
+# formatos variados (data com ponto, telefone sem máscara, CPF só dígitos, rótulo colado) processados com o
+# bulk LLM fazendo a normalização x normalizador local: chamadas bulk, tempo por documento, campos na forma
+# canônica e, na carteira OAB, concordância com o só-LLM. O "professor" é o TeacherClient do bench_sanitizer
+# (responde o valor verdadeiro de cada campo).
+#   python -m bench.bench_normalize --docs 20 --latency-ms 300
+import os, sys, time, argparse, statistics
+
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+os.environ.setdefault("ANALYSIS_CACHE", "0")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import fitz  # noqa: E402
+import worker.anchors_reading_span as pipeline  # noqa: E402
+from bench.fixtures import make_pdf, OAB_SCHEMA  # noqa: E402
+from bench.bench_sanitizer import TeacherClient, fixture_truth  # noqa: E402
+from worker import normalize, sanitizer_model as sanitizer  # noqa: E402
+
+CADASTRO_SCHEMA = {"nome": "Nome do cliente", "cpf": "CPF", "data_nascimento": "Data de nascimento",
+                   "telefone": "Telefone", "cep": "CEP", "uf": "UF", "email": "E-mail"}
+_CPFS = ("12345678909", "11144477735", "52998224725", "39053344705")
+_LABELS = (("Nome", "nome"), ("CPF", "cpf"), ("Data de nascimento", "data_nascimento"), ("Telefone", "telefone"),
+           ("CEP", "cep"), ("UF", "uf"), ("E-mail", "email"))
+
+
+def _cadastro_values(n: int):
+    """(valores impressos, valores canônicos esperados) do cadastro n."""
+    cpf, name = _CPFS[n % len(_CPFS)], f"ANA PAULA SOUZA {'LIMA' if n % 2 else 'COSTA'}"
+    d, m, y = 1 + n % 28, 1 + n % 12, 1970 + n % 30
+    phone, cep = f"413{n % 10}3344{n % 10}4", f"8001{n % 10}000"
+    printed = {"nome": name.replace(" ", "  ", 1) + ".", "cpf": cpf, "data_nascimento": f"{d}.{m}.{y}",
+               "telefone": f"Tel.: {phone[:2]} {phone[2:6]} {phone[6:]}", "cep": cep, "uf": "PR",
+               "email": f"Cliente{n}@Exemplo.com.br"}
+    expected = {"nome": name, "cpf": f"{cpf[:3]}.{cpf[3:6]}.{cpf[6:9]}-{cpf[9:]}", "data_nascimento": f"{d:02d}/{m:02d}/{y}",
+                "telefone": f"({phone[:2]}) {phone[2:6]}-{phone[6:]}", "cep": f"{cep[:5]}-{cep[5:]}", "uf": "PR",
+                "email": f"cliente{n}@exemplo.com.br"}
+    return printed, expected
+
+
+def make_cadastro(n: int) -> bytes:
+    printed, _ = _cadastro_values(n)
+    doc = fitz.open()
+    p = doc.new_page()
+    p.insert_text((40, 50), "CADASTRO DE CLIENTE", fontsize=14, fontname="hebo")
+    for i, (label, key) in enumerate(_LABELS):
+        p.insert_text((40, 90 + i * 36), label, fontname="hebo")
+        p.insert_text((40, 104 + i * 36), printed[key])
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def run(items, client):
+    ms, results = [], []
+    for pdf, schema, truth in items:
+        client.truth = truth
+        t0 = time.perf_counter()
+        final, _ = pipeline.process_pdf_with_meta(pdf, schema, profile="balanced")
+        ms.append((time.perf_counter() - t0) * 1000)
+        results.append(final)
+    return ms, results
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--docs", type=int, default=20)
+    ap.add_argument("--latency-ms", type=float, default=300.0)
+    args = ap.parse_args()
+
+    client = TeacherClient(args.latency_ms)
+    pipeline.set_llm_client(client)
+    sanitizer.set_sanitizer(None)  # isola o normalizador do sanitizador destilado
+    items = [(make_cadastro(n), CADASTRO_SCHEMA, _cadastro_values(n)[1]) if n % 2 == 0
+             else (make_pdf("oab", n), OAB_SCHEMA, fixture_truth("oab", n)) for n in range(args.docs)]
+    expected = {n: _cadastro_values(n)[1] for n in range(0, args.docs, 2)}
+
+    rows = {}
+    for label, on in (("só LLM", False), ("normalizador + LLM", True)):
+        normalize.NORMALIZE_VALUES = on
+        calls0 = dict(client.calls)
+        ms, res = run(items, client)
+        rows[label] = (ms, res, {k: client.calls[k] - calls0[k] for k in calls0})
+    normalize.NORMALIZE_VALUES = True
+
+    base = rows["só LLM"][1]
+    print(f"{args.docs} documentos (cadastro com formatos variados + carteira OAB), perfil balanced, "
+          f"LLM {args.latency_ms:.0f} ms")
+    for label, (ms, res, calls) in rows.items():
+        canon = [res[n].get(k) == v for n, exp in expected.items() for k, v in exp.items()]
+        oab = [base[n].get(k) == res[n].get(k) for n in range(1, args.docs, 2) for k in base[n]]
+        print(f"  [{label:18s}] bulk={calls['bulk']:3d} demais={calls['other']:3d} "
+              f"p50={statistics.median(ms):6.0f} ms/doc | cadastro na forma canônica {sum(canon)}/{len(canon)} "
+              f"| OAB igual ao só-LLM {sum(oab)}/{len(oab)}")
+
+    values = [("data", "12.3.2023"), ("telefone", "Tel.: 41 3333 4444"), ("cpf", "12345678909"),
+              ("uf", "Paraná"), ("nome", "Nome: JOANA DA SILVA.")]
+    t0 = time.perf_counter()
+    for _ in range(2000):
+        for t, v in values:
+            normalize.normalize_value(t, v)
+    print(f"  normalização: {(time.perf_counter() - t0) * 1e6 / (2000 * len(values)):.1f} µs/campo")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# bench/bench_prescan.py — pré-varredura de páginas: custo por documento com e sem (N páginas, LLM stand-in)
+#   python -m bench.bench_prescan --pages 2 50
+import os, sys, time, argparse, statistics
+
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import fitz  # noqa: E402
+import worker.anchors_reading_span as pipeline  # noqa: E402
+from bench.fixtures import make_pdf, KINDS  # noqa: E402
+from bench.fake_llm_server import serve  # noqa: E402
+
+
+def run(pdf: bytes, schema: dict, prescan: bool):
+    doc = fitz.open(stream=pdf, filetype="pdf")
+    t0 = time.perf_counter()
+    with pipeline.track_usage() as usage:  # mesma instância de llm_usage que a pipeline
+        final, page_times = pipeline.extract_document(doc, schema, prescan=prescan)
+    ms = (time.perf_counter() - t0) * 1000
+    doc.close()
+    return ms, len(page_times), usage.summary(), final
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", type=int, nargs="+", default=[2, 10, 50])
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--latency-ms", type=float, default=150.0)
+    args = ap.parse_args()
+
+    server, fake, url = serve(0, latency_ms=args.latency_ms, jitter_ms=0)
+    from openai import OpenAI
+    pipeline.set_llm_client(OpenAI(base_url=url, api_key="test", max_retries=0))
+
+    for kind, (_, schema, _) in KINDS.items():
+        for n in args.pages:
+            pdf = make_pdf(kind, 0, pages=n)
+            row = []
+            for prescan in (False, True):
+                res = [run(pdf, schema, prescan) for _ in range(args.repeat)]
+                ms = statistics.median(r[0] for r in res)
+                _, pages, usage, final = res[-1]
+                row.append((ms, pages, usage, final))
+                print(f"[{kind} {n:3d}p prescan={'on ' if prescan else 'off'}] {ms:7.0f} ms  páginas={pages:3d}  "
+                      f"llm_calls={usage['calls']:3d}  tokens_in={usage['input_tokens']:6d}  "
+                      f"campos={sum(v is not None for v in final.values())}/{len(schema)}")
+            if row[0][3] != row[1][3]:
+                diff = {k: (row[0][3][k], row[1][3][k]) for k in schema if row[0][3][k] != row[1][3][k]}
+                print(f"    resultado diferente (off, on): {diff}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
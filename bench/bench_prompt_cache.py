@@ -0,0 +1,164 @@
+# bench/bench_prompt_cache.py — cache de prefixo do provedor: layout antigo dos prompts (texto antes do
+# schema, instruções no fim) x prefixo estático versionado (worker/prompts.py) num lote com schema repetido.
+# Stand-in com cache de prefixo simulado (>= 1024 tokens, blocos de 128) e prefill por token não cacheado.
+#   python -m bench.bench_prompt_cache --docs 20 --prefill-ms-per-1k 300
+import os, sys, time, json, argparse, statistics
+
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+os.environ.setdefault("ANALYSIS_CACHE", "0")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import fitz  # noqa: E402
+import worker.anchors_reading_span as pipeline  # noqa: E402
+from bench.fixtures import make_pdf, OAB_SCHEMA  # noqa: E402
+from bench.fake_llm_server import serve  # noqa: E402
+from worker import prompts, llm_usage  # noqa: E402
+
+# ficha cadastral larga (schema com descrições, como os jobs de backfill): o prefixo comum passa de 1024 tokens
+_WIDE = [
+    ("nome_completo", "Nome completo do titular, como aparece no documento, sem abreviações"),
+    ("nome_social", "Nome social do titular, quando informado; caso contrário null"),
+    ("cpf", "CPF do titular no formato 000.000.000-00"),
+    ("rg", "Número do RG com dígito verificador, sem o órgão emissor"),
+    ("orgao_emissor_rg", "Órgão emissor do RG e UF, por exemplo SSP/SP"),
+    ("data_emissao_rg", "Data de emissão do RG no formato dd/mm/aaaa"),
+    ("data_nascimento", "Data de nascimento do titular no formato dd/mm/aaaa"),
+    ("naturalidade", "Cidade de nascimento do titular"),
+    ("uf_naturalidade", "UF de nascimento do titular, sigla com duas letras"),
+    ("nacionalidade", "Nacionalidade declarada do titular"),
+    ("estado_civil", "Estado civil: solteiro, casado, divorciado, viúvo ou união estável"),
+    ("nome_mae", "Nome completo da mãe do titular"),
+    ("nome_pai", "Nome completo do pai do titular, quando informado"),
+    ("sexo", "Sexo declarado no documento"),
+    ("email", "Endereço de e-mail principal do titular"),
+    ("telefone_celular", "Telefone celular com DDD no formato (00) 00000-0000"),
+    ("telefone_residencial", "Telefone fixo residencial com DDD no formato (00) 0000-0000"),
+    ("telefone_profissional", "Telefone profissional com DDD, quando houver"),
+    ("cep", "CEP do endereço residencial no formato 00000-000"),
+    ("logradouro", "Logradouro do endereço residencial (rua, avenida, travessa)"),
+    ("numero", "Número do endereço residencial"),
+    ("complemento", "Complemento do endereço residencial (apartamento, bloco, sala)"),
+    ("bairro", "Bairro do endereço residencial"),
+    ("cidade", "Cidade do endereço residencial"),
+    ("uf", "UF do endereço residencial, sigla com duas letras"),
+    ("endereco_profissional", "Endereço profissional completo em uma linha"),
+    ("profissao", "Profissão ou ocupação principal declarada"),
+    ("empregador", "Nome ou razão social do empregador atual"),
+    ("cnpj_empregador", "CNPJ do empregador no formato 00.000.000/0000-00"),
+    ("data_admissao", "Data de admissão no emprego atual no formato dd/mm/aaaa"),
+    ("renda_mensal", "Renda mensal bruta declarada em reais, formato 0.000,00"),
+    ("inscricao", "Número de inscrição no conselho profissional"),
+    ("seccional", "Seccional (UF) do conselho profissional"),
+    ("subsecao", "Subseção do conselho profissional"),
+    ("situacao", "Situação da inscrição: regular, suspensa, cancelada ou licenciada"),
+    ("categoria", "Categoria da inscrição, por exemplo advogado ou estagiário"),
+    ("data_inscricao", "Data da inscrição no conselho no formato dd/mm/aaaa"),
+    ("banco", "Nome ou código do banco da conta para crédito"),
+    ("agencia", "Número da agência bancária com dígito"),
+    ("conta", "Número da conta bancária com dígito"),
+    ("tipo_conta", "Tipo de conta: corrente, poupança ou salário"),
+    ("pis_pasep", "Número do PIS/PASEP/NIT no formato 000.00000.00-0"),
+    ("titulo_eleitor", "Número do título de eleitor"),
+    ("cnh", "Número de registro da CNH com 11 dígitos"),
+    ("categoria_cnh", "Categoria da CNH (A, B, AB, C, D ou E)"),
+    ("validade_cnh", "Data de validade da CNH no formato dd/mm/aaaa"),
+    ("escolaridade", "Grau de escolaridade declarado (fundamental, médio, superior, pós-graduação)"),
+    ("instituicao_ensino", "Nome da instituição de ensino da maior formação declarada"),
+    ("conjuge_nome", "Nome completo do cônjuge ou companheiro, quando houver"),
+    ("conjuge_cpf", "CPF do cônjuge no formato 000.000.000-00, quando houver"),
+    ("dependentes", "Quantidade de dependentes declarados, apenas o número"),
+    ("empresa_cep", "CEP do endereço do empregador no formato 00000-000"),
+    ("empresa_cidade", "Cidade do endereço do empregador"),
+    ("empresa_uf", "UF do endereço do empregador, sigla com duas letras"),
+    ("cargo", "Cargo ou função exercida no emprego atual"),
+    ("chave_pix", "Chave PIX informada (CPF, e-mail, telefone ou chave aleatória)"),
+    ("valor_parcela", "Valor da parcela contratada em reais, formato 0.000,00"),
+    ("prazo_meses", "Prazo do contrato em meses, apenas o número"),
+    ("data", "Data de emissão ou assinatura do documento no formato dd/mm/aaaa"),
+    ("observacoes", "Observações livres registradas no documento, resumidas em uma frase"),
+]
+WIDE_SCHEMA = {k: v for k, v in _WIDE}
+
+
+# ----- layout anterior (PROMPT_VERSION 1), reproduzido para comparação -----
+def legacy_json_input(schema, text):
+    prompt = ("Você é um assistente de extração de dados (JSON extractor).\nExtraia as informações solicitadas do "
+              "texto de um documento PDF.\nO texto pode estar desordenado.\n\nTEXTO DO DOCUMENTO:\n---\n"
+              f"{text}\n---\n\nSCHEMA JSON PARA EXTRAÇÃO:\n(Responda *apenas* com o JSON. Se um campo não for "
+              f"encontrado, use 'null'.)\n\n{json.dumps(schema, indent=2, ensure_ascii=False)}")
+    return [prompts._msg("system", "Responda apenas com JSON válido conforme o schema fornecido. Sem comentários."),
+            prompts._msg("user", prompt)]
+
+def legacy_batch_input(schema, texts):
+    sections = [f"### DOC D{i + 1}\nTEXTO DO DOCUMENTO:\n---\n{t}\n---\nSCHEMA:\n{json.dumps(schema, ensure_ascii=False)}"
+                for i, t in enumerate(texts)]
+    return [prompts._msg("system", prompts.BATCH_JSON_SYSTEM), prompts._msg("user", "\n\n".join(sections))]
+
+
+def _texts(n):
+    out = []
+    for i in range(n):
+        with fitz.open(stream=make_pdf("oab", i), filetype="pdf") as doc:
+            out.append("\n".join(p.get_text() for p in doc))
+    return out
+
+def run_calls(client, inputs, extra=None):
+    """Chamadas sequenciais (a ordem de um job): latência, tokens de entrada, cacheados e custo."""
+    lat, i_tot, c_tot, o_tot = [], 0, 0, 0
+    for inp in inputs:
+        t0 = time.perf_counter()
+        resp = client.responses.create(model="gpt-5-mini", input=inp, max_output_tokens=800, **(extra or {}))
+        lat.append((time.perf_counter() - t0) * 1000)
+        i, o, c = llm_usage.usage_from_response(resp)
+        i_tot += i; o_tot += o; c_tot += c
+    return {"p50": statistics.median(lat), "total_ms": sum(lat), "in": i_tot, "cached": c_tot,
+            "cost": llm_usage.estimate_cost(i_tot, o_tot, c_tot)}
+
+def report(label, r):
+    print(f"  [{label:22s}] p50={r['p50']:6.0f} ms total={r['total_ms'] / 1000:6.2f} s "
+          f"| tokens_in={r['in']:7d} cacheados={r['cached']:7d} ({100 * r['cached'] / max(1, r['in']):4.1f}%) "
+          f"| custo entrada+saída=US$ {r['cost']:.5f}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--docs", type=int, default=20)
+    ap.add_argument("--batch", type=int, default=4, help="documentos por chamada no cenário de lote")
+    ap.add_argument("--latency-ms", type=float, default=150.0)
+    ap.add_argument("--prefill-ms-per-1k", type=float, default=300.0)
+    args = ap.parse_args()
+    from openai import OpenAI
+
+    texts = _texts(args.docs)
+    cfg = dict(latency_ms=args.latency_ms, jitter_ms=0, prefill_ms_per_1k=args.prefill_ms_per_1k)
+    print(f"{args.docs} documentos, mesmo schema, chamadas sequenciais; PROMPT_VERSION={prompts.PROMPT_VERSION}")
+    for name, schema in (("schema OAB (9 campos)", OAB_SCHEMA), (f"ficha larga ({len(WIDE_SCHEMA)} campos)", WIDE_SCHEMA)):
+        print(name)
+        batches = [texts[i:i + args.batch] for i in range(0, len(texts), args.batch)]
+        reqs = [[{"schema": schema, "text": t} for t in b] for b in batches]
+        cases = (
+            ("json  antigo", [legacy_json_input(schema, t) for t in texts], None),
+            ("json  prefixo estático", [prompts.json_input(schema, t) for t in texts], prompts.cache_key("json", schema)),
+            (f"lote{args.batch} antigo", [legacy_batch_input(schema, b) for b in batches], None),
+            (f"lote{args.batch} prefixo estático",
+             [prompts.batch_input("json", [f"D{i + 1}" for i in range(len(r))], r)[0] for r in reqs],
+             prompts.cache_key("batch_json", schema)),
+        )
+        for label, inputs, extra in cases:
+            server, fake, url = serve(0, **cfg)  # cache de prefixo vazio a cada cenário
+            report(label, run_calls(OpenAI(base_url=url, api_key="test", max_retries=0), inputs, extra))
+            server.shutdown()
+
+    # ponta a ponta: o uso por documento registra os tokens cacheados (meta["llm"]); a pipeline manda só
+    # as chaves (sem descrições) e o texto das ROIs, então o prefixo comum fica abaixo de 1024 tokens aqui
+    server, fake, url = serve(0, **cfg)
+    pipeline.set_llm_client(OpenAI(base_url=url, api_key="test", max_retries=0))
+    metas = [pipeline.process_pdf_with_meta(make_pdf("oab", n), WIDE_SCHEMA, profile="accurate")[1]["llm"]
+             for n in range(min(args.docs, 8))]
+    server.shutdown()
+    print(f"pipeline (ficha larga, {len(metas)} docs): cached_ratio por doc="
+          f"{[m['cached_ratio'] for m in metas]} prompt_version={metas[-1]['prompt_version']}")
+
+
+if __name__ == "__main__":
+    main()
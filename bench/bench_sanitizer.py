@@ -0,0 +1,190 @@
+# bench/bench_sanitizer.py — sanitizador local destilado (worker/sanitizer_model.py): coleta os pares do
+# bulk LLM (SANITIZER_PAIRS_LOG) num conjunto de treino, treina, e processa documentos novos com e sem o
+# modelo: chamadas bulk evitadas, tempo por documento e concordância dos campos com o resultado só-LLM.
+# O "professor" é um cliente em processo que responde o valor verdadeiro de cada campo (o que o bulk
+# deveria devolver, inclusive quando o span da heurística está errado) com latência de rede simulada.
+#   python -m bench.bench_sanitizer --train 80 --test 20 --latency-ms 300
+#   python -m bench.bench_sanitizer --write-seed pares.jsonl   # grava os pares do treino
+import os, sys, json, time, argparse, tempfile, statistics
+from types import SimpleNamespace
+
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+os.environ.setdefault("ANALYSIS_CACHE", "0")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import fitz  # noqa: E402
+import regex as rx  # noqa: E402
+import worker.anchors_reading_span as pipeline  # noqa: E402
+from bench.fixtures import make_pdf, OAB_SCHEMA, TELA_SCHEMA  # noqa: E402
+from bench.fake_llm_server import _kv_block, _schema_keys  # noqa: E402
+from bench.bench_layout import make_form, form_truth, FORM_SCHEMA  # noqa: E402
+from worker import sanitizer_model as sanitizer  # noqa: E402
+
+
+class TeacherClient:
+    """
+    client.responses.create compatível: o bulk responde o valor verdadeiro de cada chave no documento
+    corrente (self.truth, na forma canônica do prompt: datas dd/mm/aaaa, telefone com DDD, sem rótulo) ou
+    null quando a chave não existe no documento — um LLM que corrige também o span errado da heurística,
+    então os pares gravados não ensinam os erros dela. Os estágios por campo e JSON respondem igual.
+    """
+
+    def __init__(self, latency_ms: float):
+        self.latency_ms = latency_ms
+        self.responses = self
+        self.calls = {"bulk": 0, "other": 0}
+        self.truth = {}
+
+    def create(self, **kwargs):
+        text = "\n".join(c.get("text", "") for m in kwargs.get("input", []) for c in m.get("content", []))
+        time.sleep(self.latency_ms / 1000)
+        kv = _kv_block(text)
+        if kv:
+            self.calls["bulk"] += 1
+            out = ";".join(self.truth.get(k) or "null" for k, _ in kv)
+        else:
+            self.calls["other"] += 1
+            keys = _schema_keys(text)
+            m = rx.search(r"Campo: ([^\n]+)", text)
+            out = (json.dumps({k: self.truth.get(k) for k in keys}, ensure_ascii=False) if keys
+                   else (self.truth.get(m.group(1).strip()) if m else None) or "null")
+        return SimpleNamespace(output_text=out, output=[], usage=SimpleNamespace(
+            input_tokens=len(text) // 4, output_tokens=len(out) // 4,
+            input_tokens_details=SimpleNamespace(cached_tokens=0)))
+
+
+# recibo com spans sujos que sanitize_value_text não limpa ("Resp.:", "Nº.:", pontuação no fim)
+RECIBO_SCHEMA = {"protocolo": None, "atendente": None, "situacao": None, "observacao": None, "unidade": None}
+
+def make_recibo(n: int) -> bytes:
+    doc = fitz.open()
+    p = doc.new_page()
+    p.insert_text((40, 50), "RECIBO DE ATENDIMENTO", fontsize=14, fontname="hebo")
+    rows = (("Protocolo", f"Nº.: {2023000100 + n}"), ("Atendente", f"Resp.: MARIA SOUZA {n}"),
+            ("Situacao", "Regular." if n % 2 else "Pendente;"), ("Observacao", f"Sem pendências {n}."),
+            ("Unidade", f"Agência Centro {n % 7}"))
+    for i, (label, value) in enumerate(rows):
+        p.insert_text((40, 90 + i * 36), label, fontname="hebo")
+        p.insert_text((40, 104 + i * 36), value)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def recibo_truth(n: int) -> dict:
+    return {"protocolo": str(2023000100 + n), "atendente": f"MARIA SOUZA {n}",
+            "situacao": "Regular" if n % 2 else "Pendente", "observacao": f"Sem pendências {n}",
+            "unidade": f"Agência Centro {n % 7}"}
+
+def fixture_truth(kind: str, n: int) -> dict:
+    """Valores verdadeiros dos PDFs de bench/fixtures.py (oab, tela)."""
+    if kind == "oab":
+        return {"nome": f"JOANA DA SILVA SANTOS {n or ''}".strip(), "inscricao": str(101943 + n), "seccional": "PR",
+                "subsecao": "CONSELHO SECCIONAL - PARANÁ", "situacao": "Regular",
+                "telefone_profissional": "(41) 3333-4444", "cpf": "123.456.789-09", "data": "12/03/2023",
+                "endereco_profissional": "Rua das Flores, 100 Centro Curitiba - PR CEP 80010-000"}
+    return {"data_referencia": "05/09/2025", "produto": "CONSIGNADO", "sistema": "CONSIG",
+            "valor_parcela": f"R$ 1.{234 + n:03d},56", "cidade": "Mozarlandia", "uf": "GO", "pesquisa_por": "Cliente"}
+
+
+def docs(start: int, n: int):
+    """[(pdf, schema, valores verdadeiros)]"""
+    kinds = (("oab", OAB_SCHEMA), ("tela", TELA_SCHEMA), ("form", FORM_SCHEMA), ("recibo", RECIBO_SCHEMA))
+    out = []
+    for i in range(start, start + n):
+        kind, schema = kinds[i % len(kinds)]
+        if kind == "form":
+            out.append((make_form(i), schema, form_truth(i)))
+        elif kind == "recibo":
+            out.append((make_recibo(i), schema, recibo_truth(i)))
+        else:
+            out.append((make_pdf(kind, i), schema, fixture_truth(kind, i)))
+    return out
+
+
+def run(items, client):
+    ms, results = [], []
+    for pdf, schema, truth in items:
+        client.truth = truth
+        t0 = time.perf_counter()
+        final, _ = pipeline.process_pdf_with_meta(pdf, schema, profile="balanced")
+        ms.append((time.perf_counter() - t0) * 1000)
+        results.append(final)
+    return ms, results
+
+
+def read_pairs(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--train", type=int, default=80, help="documentos da coleta de pares")
+    ap.add_argument("--test", type=int, default=20, help="documentos novos (avaliação)")
+    ap.add_argument("--latency-ms", type=float, default=300.0)
+    ap.add_argument("--write-seed", default="", help="grava os pares de treino neste JSONL")
+    args = ap.parse_args()
+
+    client = TeacherClient(args.latency_ms)
+    pipeline.set_llm_client(client)
+    tmp = tempfile.mkdtemp(prefix="sanitizer_bench_")
+    train_log, test_log = os.path.join(tmp, "train.jsonl"), os.path.join(tmp, "test.jsonl")
+
+    # 1) coleta: só LLM, pares gravados pelo bulk
+    sanitizer.set_sanitizer(None)
+    sanitizer.SANITIZER_PAIRS_LOG = train_log
+    run(docs(0, args.train), client)
+    sanitizer.SANITIZER_PAIRS_LOG = test_log
+    test_docs = docs(10_000, args.test)
+    calls0 = dict(client.calls)
+    base_ms, base = run(test_docs, client)
+    base_calls = {k: client.calls[k] - calls0[k] for k in calls0}
+    sanitizer.SANITIZER_PAIRS_LOG = ""
+
+    # 2) treino + avaliação nos pares dos documentos novos
+    train_pairs, test_pairs = read_pairs(train_log), read_pairs(test_log)
+    if args.write_seed:
+        with open(args.write_seed, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(p, ensure_ascii=False) + "\n" for p in train_pairs)
+    t0 = time.perf_counter()
+    model = sanitizer.SanitizerModel(sanitizer.train(train_pairs))
+    train_ms = (time.perf_counter() - t0) * 1000
+    t0 = time.perf_counter()
+    for p in test_pairs:
+        model.predict(p["key"], p["raw"])
+    pred_us = (time.perf_counter() - t0) * 1e6 / max(1, len(test_pairs))
+    print(f"pares: treino={len(train_pairs)} teste={len(test_pairs)} | treino {train_ms:.0f} ms, "
+          f"{len(model.prefixes)} prefixos | previsão {pred_us:.0f} µs/campo")
+    for thr in (0.8, 0.9, 0.95):
+        print(f"  min_conf={thr:4.2f}: {sanitizer.evaluate(model, test_pairs, thr)}")
+
+    # span só de rótulo nunca é resolvido localmente (nem pelo modelo treinado, nem pelo de SANITIZER_MODEL)
+    label_only = [(p["key"], p["raw"]) for p in train_pairs + test_pairs if p["raw"].rstrip().endswith(":")]
+    label_only += [("nome_mae", "E-mail:"), ("protocolo", "Nº.:"), ("cidade", "U.F.:")]
+    models = [model] + ([sanitizer.SanitizerModel.load(sanitizer.SANITIZER_MODEL)]
+                        if sanitizer.SANITIZER_MODEL and os.path.isfile(sanitizer.SANITIZER_MODEL) else [])
+    for m in models:
+        bad = [(k, raw) for k, raw in label_only if m.confident([k], {k: raw}, 0.0)]
+        assert not bad, f"span só de rótulo marcado como confiável: {bad}"
+    print(f"  spans só de rótulo: {len(label_only)} conferidos, nenhum resolvido localmente")
+
+    # 3) documentos novos com o modelo
+    sanitizer.set_sanitizer(model)
+    calls0 = dict(client.calls)
+    got_ms, got = run(test_docs, client)
+    got_calls = {k: client.calls[k] - calls0[k] for k in calls0}
+    fields = [(a.get(k), b.get(k)) for a, b in zip(base, got) for k in a]
+    same = sum(x == y for x, y in fields)
+    truth = [(d[2].get(k), b.get(k)) for d, b in zip(test_docs, got) for k in b]
+    print(f"{args.test} documentos novos, perfil balanced, LLM {args.latency_ms:.0f} ms")
+    print(f"  [só LLM         ] bulk={base_calls['bulk']:3d} demais={base_calls['other']:3d} "
+          f"p50={statistics.median(base_ms):6.0f} ms/doc")
+    print(f"  [modelo + LLM   ] bulk={got_calls['bulk']:3d} demais={got_calls['other']:3d} "
+          f"p50={statistics.median(got_ms):6.0f} ms/doc | campos iguais ao só-LLM {same}/{len(fields)}")
+    base_ok = sum(t == b for (t, _), b in zip(truth, (x for x, _ in fields)))
+    print(f"  campos corretos: só LLM {base_ok}/{len(truth)} | modelo + LLM {sum(t == g for t, g in truth)}/{len(truth)}")
+
+
+if __name__ == "__main__":
+    main()
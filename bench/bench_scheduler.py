@@ -0,0 +1,85 @@
+# bench/bench_scheduler.py — latência de um job interativo (1 documento) chegando no meio de um lote grande:
+# ordem de criação numa capacidade compartilhada (antes) x fila justa com menor-custo-primeiro (worker/scheduler.py)
+#   python -m bench.bench_scheduler --batch 40 --inflight 3
+# Os itens "dormem" o custo estimado pelo preflight (escala --scale); o preflight real roda numa amostra.
+import os, sys, time, random, asyncio, argparse, statistics
+
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+os.environ.setdefault("ANALYSIS_CACHE", "0")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from worker.preflight import preflight_pdf, est_cost  # noqa: E402
+from worker.scheduler import AsyncScheduler  # noqa: E402
+from bench.fixtures import make_pdf, OAB_SCHEMA, TELA_SCHEMA  # noqa: E402
+
+
+def make_jobs(batch: int, seed: int = 0):
+    rng = random.Random(seed)
+    # lote: documentos de 1 a 60 páginas (custo ~ preflight); interativo: 1 carteira de 1 página
+    big = [{"id": f"lote-{i}", "pages": p, "words": p * 350, "est_llm_calls": min(p, 4) + 1}
+           for i, p in enumerate(rng.choice((1, 2, 5, 20, 60)) for _ in range(batch))]
+    small = [{"id": "interativo-0", "pages": 1, "words": 80, "est_llm_calls": 2}]
+    return big, small
+
+
+async def fifo(big, small, inflight, scale, arrive_s):
+    # antes: itens em ordem de criação disputando a mesma capacidade da máquina (fila FIFO)
+    done = {}
+    t0 = time.perf_counter()
+    machine = asyncio.Semaphore(inflight)
+
+    async def one(it):
+        async with machine:
+            await asyncio.sleep(est_cost(it) * scale)
+            done[it["id"]] = time.perf_counter() - t0
+
+    async def job(items, delay):
+        await asyncio.sleep(delay)
+        await asyncio.gather(*(one(it) for it in items))
+    await asyncio.gather(job(big, 0), job(small, arrive_s))
+    return done
+
+
+async def fair(big, small, inflight, scale, arrive_s):
+    sched = AsyncScheduler(inflight)
+    done = {}
+    t0 = time.perf_counter()
+
+    async def one(it):
+        await asyncio.sleep(est_cost(it) * scale)
+        done[it["id"]] = time.perf_counter() - t0
+
+    async def job(job_id, items, delay):
+        await asyncio.sleep(delay)
+        futs = [await sched.submit(job_id, est_cost(it), it, one) for it in items]
+        await asyncio.gather(*futs)
+    await asyncio.gather(job("lote", big, 0), job("interativo", small, arrive_s))
+    return done
+
+
+def report(name, done, small, arrive_s):
+    lat_small = done[small[0]["id"]] - arrive_s
+    big = [v for k, v in done.items() if k.startswith("lote")]
+    print(f"[{name:12s}] interativo: {lat_small * 1000:6.0f} ms | lote: término {max(big):.2f}s, "
+          f"conclusão média por item {statistics.mean(big):.2f}s")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--batch", type=int, default=40)
+    ap.add_argument("--inflight", type=int, default=3)
+    ap.add_argument("--scale", type=float, default=0.02, help="segundos simulados por unidade de custo")
+    ap.add_argument("--arrive", type=float, default=0.3, help="chegada do job interativo (s)")
+    args = ap.parse_args()
+
+    for kind, schema, pages in (("oab", OAB_SCHEMA, 1), ("tela", TELA_SCHEMA, 30)):
+        pf = preflight_pdf(make_pdf(kind, 0, pages=pages), schema)
+        print(f"preflight {kind} {pages}p: {pf} custo={est_cost(pf):.2f}")
+
+    big, small = make_jobs(args.batch)
+    report("ordem FIFO", asyncio.run(fifo(big, small, args.inflight, args.scale, args.arrive)), small, args.arrive)
+    report("fila justa", asyncio.run(fair(big, small, args.inflight, args.scale, args.arrive)), small, args.arrive)
+
+
+if __name__ == "__main__":
+    main()
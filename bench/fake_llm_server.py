@@ -0,0 +1,232 @@
+# bench/fake_llm_server.py — stand-in local da Responses API com injeção de falhas (latência, 429, 5xx, hang)
+#   python -m bench.fake_llm_server --port 8089 --error-rate 0.1 --rate-limit-rate 0.1
+#   OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=test python -m worker.anchors_reading_span
+# Configuração em tempo real: POST /_control {"outage": true} ; estatísticas: GET /_stats
+# Cache de prefixo simulado como o do provedor: prefixo já visto (>= cache_min_tokens, em blocos de
+# cache_block_tokens) volta em usage.input_tokens_details.cached_tokens e não paga prefill_ms_per_1k.
+import json, time, random, argparse, threading, uuid, hashlib
+from collections import OrderedDict
+import regex as rx
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+DEFAULTS = {
+    "latency_ms": 300.0,      # latência base por resposta
+    "jitter_ms": 100.0,
+    "capacity": 8,            # requests simultâneos antes de degradar (latência cresce, depois 429)
+    "error_rate": 0.0,        # fração de 500
+    "rate_limit_rate": 0.0,   # fração de 429 (com retry-after)
+    "hang_rate": 0.0,         # fração que "pendura" por hang_s (provoca timeout no cliente)
+    "hang_s": 30.0,
+    "outage": False,          # True = tudo 503
+    "prefix_cache": True,     # simula o cache de prefixo do provedor
+    "cache_min_tokens": 1024,
+    "cache_block_tokens": 128,
+    "prefill_ms_per_1k": 0.0,  # latência extra por 1k tokens de entrada NÃO cacheados (0 = só latency_ms)
+}
+CHARS_PER_TOKEN = 4
+PREFIX_CACHE_ENTRIES = 50000
+
+
+def _prompt_text(body: dict) -> str:
+    parts = []
+    for msg in body.get("input") or []:
+        for c in msg.get("content") or []:
+            if isinstance(c, dict) and c.get("text"):
+                parts.append(c["text"])
+    return "\n".join(parts)
+
+def _kv_block(text: str):
+    # linhas "chave=valor" da seção de chaves do prompt bulk
+    m = rx.search(r"CHAVES_E_VALORES_BRUTOS[^\n]*\n(.*?)(?:\n\s*\n|$)", text, flags=rx.S)
+    out = []
+    for line in (m.group(1).splitlines() if m else []):
+        if "=" in line:
+            k, v = line.split("=", 1)
+            out.append((k.strip(), v.strip()))
+    return out
+
+def _schema_keys(text: str):
+    # último objeto JSON do prompt (schema pedido)
+    for m in reversed(list(rx.finditer(r"\{(?:[^{}]|(?R))*\}", text))):
+        try:
+            obj = json.loads(m.group(0))
+            if isinstance(obj, dict):
+                return list(obj.keys())
+        except ValueError:
+            continue
+    return []
+
+def fake_answer(text: str) -> str:
+    """Resposta plausível no formato que cada prompt da pipeline espera (valores brutos ou null)."""
+    docs = rx.findall(r"### DOC (D\d+)", text)
+    if docs:
+        sections = rx.split(r"### DOC D\d+", text)[1:]
+        out = {}
+        shared = _schema_keys(rx.split(r"### DOC D\d+", text)[0])  # schema comum antes das seções
+        for did, sec in zip(docs, sections):
+            kv = _kv_block(sec)
+            out[did] = {k: (v or None) for k, v in kv} if kv else {k: None for k in (_schema_keys(sec) or shared)}
+        return json.dumps(out, ensure_ascii=False)
+    kv = _kv_block(text)
+    if kv:
+        return ";".join(v or "null" for _, v in kv)
+    keys = _schema_keys(text)
+    if keys:
+        return json.dumps({k: None for k in keys})
+    return "null"
+
+
+class FakeLLM:
+    def __init__(self, **cfg):
+        self.cfg = {**DEFAULTS, **{k: v for k, v in cfg.items() if v is not None}}
+        self.lock = threading.Lock()
+        self.inflight = 0
+        self.stats = {"requests": 0, "ok": 0, "429": 0, "500": 0, "503": 0, "hang": 0, "max_inflight": 0,
+                      "input_tokens": 0, "cached_tokens": 0}
+        self.prefixes = OrderedDict()  # hash dos prefixos já vistos (LRU)
+
+    def _cached_tokens(self, text: str) -> int:
+        """Maior prefixo já visto, em blocos; registra os prefixos deste prompt para os próximos."""
+        c = self.cfg
+        if not c["prefix_cache"]:
+            return 0
+        block = int(c["cache_block_tokens"]) * CHARS_PER_TOKEN
+        cuts = range(int(c["cache_min_tokens"]) * CHARS_PER_TOKEN, len(text) + 1, block)
+        hashes = [hashlib.sha1(text[:n].encode("utf-8")).digest() for n in cuts]
+        with self.lock:
+            hit = 0
+            for n, h in zip(cuts, hashes):
+                if h not in self.prefixes:
+                    break
+                hit = n
+            for h in hashes:
+                self.prefixes[h] = True
+                self.prefixes.move_to_end(h)
+            while len(self.prefixes) > PREFIX_CACHE_ENTRIES:
+                self.prefixes.popitem(last=False)
+        return hit // CHARS_PER_TOKEN
+
+    def _count(self, k):
+        with self.lock:
+            self.stats[k] += 1
+
+    def handle(self, body: dict):
+        """(status, headers, payload)"""
+        c = self.cfg
+        with self.lock:
+            self.inflight += 1
+            self.stats["requests"] += 1
+            self.stats["max_inflight"] = max(self.stats["max_inflight"], self.inflight)
+            load = self.inflight / max(1, c["capacity"])
+        try:
+            if c["outage"]:
+                self._count("503")
+                return 503, {}, {"error": {"message": "service unavailable", "type": "server_error"}}
+            r = random.random()
+            if load > 2.0 or r < c["rate_limit_rate"]:
+                self._count("429")
+                return 429, {"retry-after": "0.5"}, {"error": {"message": "rate limit", "type": "rate_limit"}}
+            r -= c["rate_limit_rate"]
+            if r < c["error_rate"]:
+                self._count("500")
+                return 500, {}, {"error": {"message": "internal error", "type": "server_error"}}
+            r -= c["error_rate"]
+            if r < c["hang_rate"]:
+                self._count("hang")
+                time.sleep(c["hang_s"])
+            text = _prompt_text(body)
+            in_tok = len(text) // CHARS_PER_TOKEN
+            cached = self._cached_tokens(text)
+            prefill = c["prefill_ms_per_1k"] * (in_tok - cached) / 1000
+            # congestionamento: latência cresce acima da capacidade
+            time.sleep(max(0.0, (c["latency_ms"] + prefill + random.uniform(-1, 1) * c["jitter_ms"]) * max(1.0, load)) / 1000)
+            out = fake_answer(text)
+            with self.lock:
+                self.stats["ok"] += 1
+                self.stats["input_tokens"] += in_tok
+                self.stats["cached_tokens"] += cached
+            return 200, {}, {
+                "id": f"resp_{uuid.uuid4().hex[:12]}", "object": "response", "created_at": int(time.time()),
+                "model": body.get("model", "fake"), "status": "completed",
+                "output": [{"type": "message", "id": f"msg_{uuid.uuid4().hex[:12]}", "status": "completed",
+                            "role": "assistant",
+                            "content": [{"type": "output_text", "text": out, "annotations": []}]}],
+                "usage": {"input_tokens": in_tok, "output_tokens": max(1, len(out) // 4),
+                          "total_tokens": in_tok + max(1, len(out) // 4),
+                          "input_tokens_details": {"cached_tokens": cached},
+                          "output_tokens_details": {"reasoning_tokens": 0}},
+                "parallel_tool_calls": False, "tool_choice": "auto", "tools": [],
+            }
+        finally:
+            with self.lock:
+                self.inflight -= 1
+
+
+def make_handler(fake: FakeLLM):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *a):
+            pass
+
+        def _send(self, status, payload, headers=None):
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("content-type", "application/json")
+            self.send_header("content-length", str(len(data)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            try:
+                self.wfile.write(data)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def _body(self):
+            n = int(self.headers.get("content-length") or 0)
+            return json.loads(self.rfile.read(n) or b"{}")
+
+        def do_GET(self):
+            if self.path == "/_stats":
+                with fake.lock:
+                    return self._send(200, {**fake.stats, "inflight": fake.inflight, "config": fake.cfg})
+            self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path == "/_control":
+                fake.cfg.update(self._body())
+                return self._send(200, fake.cfg)
+            if self.path.rstrip("/").endswith("/responses"):
+                status, headers, payload = fake.handle(self._body())
+                return self._send(status, payload, headers)
+            self._send(404, {"error": "not found"})
+    return Handler
+
+
+def serve(port: int = 0, **cfg):
+    """Sobe o servidor numa thread; retorna (server, fake, base_url)."""
+    fake = FakeLLM(**cfg)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(fake))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, fake, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=8089)
+    for k, v in DEFAULTS.items():
+        if isinstance(v, bool):
+            ap.add_argument(f"--{k.replace('_', '-')}", action=argparse.BooleanOptionalAction, default=None)
+        else:
+            ap.add_argument(f"--{k.replace('_', '-')}", type=type(v), default=None)
+    args = vars(ap.parse_args())
+    port = args.pop("port")
+    server, fake, url = serve(port, **args)
+    print(f"fake LLM em {url} config={fake.cfg}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
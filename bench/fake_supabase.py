@@ -0,0 +1,201 @@
+# bench/fake_supabase.py — stand-in em memória do cliente supabase-py (tabelas + storage) com o subconjunto
+# de chamadas usado por worker/main.py e worker/run_job.py, latência de rede injetada e contagem de chamadas
+#   db = FakeSupabase(latency_ms=15); db.insert_rows("jobs", [...]); db.put("docs", "a.pdf", pdf_bytes)
+import copy, time, random, threading
+from collections import Counter
+
+DEFAULTS = {
+    "latency_ms": 0.0,       # ida e volta por execute()/chamada de storage (o SDK é síncrono: bloqueia quem chama)
+    "jitter_ms": 0.0,
+    "error_rate": 0.0,       # fração de execute() que falha (APIError simulado)
+}
+
+
+class FakeAPIError(RuntimeError):
+    pass
+
+
+class _Resp:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class _Query:
+    """Builder encadeado como o do postgrest-py: filtros + execute()."""
+
+    def __init__(self, db, table):
+        self.db, self.table = db, table
+        self.op, self.payload, self.cols = "select", None, None
+        self.filters, self.order_by, self.limit_n, self.one = [], None, None, False
+
+    # operações
+    def select(self, cols="*", count=None):
+        self.op, self.cols = "select", cols
+        return self
+
+    def update(self, values):
+        self.op, self.payload = "update", dict(values)
+        return self
+
+    def insert(self, rows):
+        self.op, self.payload = "insert", rows if isinstance(rows, list) else [rows]
+        return self
+
+    def upsert(self, rows, **_):
+        self.op, self.payload = "upsert", rows if isinstance(rows, list) else [rows]
+        return self
+
+    def delete(self):
+        self.op = "delete"
+        return self
+
+    # filtros/modificadores
+    def eq(self, col, val):
+        self.filters.append(lambda r: r.get(col) == val)
+        return self
+
+    def neq(self, col, val):
+        self.filters.append(lambda r: r.get(col) != val)
+        return self
+
+    def in_(self, col, vals):
+        vals = list(vals)
+        self.filters.append(lambda r: r.get(col) in vals)
+        return self
+
+    def is_(self, col, val):
+        want = None if str(val).lower() == "null" else val
+        self.filters.append(lambda r: r.get(col) is want)
+        return self
+
+    def order(self, col, desc=False):
+        self.order_by = (col, desc)
+        return self
+
+    def limit(self, n):
+        self.limit_n = int(n)
+        return self
+
+    def single(self):
+        self.one = True
+        return self
+
+    def execute(self):
+        return self.db._execute(self)
+
+
+class _Bucket:
+    def __init__(self, db, name):
+        self.db, self.name = db, name
+
+    def upload(self, path, file, file_options=None):
+        # bytes ou caminho de arquivo (run_job.py grava em arquivo temporário)
+        if isinstance(file, (bytes, bytearray)):
+            data = bytes(file)
+        else:
+            with open(file, "rb") as f:
+                data = f.read()
+        self.db._io("upload", self.name)
+        with self.db.lock:
+            self.db.objects[(self.name, path)] = data
+        return {"Key": f"{self.name}/{path}"}
+
+    def download(self, path):
+        self.db._io("download", self.name)
+        with self.db.lock:
+            data = self.db.objects.get((self.name, path))
+        if data is None:
+            raise FakeAPIError(f"object not found: {self.name}/{path}")
+        return data
+
+    def create_signed_url(self, path, expires_in):
+        # sem servidor HTTP: URL vazia faz o spooled_download cair no download() do SDK
+        self.db._io("signed_url", self.name)
+        return {"signedURL": None}
+
+    def get_public_url(self, path):
+        return f"memory://{self.name}/{path}"
+
+
+class _Storage:
+    def __init__(self, db):
+        self.db = db
+
+    def from_(self, bucket):
+        return _Bucket(self.db, bucket)
+
+
+class FakeSupabase:
+    """Tabelas como listas de dicts em memória (thread-safe); `calls` conta cada execute()/chamada de storage."""
+
+    def __init__(self, **cfg):
+        self.cfg = {**DEFAULTS, **{k: v for k, v in cfg.items() if v is not None}}
+        self.lock = threading.Lock()
+        self.tables = {}
+        self.objects = {}
+        self.calls = Counter()
+        self.storage = _Storage(self)
+
+    def table(self, name):
+        return _Query(self, name)
+
+    # ----- carga inicial (sem latência, fora da contagem) -----
+    def insert_rows(self, table, rows):
+        with self.lock:
+            self.tables.setdefault(table, []).extend(copy.deepcopy(rows))
+
+    def put(self, bucket, path, data: bytes):
+        with self.lock:
+            self.objects[(bucket, path)] = bytes(data)
+
+    def rows(self, table):
+        with self.lock:
+            return copy.deepcopy(self.tables.get(table, []))
+
+    # ----- execução -----
+    def _wait(self):
+        c = self.cfg
+        ms = c["latency_ms"] + random.uniform(-1, 1) * c["jitter_ms"]
+        if ms > 0:
+            time.sleep(ms / 1000)
+
+    def _io(self, op, bucket):
+        with self.lock:
+            self.calls[f"storage.{op}"] += 1
+        self._wait()
+
+    def _execute(self, q: _Query):
+        with self.lock:
+            self.calls[f"{q.table}.{q.op}"] += 1
+        self._wait()
+        if random.random() < self.cfg["error_rate"]:
+            raise FakeAPIError(f"{q.table}.{q.op}: simulated error")
+        with self.lock:
+            rows = self.tables.setdefault(q.table, [])
+            if q.op in ("insert", "upsert"):
+                rows.extend(copy.deepcopy(q.payload))
+                return _Resp(copy.deepcopy(q.payload))
+            hit = [r for r in rows if all(f(r) for f in q.filters)]
+            if q.op == "update":
+                for r in hit:
+                    r.update(q.payload)
+                return _Resp(copy.deepcopy(hit))
+            if q.op == "delete":
+                self.tables[q.table] = [r for r in rows if r not in hit]
+                return _Resp(copy.deepcopy(hit))
+            if q.order_by:
+                col, desc = q.order_by
+                hit.sort(key=lambda r: (r.get(col) is None, r.get(col)), reverse=desc)
+            if q.limit_n is not None:
+                hit = hit[:q.limit_n]
+            if q.cols and q.cols.strip() != "*":
+                cols = [c.strip() for c in q.cols.split(",")]
+                hit = [{c: r.get(c) for c in cols} for r in hit]
+            else:
+                hit = copy.deepcopy(hit)
+        if q.one:
+            if len(hit) != 1:
+                raise FakeAPIError(f"{q.table}: single() esperava 1 linha, veio {len(hit)}")
+            return _Resp(hit[0])
+        return _Resp(hit)
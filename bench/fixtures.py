@@ -0,0 +1,108 @@
+# bench/fixtures.py — PDFs sintéticos (carteira OAB, tela de sistema) para benchmarks locais
+import os, json
+import fitz  # PyMuPDF
+
+OAB_SCHEMA = {
+    "nome": "Nome do profissional",
+    "inscricao": "Número de inscrição",
+    "seccional": "UF",
+    "subsecao": "Subseção",
+    "situacao": "Situação do profissional",
+    "telefone_profissional": "Telefone",
+    "cpf": "CPF",
+    "data": "Data",
+    "endereco_profissional": "Endereço",
+}
+TELA_SCHEMA = {
+    "data_referencia": "Data de referência",
+    "produto": None,
+    "sistema": None,
+    "valor_parcela": "Valor da parcela",
+    "cidade": None,
+    "uf": "UF",
+    "pesquisa_por": None,
+}
+
+def _oab_page(p, n=0):
+    p.insert_text((50, 60), "ORDEM DOS ADVOGADOS DO BRASIL", fontsize=16, fontname="hebo")
+    p.insert_text((50, 110), "Nome:", fontname="hebo"); p.insert_text((110, 110), f"JOANA DA SILVA SANTOS {n or ''}".strip())
+    p.insert_text((50, 140), "Inscrição", fontname="hebo"); p.insert_text((50, 158), str(101943 + n))
+    p.insert_text((200, 140), "Seccional", fontname="hebo"); p.insert_text((200, 158), "PR")
+    p.insert_text((350, 140), "Subseção", fontname="hebo"); p.insert_text((350, 158), "CONSELHO SECCIONAL - PARANÁ")
+    p.insert_text((50, 200), "Situação Regular")
+    p.insert_text((50, 230), "Telefone Profissional: (41) 3333-4444")
+    p.insert_text((50, 260), "CPF: 123.456.789-09   Data: 12/03/2023")
+    p.insert_text((50, 290), "Endereco Profissional", fontname="hebo"); p.insert_text((50, 308), "Rua das Flores, 100 Centro")
+    p.insert_text((50, 326), "Curitiba - PR CEP 80010-000")
+
+def _tela_page(p, n=0):
+    p.insert_text((40, 60), "Detalhamento de saldos por parcela", fontsize=14)
+    hdr = ["Data Referencia", "Produto", "Sistema", "Valor Parcela"]
+    xs = [40, 170, 300, 430]
+    for x, h in zip(xs, hdr):
+        p.insert_text((x, 100), h, fontname="hebo")
+    rows = [["05/09/2025", "CONSIGNADO", "CONSIG", f"R$ 1.{234 + n:03d},56"],
+            ["05/10/2025", "CONSIGNADO", "CONSIG", f"R$ 1.{234 + n:03d},56"]]
+    for r, row in enumerate(rows):
+        for x, v in zip(xs, row):
+            p.insert_text((x, 120 + r * 18), v)
+    for y in (88, 106, 124, 142):
+        p.draw_line((35, y), (560, y))
+    for x in (35, 165, 295, 425, 560):
+        p.draw_line((x, 88), (x, 142))
+    p.insert_text((40, 200), "Cidade: Mozarlandia   U.F.: GO")
+    p.insert_text((40, 230), "Pesquisa por:", fontname="hebo"); p.insert_text((140, 230), "Cliente")
+
+def _filler_page(p, n=0):
+    y = 60
+    for i in range(40):
+        p.insert_text((40, y), f"Cláusula {n}.{i}: texto corrido sem rótulos relevantes para o schema.")
+        y += 18
+
+KINDS = {"oab": (_oab_page, OAB_SCHEMA, "carteira_oab"), "tela": (_tela_page, TELA_SCHEMA, "tela_sistema")}
+
+def make_pdf(kind: str, n: int = 0, pages: int = 1) -> bytes:
+    """PDF sintético do tipo `kind`; páginas extras (pages > 1) são texto corrido sem os rótulos."""
+    page_fn = KINDS[kind][0]
+    doc = fitz.open()
+    page_fn(doc.new_page(), n)
+    for extra in range(1, pages):
+        _filler_page(doc.new_page(), extra)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+def write_fixtures(out_dir: str, count: int = 2, pages: int = 1) -> list:
+    """Grava `count` PDFs por tipo em out_dir e devolve o dataset [{label, extraction_schema, pdf_path}]."""
+    os.makedirs(out_dir, exist_ok=True)
+    dataset = []
+    for kind, (_, schema, label) in KINDS.items():
+        for n in range(count):
+            name = f"{kind}_{n + 1}.pdf"
+            with open(os.path.join(out_dir, name), "wb") as f:
+                f.write(make_pdf(kind, n, pages))
+            dataset.append({"label": label, "extraction_schema": schema, "pdf_path": name})
+    with open(os.path.join(out_dir, "dataset.json"), "w", encoding="utf-8") as f:
+        json.dump(dataset, f, ensure_ascii=False, indent=2)
+    return dataset
+
+def make_scanned_pdf(path: str, pages: int = 40, kind: str = "oab", px: int = 1400, seed: int = 0) -> int:
+    """
+    PDF grande estilo "escaneado" gravado em disco: cada página tem uma imagem de ruído
+    (incompressível) por trás; a 1ª página tem a camada de texto do tipo `kind`. Retorna o tamanho.
+    """
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    doc = fitz.open()
+    for i in range(pages):
+        p = doc.new_page()
+        noise = rng.integers(0, 256, size=(px, px, 3), dtype=np.uint8)
+        pix = fitz.Pixmap(fitz.csRGB, px, px, noise.tobytes(), False)
+        p.insert_image(p.rect, pixmap=pix)
+        if i == 0:
+            KINDS[kind][0](p, 0)
+        else:
+            _filler_page(p, i)
+    doc.save(path, deflate=False)
+    doc.close()
+    return os.path.getsize(path)
@@ -0,0 +1,160 @@
+# bench/llm_cassette.py — gravação/replay das respostas LLM (Responses API) para rodar a pipeline offline,
+# e o LLM de referência determinístico (OracleClient) da checagem de recall de contexto (regress --recall)
+import os, json, hashlib, threading
+import unicodedata as _ud
+from types import SimpleNamespace
+import regex as rx
+
+CASSETTE_VERSION = 1
+
+def request_key(kwargs: dict) -> str:
+    """Chave estável do request (modelo + prompt + parâmetros; o timeout varia por execução e fica fora)."""
+    kwargs = {k: v for k, v in kwargs.items() if k != "timeout"}
+    blob = json.dumps(kwargs, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ReplayMiss(KeyError):
+    pass
+
+
+class CassetteClient:
+    """
+    Cliente compatível com client.responses.create(**kwargs).
+      mode="replay": devolve a resposta gravada; request desconhecido levanta ReplayMiss
+                     (a pipeline trata como erro de LLM → resultado determinístico)
+      mode="record": repassa para `inner` (cliente real), grava e devolve a resposta
+    """
+
+    def __init__(self, path: str, mode: str = "replay", inner=None):
+        if mode not in ("replay", "record"):
+            raise ValueError(f"mode inválido: {mode}")
+        if mode == "record" and inner is None:
+            raise ValueError("mode=record exige o cliente real (inner)")
+        self.path, self.mode, self.inner = path, mode, inner
+        self.responses = self
+        self.hits = self.misses = self.recorded = 0
+        self._lock = threading.Lock()
+        self.entries = {}
+        if os.path.isfile(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == CASSETTE_VERSION:
+                self.entries = data.get("entries", {})
+
+    def create(self, **kwargs):
+        key = request_key(kwargs)
+        if self.mode == "replay":
+            e = self.entries.get(key)
+            with self._lock:
+                if e is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+            if e is None:
+                raise ReplayMiss(f"replay_miss {key[:12]}")
+            u = e.get("usage") or {}
+            return SimpleNamespace(
+                output_text=e.get("output_text"), output=[],
+                usage=SimpleNamespace(
+                    input_tokens=u.get("input_tokens", 0), output_tokens=u.get("output_tokens", 0),
+                    input_tokens_details=SimpleNamespace(cached_tokens=u.get("cached_tokens", 0))))
+
+        resp = self.inner.responses.create(**kwargs)
+        u = getattr(resp, "usage", None)
+        details = getattr(u, "input_tokens_details", None)
+        entry = {
+            "output_text": getattr(resp, "output_text", None),
+            "usage": {
+                "input_tokens": getattr(u, "input_tokens", 0) or 0,
+                "output_tokens": getattr(u, "output_tokens", 0) or 0,
+                "cached_tokens": getattr(details, "cached_tokens", 0) or 0,
+            },
+        }
+        with self._lock:
+            self.entries[key] = entry
+            self.recorded += 1
+        return resp
+
+    def save(self):
+        if self.mode != "record":
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._lock:
+            data = {"version": CASSETTE_VERSION, "entries": dict(sorted(self.entries.items()))}
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+
+
+def _norm(v) -> str:
+    s = "".join(ch for ch in _ud.normalize("NFD", str(v or "")) if _ud.category(ch) != "Mn")
+    return rx.sub(r"[^a-z0-9]+", " ", s.lower()).strip()
+
+def _user_text(kwargs: dict) -> str:
+    return "\n".join(c.get("text", "") for m in kwargs.get("input") or [] if m.get("role") != "system"
+                     for c in m.get("content") or [])
+
+
+class OracleClient:
+    """
+    LLM de referência determinístico da checagem de recall de contexto: responde cada chave com o
+    valor esperado (do manifest) quando ele aparece no texto enviado no prompt, senão null. Mede só
+    se o valor chegou ao contexto; não serve para medir acurácia (acerta por construção).
+    Formato de resposta de cada estágio: por campo (valor), bulk (valores separados por ';'), JSON
+    e lote multi-documento (JSON por seção).
+    """
+
+    def __init__(self, cases):
+        self.responses = self
+        self.calls = 0
+        self._expected = {}
+        for c in cases:
+            for k, v in (c.get("expected") or {}).items():
+                if v is not None:
+                    self._expected.setdefault(k, set()).add(str(v))
+
+    def answer(self, key: str, text: str):
+        """Maior valor esperado da chave presente (palavras inteiras, normalizado) no texto."""
+        hay = f" {_norm(text)} "
+        found = [v for v in self._expected.get(key, ()) if _norm(v) and f" {_norm(v)} " in hay]
+        return max(found, key=lambda v: (len(_norm(v)), v)) if found else None
+
+    def _bulk(self, sec: str):
+        text, _, kv = sec.partition("CHAVES_E_VALORES_BRUTOS")
+        keys = [line.split("=", 1)[0].strip() for line in kv.splitlines()[1:] if "=" in line]
+        return keys, text
+
+    def _json(self, sec: str, shared_keys=None):
+        keys = shared_keys
+        m = rx.search(r"SCHEMA[^\n]*:\n(\{.*?\n?\})\s*(?:\n|$)", sec, flags=rx.S)
+        if m:
+            try:
+                keys = list(json.loads(m.group(1)).keys())
+            except ValueError:
+                pass
+        text = sec.split("TEXTO DO DOCUMENTO:", 1)[-1]
+        return keys or [], text
+
+    def create(self, **kwargs):
+        self.calls += 1
+        text = _user_text(kwargs)
+        if "### DOC " in text:
+            head, *secs = rx.split(r"### DOC (D\d+)\n", text)
+            shared = self._json(head)[0] if "SCHEMA" in head else None
+            out = {}
+            for did, sec in zip(secs[0::2], secs[1::2]):
+                keys, body = self._bulk(sec) if "CHAVES_E_VALORES_BRUTOS" in sec else self._json(sec, shared)
+                out[did] = {k: self.answer(k, body) for k in keys}
+            out_text = json.dumps(out, ensure_ascii=False)
+        elif "CHAVES_E_VALORES_BRUTOS" in text:
+            keys, body = self._bulk(text)
+            out_text = ";".join(self.answer(k, body) or "null" for k in keys)
+        elif text.startswith("Campo: "):
+            key, _, body = text[len("Campo: "):].partition("\n")
+            out_text = self.answer(key.strip(), body) or "null"
+        else:
+            keys, body = self._json(text)
+            out_text = json.dumps({k: self.answer(k, body) for k in keys}, ensure_ascii=False)
+        return SimpleNamespace(output_text=out_text, output=[], usage=SimpleNamespace(
+            input_tokens=len(text) // 4, output_tokens=max(1, len(out_text) // 4),
+            input_tokens_details=SimpleNamespace(cached_tokens=0)))
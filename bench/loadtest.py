@@ -0,0 +1,208 @@
+# bench/loadtest.py — carga no app FastAPI (worker/main.py ou app.py) com stand-ins locais: Supabase em
+# memória (bench/fake_supabase.py) e Responses API falsa (bench/fake_llm_server.py), sem rede externa.
+#   python -m bench.loadtest --target main --jobs 100 --items 1-5 --mix oab:1:3,tela:1:1,oab:20:1
+#   python -m bench.loadtest --target app --jobs 50 --db-latency-ms 20 --llm-latency-ms 800 --llm-error-rate 0.05
+# Relata vazão de jobs/itens, percentis de latência (job e item), chamadas ao banco por item e memória.
+import os, sys, json, time, random, asyncio, argparse, importlib, statistics, threading, datetime as dt
+
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+os.environ.setdefault("ANALYSIS_CACHE", "0")
+# main.py/run_job.py leem estas variáveis no import; o cliente real é trocado pelo stand-in logo depois
+os.environ.setdefault("SUPABASE_URL", "http://supabase.loadtest")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "loadtest.fake.key")
+os.environ.setdefault("WORKER_SECRET", "loadtest")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from bench.fixtures import make_pdf, KINDS  # noqa: E402
+from bench.fake_llm_server import serve  # noqa: E402
+from bench.fake_supabase import FakeSupabase  # noqa: E402
+from worker.memory import rss_mb, peak_rss_mb  # noqa: E402
+
+
+def parse_mix(spec: str):
+    """'oab:1:3,tela:1:1,oab:20:1' -> [(tipo, páginas, peso)]; peso/páginas opcionais (1)."""
+    mix = []
+    for part in spec.split(","):
+        kind, pages, weight = (part.split(":") + ["1", "1"])[:3]
+        if kind not in KINDS:
+            raise SystemExit(f"tipo desconhecido no --mix: {kind!r} (use {', '.join(KINDS)})")
+        mix.append((kind, int(pages), float(weight)))
+    return mix
+
+def parse_range(spec: str):
+    lo, _, hi = spec.partition("-")
+    return int(lo), int(hi or lo)
+
+
+def seed_jobs(db: FakeSupabase, jobs: int, items, mix, profiles, seed: int = 0):
+    """jobs + job_items + PDFs no bucket docs; variantes de PDF reaproveitadas (gerar é caro)."""
+    rng = random.Random(seed)
+    pdfs, t0 = {}, dt.datetime(2025, 1, 1)
+    job_rows, item_rows = [], []
+    for j in range(jobs):
+        job_id = f"job-{j:04d}"
+        n = rng.randint(*items)
+        job_rows.append({"id": job_id, "status": "queued", "total_count": n, "done_count": 0, "error_count": 0,
+                         "extraction_profile": rng.choice(profiles) if profiles else None, "profile": None,
+                         "created_at": (t0 + dt.timedelta(seconds=j)).isoformat()})
+        for i in range(n):
+            kind, pages, _ = rng.choices(mix, weights=[m[2] for m in mix])[0]
+            variant = (kind, pages, rng.randrange(4))
+            if variant not in pdfs:
+                pdfs[variant] = make_pdf(kind, variant[2], pages=pages)
+            path = f"{job_id}/{kind}-{pages}p-{i}.pdf"
+            db.put(os.environ.get("BUCKET_DOCS", "docs"), path, pdfs[variant])
+            item_rows.append({"id": f"{job_id}-{i:03d}", "job_id": job_id, "file_name": os.path.basename(path),
+                              "file_path": path, "schema": KINDS[kind][1], "status": "queued",
+                              "created_at": (t0 + dt.timedelta(seconds=j, milliseconds=i)).isoformat()})
+    db.insert_rows("jobs", job_rows)
+    db.insert_rows("job_items", item_rows)
+    return [r["id"] for r in job_rows], len(item_rows)
+
+
+def load_target(name: str, db: FakeSupabase):
+    """Importa o app alvo e troca o cliente supabase pelo stand-in (main: global do módulo; app: run_job._sb)."""
+    if name == "main":
+        mod = importlib.import_module("worker.main")
+        mod.supabase = db
+        return mod.app, {"x-worker-secret": os.environ["WORKER_SECRET"]}
+    mod = importlib.import_module("app")
+    importlib.import_module("worker.run_job")._sb = lambda: db
+    return mod.app, {}
+
+
+class MemSampler:
+    """RSS do processo a cada interval_s numa thread (app, pipeline e stand-ins rodam no mesmo processo)."""
+
+    def __init__(self, interval_s: float = 0.1):
+        self.interval, self.samples = interval_s, []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="mem-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.samples.append(rss_mb())
+
+    def __enter__(self):
+        self.samples.append(rss_mb())
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def pct(values, q):
+    if not values:
+        return 0.0
+    vals = sorted(values)
+    return vals[min(len(vals) - 1, int(round(q / 100 * (len(vals) - 1))))]
+
+
+async def drive(app, headers, job_ids, concurrency: int, rate: float, seed: int = 0):
+    """POST /process-job por job: chegadas Poisson a `rate` jobs/s (0 = todos de uma vez), até `concurrency` em voo."""
+    import httpx
+    rng = random.Random(seed)
+    sem = asyncio.Semaphore(concurrency)
+    lat, status = [], {}
+
+    async def one(client, job_id, delay):
+        await asyncio.sleep(delay)
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                r = await client.post("/process-job", json={"job_id": job_id}, headers=headers)
+                code = r.status_code
+            except Exception as e:  # exceção não tratada no app (ASGITransport repassa)
+                code = type(e).__name__
+            lat.append((time.perf_counter() - t0) * 1000)
+            status[code] = status.get(code, 0) + 1
+
+    delays, t = [], 0.0
+    for _ in job_ids:
+        delays.append(t)
+        t += rng.expovariate(rate) if rate > 0 else 0.0
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as client:
+        await asyncio.gather(*(one(client, j, d) for j, d in zip(job_ids, delays)))
+    return lat, status
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--target", choices=("main", "app"), default="main", help="worker/main.py (async) ou app.py (sync)")
+    ap.add_argument("--jobs", type=int, default=100)
+    ap.add_argument("--items", default="1-5", help="itens por job (N ou MIN-MAX)")
+    ap.add_argument("--mix", default="oab:1:3,tela:1:1,oab:20:1", help="tipo:páginas:peso,...")
+    ap.add_argument("--profiles", default="", help="perfis de extração sorteados por job (ex. fast,accurate)")
+    ap.add_argument("--concurrency", type=int, default=0, help="jobs em voo (0 = --jobs)")
+    ap.add_argument("--rate", type=float, default=0.0, help="chegada de jobs por segundo (0 = todos juntos)")
+    ap.add_argument("--db-latency-ms", type=float, default=10.0)
+    ap.add_argument("--db-error-rate", type=float, default=0.0)
+    ap.add_argument("--llm-latency-ms", type=float, default=600.0)
+    ap.add_argument("--llm-jitter-ms", type=float, default=150.0)
+    ap.add_argument("--llm-capacity", type=int, default=32)
+    ap.add_argument("--llm-error-rate", type=float, default=0.0)
+    ap.add_argument("--llm-rate-limit-rate", type=float, default=0.0)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--json", dest="json_out", help="grava o relatório em JSON (planejamento de capacidade)")
+    args = ap.parse_args()
+
+    server, fake_llm, url = serve(0, latency_ms=args.llm_latency_ms, jitter_ms=args.llm_jitter_ms,
+                                  capacity=args.llm_capacity, error_rate=args.llm_error_rate,
+                                  rate_limit_rate=args.llm_rate_limit_rate)
+    os.environ["OPENAI_BASE_URL"], os.environ["OPENAI_API_KEY"] = url, "test"
+    db = FakeSupabase(latency_ms=args.db_latency_ms, jitter_ms=args.db_latency_ms / 4, error_rate=args.db_error_rate)
+    profiles = [p.strip() for p in args.profiles.split(",") if p.strip()]
+    job_ids, n_items = seed_jobs(db, args.jobs, parse_range(args.items), parse_mix(args.mix), profiles, args.seed)
+    app, headers = load_target(args.target, db)
+    db.calls.clear()
+
+    rss0 = rss_mb()
+    t0 = time.perf_counter()
+    with MemSampler() as mem:
+        lat, status = asyncio.run(drive(app, headers, job_ids, args.concurrency or args.jobs, args.rate, args.seed))
+    wall = time.perf_counter() - t0
+    server.shutdown()
+
+    items = db.rows("job_items")
+    done = [r for r in items if r.get("status") == "done"]
+    item_ms = [r["duration_ms"] for r in done if r.get("duration_ms") is not None]
+    db_calls = {k: v for k, v in db.calls.items() if not k.startswith("storage.")}
+    st_calls = {k: v for k, v in db.calls.items() if k.startswith("storage.")}
+    report = {
+        "target": args.target, "jobs": len(job_ids), "items": n_items, "wall_s": round(wall, 2),
+        "http_status": {str(k): v for k, v in status.items()},
+        "throughput": {"jobs_per_min": round(60 * len(job_ids) / wall, 1), "items_per_s": round(len(done) / wall, 2)},
+        "items_done": len(done), "items_error": sum(r.get("status") == "error" for r in items),
+        "items_unfinished": sum(r.get("status") not in ("done", "error") for r in items),
+        "job_latency_ms": {f"p{q}": round(pct(lat, q)) for q in (50, 95, 99)},
+        "item_latency_ms": {f"p{q}": round(pct(item_ms, q)) for q in (50, 95, 99)},
+        "db_calls_per_item": round(sum(db_calls.values()) / max(1, n_items), 2),
+        "db_calls_by_op_per_item": {k: round(v / max(1, n_items), 2) for k, v in sorted(db_calls.items())},
+        "storage_calls_per_item": round(sum(st_calls.values()) / max(1, n_items), 2),
+        "memory_mb": {"rss_start": round(rss0, 1), "rss_mean": round(statistics.mean(mem.samples), 1),
+                      "rss_max": round(max(mem.samples), 1), "peak_rss": round(peak_rss_mb(), 1)},
+        "llm": {k: fake_llm.stats[k] for k in ("requests", "ok", "429", "500", "max_inflight")},
+        "llm_calls_per_item": round(sum(int(r.get("llm_calls") or 0) for r in done) / max(1, len(done)), 2),
+    }
+
+    print(f"[{args.target}] {report['jobs']} jobs / {n_items} itens em {report['wall_s']} s "
+          f"| HTTP {report['http_status']}")
+    print(f"  vazão: {report['throughput']['jobs_per_min']} jobs/min, {report['throughput']['items_per_s']} itens/s "
+          f"| itens ok={report['items_done']} erro={report['items_error']} sem fim={report['items_unfinished']}")
+    print(f"  latência job  p50/p95/p99 = {'/'.join(str(v) for v in report['job_latency_ms'].values())} ms")
+    print(f"  latência item p50/p95/p99 = {'/'.join(str(v) for v in report['item_latency_ms'].values())} ms")
+    print(f"  banco: {report['db_calls_per_item']} chamadas/item {report['db_calls_by_op_per_item']} "
+          f"| storage: {report['storage_calls_per_item']}/item")
+    print(f"  memória: RSS início={report['memory_mb']['rss_start']} média={report['memory_mb']['rss_mean']} "
+          f"máx={report['memory_mb']['rss_max']} MB")
+    print(f"  LLM: {report['llm']} | {report['llm_calls_per_item']} chamadas/item")
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+# bench/regress.py — gate de regressão (acurácia + latência) sobre o corpus golden, com LLM gravado/replay
+#   python -m bench.regress                      # replay offline; compara com bench/golden/baseline.json
+#   python -m bench.regress --update-baseline    # grava o baseline atual (após mudança aceita)
+#   python -m bench.regress --record             # chama o LLM real e regrava o cassette (requer OPENAI_API_KEY)
+#   python -m bench.regress --recall             # checagem de recall de contexto (não é acurácia; ver --help)
+#   python -m bench.regress --recall --record    # regrava o cassette do recall com o OracleClient (sem API)
+#   python -m bench.regress --profile fast       # acurácia/latência de outro perfil contra o baseline (accurate)
+import os, sys, json, time, argparse, statistics
+import unicodedata as _ud
+import regex as rx
+
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+os.environ.setdefault("ANALYSIS_CACHE", "0")  # latência medida sem o cache de análise (repetições dariam hit)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import worker.anchors_reading_span as pipeline  # noqa: E402
+from bench.fixtures import make_pdf  # noqa: E402
+from bench.llm_cassette import CassetteClient, OracleClient  # noqa: E402
+
+GOLDEN_DIR = os.path.join(ROOT, "bench", "golden")
+MANIFEST = os.path.join(GOLDEN_DIR, "manifest.json")
+BASELINE = os.path.join(GOLDEN_DIR, "baseline.json")
+CASSETTE = os.path.join(GOLDEN_DIR, "llm_cassette.json")  # respostas do modelo real (--record)
+# recall de contexto: OracleClient responde o esperado quando ele está no prompt; cassette e baseline
+# próprios, nunca misturados com os da acurácia
+RECALL_CASSETTE = os.path.join(GOLDEN_DIR, "recall_cassette.json")
+RECALL_BASELINE = os.path.join(GOLDEN_DIR, "recall_baseline.json")
+
+
+def norm_value(v) -> str:
+    """Comparação tolerante: sem acento, minúsculas, só letras/dígitos separados por espaço."""
+    if v is None:
+        return ""
+    s = "".join(ch for ch in _ud.normalize("NFD", str(v)) if _ud.category(ch) != "Mn")
+    return rx.sub(r"[^a-z0-9]+", " ", s.lower()).strip()
+
+def _p(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return float(values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))])
+
+def load_pdf(case: dict) -> bytes:
+    if "fixture" in case:
+        fx = case["fixture"]
+        return make_pdf(fx["kind"], fx.get("n", 0), fx.get("pages", 1))
+    with open(os.path.join(GOLDEN_DIR, case["pdf_path"]), "rb") as f:
+        return f.read()
+
+
+def run_case(case: dict, repeat: int, speculative=None, profile=None) -> dict:
+    pdf = load_pdf(case)
+    runs, outputs = [], []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        final, meta = pipeline.process_pdf_with_meta(pdf, case["schema"], speculative=speculative, profile=profile)
+        total_ms = (time.perf_counter() - t0) * 1000
+        llm = meta.get("llm") or {}
+        stages = {"heuristics": sum(meta.get("timing", {}).get("per_page_seconds", [])) * 1000}
+        for st, agg in (llm.get("by_stage") or {}).items():
+            stages[f"llm_{st}"] = agg.get("latency_ms", 0)
+        runs.append({"total_ms": total_ms, "stages": stages, "llm_calls": llm.get("calls", 0)})
+        outputs.append(final)
+
+    final = outputs[0]
+    fields = {}
+    for k, exp in case["expected"].items():
+        got = final.get(k)
+        fields[k] = {"exact": got == exp, "norm": norm_value(got) == norm_value(exp),
+                     "got": got, "expected": exp}
+    return {
+        "id": case["id"],
+        "fields": fields,
+        "deterministic": all(o == final for o in outputs),
+        "llm_calls": runs[0]["llm_calls"],
+        "runs": runs,
+    }
+
+
+def summarize(results: list, version) -> dict:
+    all_fields = [(r["id"], k, f) for r in results for k, f in r["fields"].items()]
+    totals = [run["total_ms"] for r in results for run in r["runs"]]
+    stage_names = sorted({s for r in results for run in r["runs"] for s in run["stages"]})
+    return {
+        "version": version,
+        "docs": len(results),
+        "fields": len(all_fields),
+        "accuracy_exact": round(sum(f["exact"] for _, _, f in all_fields) / max(1, len(all_fields)), 4),
+        "accuracy_norm": round(sum(f["norm"] for _, _, f in all_fields) / max(1, len(all_fields)), 4),
+        "per_field": {f"{cid}.{k}": {"exact": f["exact"], "norm": f["norm"]} for cid, k, f in all_fields},
+        "llm_calls_per_doc": round(statistics.mean(r["llm_calls"] for r in results), 3) if results else 0,
+        "latency_ms": {"p50": round(_p(totals, 50), 2), "p95": round(_p(totals, 95), 2)},
+        "stage_p95_ms": {s: round(_p([run["stages"].get(s, 0) for r in results for run in r["runs"]], 95), 2)
+                         for s in stage_names},
+        "nondeterministic": [r["id"] for r in results if not r["deterministic"]],
+    }
+
+
+def compare(cur: dict, base: dict, tol: dict) -> list:
+    """Lista de regressões (vazia = passou)."""
+    fails = []
+    misses = cur.get("replay_misses", 0)
+    if misses > tol.get("max_replay_misses", 0):
+        fails.append(f"{misses} chamada(s) LLM fora do cassette (prompt mudou?): regrave com --record")
+    drop = base["accuracy_norm"] - cur["accuracy_norm"]
+    if drop > tol.get("max_accuracy_drop", 0.0) + 1e-9:
+        fails.append(f"acurácia (normalizada) caiu {drop:.2%}: {base['accuracy_norm']:.2%} -> {cur['accuracy_norm']:.2%}")
+    lost = [f for f, v in base.get("per_field", {}).items()
+            if v["norm"] and not cur["per_field"].get(f, {}).get("norm", False)]
+    if len(lost) > tol.get("max_field_drops", 0):
+        fails.append(f"{len(lost)} campo(s) que acertavam passaram a errar: {', '.join(lost)}")
+    b95, c95 = base["latency_ms"]["p95"], cur["latency_ms"]["p95"]
+    limit = b95 * (1 + tol.get("max_p95_regression", 0.25)) + tol.get("p95_slack_ms", 0)
+    if c95 > limit:
+        fails.append(f"latência p95 {c95:.1f}ms > limite {limit:.1f}ms (baseline {b95:.1f}ms)")
+    bcalls, ccalls = base["llm_calls_per_doc"], cur["llm_calls_per_doc"]
+    if ccalls > bcalls * (1 + tol.get("max_llm_calls_increase", 0.0)) + 1e-9:
+        fails.append(f"chamadas LLM por doc subiram: {bcalls} -> {ccalls}")
+    if cur["nondeterministic"]:
+        fails.append(f"saída não determinística entre repetições: {', '.join(cur['nondeterministic'])}")
+    return fails
+
+
+def print_report(results: list, cur: dict, base):
+    metric = "recall de contexto" if cur.get("check") == "recall" else "acurácia"
+    for r in results:
+        ok = sum(f["norm"] for f in r["fields"].values())
+        lat = statistics.median(run["total_ms"] for run in r["runs"])
+        print(f"[{r['id']}] {ok}/{len(r['fields'])} campos | llm_calls={r['llm_calls']} | {lat:.1f}ms")
+        for k, f in r["fields"].items():
+            if not f["norm"]:
+                print(f"    x {k}: got={f['got']!r} expected={f['expected']!r}")
+            elif not f["exact"]:
+                print(f"    ~ {k}: got={f['got']!r} (igual normalizado)")
+    print(f"\n{metric} exata={cur['accuracy_exact']:.2%} normalizada={cur['accuracy_norm']:.2%} "
+          f"| llm_calls/doc={cur['llm_calls_per_doc']} | p50={cur['latency_ms']['p50']}ms "
+          f"p95={cur['latency_ms']['p95']}ms")
+    print("p95 por estágio: " + ", ".join(f"{s}={v}ms" for s, v in cur["stage_p95_ms"].items()))
+    if base:
+        print(f"baseline ({metric}): exata={base['accuracy_exact']:.2%} normalizada={base['accuracy_norm']:.2%} "
+              f"| llm_calls/doc={base['llm_calls_per_doc']} | p95={base['latency_ms']['p95']}ms")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=5, help="execuções por documento (latência)")
+    ap.add_argument("--update-baseline", action="store_true")
+    ap.add_argument("--record", action="store_true", help="usa o LLM real e regrava o cassette")
+    ap.add_argument("--recall", action="store_true",
+                    help="checagem de recall de contexto: o OracleClient responde o valor esperado quando ele está "
+                         "no prompt, então mede se o valor chega ao contexto de cada estágio, NÃO a acurácia do "
+                         "modelo; usa recall_cassette.json/recall_baseline.json (com --record, regrava sem API)")
+    ap.add_argument("--only", default=None, help="ids de casos separados por vírgula")
+    ap.add_argument("--speculative", action="store_true", help="roda a pipeline no modo especulativo")
+    ap.add_argument("--profile", default="accurate", help="perfil de extração (o baseline é do accurate)")
+    ap.add_argument("--json", dest="json_out", default=None, help="grava o resumo atual neste arquivo")
+    args = ap.parse_args(argv)
+
+    with open(MANIFEST, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    cases = manifest["cases"]
+    if args.only:
+        wanted = set(args.only.split(","))
+        cases = [c for c in cases if c["id"] in wanted]
+
+    cassette_path, baseline_path = (RECALL_CASSETTE, RECALL_BASELINE) if args.recall else (CASSETTE, BASELINE)
+    if args.record and args.recall:
+        # regrava do zero: entradas de prompts antigos não ficam no arquivo
+        cassette = CassetteClient(RECALL_CASSETTE, "record", inner=OracleClient(manifest["cases"]))
+        cassette.entries = {}
+    elif args.record:
+        pipeline.set_llm_client(None)
+        real = pipeline._get_openai_client()
+        if real is None:
+            print("[ERR] --record exige openai instalado e OPENAI_API_KEY"); return 2
+        cassette = CassetteClient(CASSETTE, "record", inner=real)
+    elif not os.path.isfile(cassette_path):
+        print(f"[ERR] sem cassette em {cassette_path}: " +
+              ("rode --recall --record" if args.recall else
+               "grave as respostas do modelo real com --record --update-baseline (OPENAI_API_KEY)"))
+        return 2
+    else:
+        cassette = CassetteClient(cassette_path, "replay")
+    pipeline.set_llm_client(cassette)
+
+    pipeline.process_pdf_with_meta(load_pdf(cases[0]), cases[0]["schema"])  # aquecimento (imports, fontes)
+    results = [run_case(c, max(1, args.repeat), args.speculative or None, args.profile) for c in cases]
+    cassette.save()
+    cur = summarize(results, manifest.get("version"))
+    cur["replay_misses"] = cassette.misses
+    cur["check"] = "recall" if args.recall else "accuracy"
+    print(f"cassette: hits={cassette.hits} misses={cassette.misses} gravadas={cassette.recorded}")
+
+    base = None
+    if os.path.isfile(baseline_path) and not args.only:
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            base = json.load(f)
+    print_report(results, cur, base)
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(cur, f, ensure_ascii=False, indent=2)
+
+    if args.update_baseline:
+        if args.only:
+            print("[ERR] --update-baseline exige o corpus completo (sem --only)"); return 2
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(cur, f, ensure_ascii=False, indent=2)
+        print(f"baseline atualizado: {baseline_path}")
+        return 0
+    if base is None:
+        print("sem baseline para comparar (rode com --update-baseline)")
+        return 0 if args.only else 2
+    if base.get("check", "accuracy") != cur["check"]:
+        print(f"[ERR] {baseline_path} não é um baseline de {cur['check']}"); return 2
+    if base.get("version") != cur["version"]:
+        print(f"[ERR] baseline é da versão {base.get('version')} do corpus, manifest é {cur['version']}: "
+              "rode --update-baseline"); return 2
+
+    fails = compare(cur, base, manifest.get("tolerances", {}))
+    if fails:
+        print("\nREGRESSÃO:")
+        for f in fails:
+            print(f"  - {f}")
+        return 1
+    print("\nOK: sem regressão dentro das tolerâncias")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
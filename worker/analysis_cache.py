@@ -0,0 +1,226 @@
+# analysis_cache.py — análise de página independente do schema (palavras, layout, âncoras genéricas,
+# texto), reaproveitada entre execuções do mesmo PDF e persistida em disco (.npz por hash do PDF)
+import os, json, hashlib, tempfile, threading
+import numpy as np
+import fitz  # PyMuPDF
+
+from worker.page_words import PageWords
+from worker.tables import detect_tables, TABLE_STAGE
+from worker.log import get_logger, log_event
+
+import logging
+log = get_logger("worker.analysis_cache")
+
+ANALYSIS_CACHE = os.environ.get("ANALYSIS_CACHE", "1") == "1"
+ANALYSIS_CACHE_DIR = os.environ.get("ANALYSIS_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "pdf_analysis_cache")
+ANALYSIS_CACHE_MAX_MB = float(os.environ.get("ANALYSIS_CACHE_MAX_MB", "256"))
+# suba quando PageWords/calibrate_layout/find_generic_anchors/detect_tables mudarem (entradas antigas viram miss)
+ANALYSIS_VERSION = 2
+_CHUNK = 1 << 20
+
+
+def pdf_hash(src) -> str:
+    """sha256 do PDF (bytes ou caminho; arquivo lido em blocos)."""
+    h = hashlib.sha256()
+    if isinstance(src, (bytes, bytearray, memoryview)):
+        h.update(src)
+    else:
+        with open(os.fspath(src), "rb") as f:
+            for chunk in iter(lambda: f.read(_CHUNK), b""):
+                h.update(chunk)
+    return h.hexdigest()
+
+
+class DocAnalysis:
+    """
+    Texto cru e PageWords de cada página, calculados sob demanda (um TextPage por página) ou
+    vindos do cache. Tabelas (TABLE_STAGE), layout e âncoras genéricas ficam no cache da PageWords
+    ("tables", "layout", "generic_anchors") e são persistidos junto. `hits` conta páginas servidas do cache.
+    """
+
+    def __init__(self, doc, texts=None, words=None):
+        self.doc = doc
+        self.n_pages = len(doc)
+        self.texts = dict(texts or {})
+        self.words = dict(words or {})
+        self.hits = 0
+
+    def text(self, pno: int) -> str:
+        t = self.texts.get(pno)
+        if t is None:
+            t = self.texts[pno] = self.doc[pno].get_text("text") or ""
+        return t
+
+    def page(self, pno: int):
+        """(texto cru, PageWords) da página."""
+        pw = self.words.get(pno)
+        if pw is not None:
+            self.hits += 1
+            if TABLE_STAGE:  # entrada gravada com TABLE_STAGE=0 não tem as tabelas
+                pw.cached("tables", lambda p: detect_tables(self.doc[pno], p))
+            return self.text(pno), pw
+        page = self.doc[pno]
+        tp = page.get_textpage()
+        if pno not in self.texts:
+            self.texts[pno] = page.get_text("text", textpage=tp) or ""
+        pw = self.words[pno] = PageWords.from_page(page, textpage=tp)
+        if TABLE_STAGE:
+            pw.cached("tables", lambda p: detect_tables(page, p))
+        return self.texts[pno], pw
+
+    def signature(self) -> tuple:
+        """O que há para persistir; layout/âncoras genéricas surgem depois do page(), no process_page."""
+        pws = self.words.values()
+        return (len(self.texts), len(self.words), sum(pw.peek("tables") is not None for pw in pws),
+                sum(pw.peek("layout") is not None for pw in pws),
+                sum(pw.peek("generic_anchors") is not None for pw in pws))
+
+
+# ---------------- formato binário ----------------
+def _pack_strings(items):
+    enc = [s.encode("utf-8") for s in items]
+    lens = np.fromiter((len(b) for b in enc), dtype=np.int32, count=len(enc))
+    return np.frombuffer(b"".join(enc), dtype=np.uint8), lens
+
+def _unpack_strings(blob, lens):
+    raw = blob.tobytes()
+    out, pos = [], 0
+    for n in lens.tolist():
+        out.append(raw[pos:pos + n].decode("utf-8"))
+        pos += n
+    return out
+
+def _encode(a: DocAnalysis) -> dict:
+    t_pnos = sorted(a.texts)
+    w_pnos = sorted(a.words)
+    pws = [a.words[p] for p in w_pnos]
+    word_text, word_lens = _pack_strings([t for pw in pws for t in pw.text])
+    layout = np.full((len(pws), 4), np.nan, dtype=np.float64)  # float64: limiares idênticos aos recalculados
+    anc_done = np.zeros(len(pws), dtype=bool)
+    anc_count, anc_f, anc_span, anc_keys = [], [], [], []
+    for i, pw in enumerate(pws):
+        cfg = pw.peek("layout")
+        if cfg is not None:
+            layout[i] = (cfg["Y_BAND"], cfg["GAP_MAX"], cfg["LINE_JUMP"], cfg["RADIUS"])
+        gen = pw.peek("generic_anchors")
+        anc_done[i] = gen is not None
+        anc_count.append(len(gen or ()))
+        for g in gen or ():
+            anc_f.append((*g["anchor"], *g["label_bbox"], *g["gutter"], g["score"]))
+            anc_span.append((min(g["label_span"]), max(g["label_span"])))
+            anc_keys.append(g["key"])
+    text_blob, text_lens = _pack_strings([a.texts[p] for p in t_pnos])
+    key_blob, key_lens = _pack_strings(anc_keys)
+    # tabelas: pequenas e aninhadas (linhas x colunas de índices) -> JSON por página ("" = não detectado)
+    tab_blob, tab_lens = _pack_strings([json.dumps(pw.peek("tables")) if pw.peek("tables") is not None else ""
+                                        for pw in pws])
+    return {
+        "meta": np.frombuffer(json.dumps({"version": ANALYSIS_VERSION, "pages": a.n_pages,
+                                          "pymupdf": fitz.VersionBind}).encode(), dtype=np.uint8),
+        "text_pnos": np.asarray(t_pnos, dtype=np.int32), "text_blob": text_blob, "text_lens": text_lens,
+        "word_pnos": np.asarray(w_pnos, dtype=np.int32),
+        "word_count": np.asarray([len(pw) for pw in pws], dtype=np.int32),
+        "boxes": (np.concatenate([np.stack((pw.x0, pw.y0, pw.x1, pw.y1), axis=1) for pw in pws])
+                  if pws else np.zeros((0, 4), dtype=np.float32)),
+        "bold": np.concatenate([pw.bold for pw in pws]) if pws else np.zeros(0, dtype=bool),
+        "word_blob": word_text, "word_lens": word_lens,
+        "layout": layout, "anc_done": anc_done, "anc_count": np.asarray(anc_count, dtype=np.int32),
+        "anc_f": np.asarray(anc_f, dtype=np.float64).reshape(-1, 9),
+        "anc_span": np.asarray(anc_span, dtype=np.int32).reshape(-1, 2),
+        "anc_blob": key_blob, "anc_lens": key_lens,
+        "tab_blob": tab_blob, "tab_lens": tab_lens,
+    }
+
+def _decode(z, doc) -> DocAnalysis:
+    meta = json.loads(z["meta"].tobytes())
+    if meta.get("version") != ANALYSIS_VERSION or meta.get("pages") != len(doc) \
+            or meta.get("pymupdf") != fitz.VersionBind:
+        return None
+    texts = dict(zip(z["text_pnos"].tolist(), _unpack_strings(z["text_blob"], z["text_lens"])))
+    words_all = _unpack_strings(z["word_blob"], z["word_lens"])
+    keys_all = _unpack_strings(z["anc_blob"], z["anc_lens"])
+    tables_all = _unpack_strings(z["tab_blob"], z["tab_lens"])
+    boxes, bold, layout = z["boxes"], z["bold"], z["layout"]
+    anc_f, anc_span, anc_done = z["anc_f"], z["anc_span"], z["anc_done"]
+    words, w0, a0 = {}, 0, 0
+    for i, (pno, n, na) in enumerate(zip(z["word_pnos"].tolist(), z["word_count"].tolist(), z["anc_count"].tolist())):
+        b = boxes[w0:w0 + n]
+        pw = PageWords(b[:, 0], b[:, 1], b[:, 2], b[:, 3], words_all[w0:w0 + n], bold[w0:w0 + n])
+        if not np.isnan(layout[i, 0]):
+            pw.store("layout", dict(zip(("Y_BAND", "GAP_MAX", "LINE_JUMP", "RADIUS"), map(float, layout[i]))))
+        if tables_all[i]:
+            pw.store("tables", [{"bbox": tuple(t["bbox"]), "cells": t["cells"],
+                                 "boxes": [[tuple(b) if b else None for b in row] for row in t["boxes"]]}
+                                for t in json.loads(tables_all[i])])
+        if anc_done[i]:
+            pw.store("generic_anchors", [{
+                "key": keys_all[j], "anchor": (float(f[0]), float(f[1])),
+                "label_span": set(range(int(anc_span[j, 0]), int(anc_span[j, 1]) + 1)),
+                "label_bbox": tuple(float(v) for v in f[2:6]), "gutter": (float(f[6]), float(f[7])),
+                "score": int(f[8]), "origin": "generic",
+            } for j, f in ((j, anc_f[j]) for j in range(a0, a0 + na))])
+        words[pno] = pw
+        w0 += n
+        a0 += na
+    return DocAnalysis(doc, texts, words)
+
+
+class AnalysisStore:
+    """Cache em disco: um .npz comprimido por hash de PDF; despejo LRU (mtime) acima de max_mb."""
+
+    def __init__(self, root: str = ANALYSIS_CACHE_DIR, max_mb: float = ANALYSIS_CACHE_MAX_MB):
+        self.root = root
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.npz")
+
+    def load(self, key: str, doc) -> DocAnalysis:
+        """Análise gravada para o PDF (ou uma vazia, se não houver / estiver inválida)."""
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as z:
+                a = _decode(z, doc)
+            os.utime(path)  # LRU
+        except FileNotFoundError:
+            a = None
+        except Exception as e:  # arquivo corrompido/formato antigo: recalcula
+            log_event(log, logging.WARNING, "analysis_cache.bad_entry", err=type(e).__name__)
+            a = None
+        return a if a is not None else DocAnalysis(doc)
+
+    def save(self, key: str, a: DocAnalysis):
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez_compressed(f, **_encode(a))
+            os.replace(tmp, self._path(key))
+        except Exception:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        self.evict()
+
+    def evict(self):
+        with self._lock:
+            try:
+                entries = [e for e in os.scandir(self.root) if e.name.endswith(".npz")]
+            except FileNotFoundError:
+                return
+            stats = sorted(((e.stat().st_mtime, e.stat().st_size, e.path) for e in entries))
+            total = sum(s for _, s, _ in stats)
+            for _, size, path in stats:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+
+
+STORE = AnalysisStore() if ANALYSIS_CACHE else None
@@ -1,22 +1,50 @@
 # anchors_reading_span.py (LLM fallback + timers, sem desenho, com LLM-bulk sanitize/fill + JSON extractor final)
-import os, json, math, unicodedata, time, statistics
+import os, json, math, time, statistics, threading, contextvars, functools
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import regex as rx
 import fitz  # PyMuPDF
 
+from worker.llm_context import (build_roi_context, context_window, window_mask, _clip_tokens,
+                                ROI_TOKEN_BUDGET_BULK, ROI_TOKEN_BUDGET_JSON)
+from worker.field_types import (infer_field_type, infer_field_types, find_typed, scan_typed_candidates,
+                                LOOSE_TYPES)
+from worker.similarity import cosine_matrix, assign_one_to_one
+from worker.llm_usage import current_usage, track_usage, usage_from_response
+from worker.log import get_logger, log_event, log_field_event
+from worker.llm_batch import current_batcher
+from worker.deadline import current_deadline, use_deadline, LLM_TIMEOUT_S, LLM_MIN_CALL_S
+from worker.llm_gateway import GATEWAY
+from worker.memory import MemoryGuard, RollingText, peak_rss_mb
+from worker.analysis_cache import DocAnalysis, STORE as ANALYSIS_STORE, pdf_hash
+from worker.profiles import current_profile, use_profile, get_profile
+from worker.tables import resolve_table_fields
+from worker.prompts import PROMPT_VERSION, cache_key, value_input, bulk_input, json_input, batch_input
+from worker.layout import current_layouts, fingerprint, seed_anchors, geometry_entry
+from worker.sanitizer_model import get_sanitizer, log_pairs
+from worker.normalize import value_types, normalize_values
+
+import logging
+log = get_logger("worker.pipeline")
+
 # ------------- LLM (opcional) -------------
 from dotenv import load_dotenv, find_dotenv
 _ = load_dotenv(find_dotenv(usecwd=True)) or load_dotenv(os.path.join(os.getcwd(), ".env")) \
     or load_dotenv(os.path.join(os.path.dirname(__file__), "..", ".env"))
 
+# chave geral do processo; estágios, tetos de tokens, esforço e páginas vêm do perfil (worker/profiles.py)
 ENABLE_LLM_FALLBACK = True
 LLM_MODEL = "gpt-5-mini"
-LLM_MAX_OUTPUT_TOKENS = 80
-LLM_REASONING_EFFORT = "minimal"  # minimal|low|medium|high
 LLM_TEXT_VERBOSITY = "low"        # low|medium|high
-LLM_SANITIZE_EXISTING = True      # se True, sobrescreve com versão sanitizada mesmo quando já havia valor
-# LLM só em casos compostos ou quando há âncora do schema mas faltou texto
-LLM_ONLY_MISSING_OR_COMPOSED = True
+_EFFORT_ORDER = ("minimal", "low", "medium", "high")
+# modo especulativo (opt-in): JSON extractor disparado junto com as heurísticas; latência ~ max(heurística, 1 LLM)
+LLM_SPECULATIVE = os.environ.get("LLM_SPECULATIVE", "0") == "1"
+SPEC_CONFIDENT = 0.9     # todas as chaves >= isto: a chamada especulativa é cancelada/ignorada
+SPEC_LLM_CONFIDENCE = 0.7  # confiança atribuída ao valor do LLM no merge
+# pré-varredura: só páginas com rótulos/valores do schema passam pela pipeline completa
+PAGE_PRESCAN = os.environ.get("PAGE_PRESCAN", "1") == "1"
+PRESCAN_MIN_PAGES = int(os.environ.get("PRESCAN_MIN_PAGES", "3"))            # docs com até N páginas: todas
+PRESCAN_FALLBACK_PAGES = int(os.environ.get("PRESCAN_FALLBACK_PAGES", "1"))  # primeiras N páginas sempre entram
 
 
 _openai_client_cached = None
@@ -28,31 +56,60 @@ def _get_openai_client():
         try:
             from openai import OpenAI
         except Exception as e:
-            print(f"[LLM] import openai falhou: {e}")
+            log_event(log, logging.WARNING, "llm.client", outcome="import_failed", err=str(e))
             return None
         api_key = (os.environ.get("OPENAI_API_KEY") or
                    os.environ.get("OPENAI_APIKEY") or
                    os.environ.get("OPENAI_KEY"))
         if not api_key:
-            print("[LLM] API key não encontrada nas env vars (OPENAI_API_KEY / OPENAI_APIKEY / OPENAI_KEY).")
+            log_event(log, logging.WARNING, "llm.client", outcome="no_api_key",
+                      hint="OPENAI_API_KEY / OPENAI_APIKEY / OPENAI_KEY")
             return None
-        _openai_client_cached = OpenAI(api_key=api_key)
+        # retries ficam no GATEWAY (com jitter e respeitando o deadline), não no SDK
+        _openai_client_cached = OpenAI(api_key=api_key, max_retries=0)
         return _openai_client_cached
     except Exception as e:
-        print(f"[LLM] erro criando cliente: {e}")
+        log_event(log, logging.ERROR, "llm.client", outcome="error", err=str(e))
         return None
 
+def set_llm_client(client):
+    """Troca o cliente LLM (qualquer objeto com .responses.create); None volta ao OpenAI do ambiente."""
+    global _openai_client_cached
+    _openai_client_cached = client
+
 def _responses_create_safe(**kwargs):
+    """
+    Chamada à Responses API via GATEWAY (AIMD, retry com jitter, circuit breaker); o timeout
+    vem do deadline do documento (teto LLM_TIMEOUT_S). Retorna (resp, None) ou (None, erro).
+    """
     try:
         client = _get_openai_client()
         if not client:
             return None, "no_client"
-        resp = client.responses.create(**kwargs)
-        return resp, None
+        return GATEWAY.call(client.responses.create, kwargs, deadline=current_deadline(),
+                            default_timeout=LLM_TIMEOUT_S, min_call_s=LLM_MIN_CALL_S)
     except Exception as e:
         return None, str(e)
 
+# contadores agregados do processo (todas as threads); o detalhe por documento fica no LLMUsage
 LLM_STATS = {"attempts": 0, "success": 0}
+_llm_stats_lock = threading.Lock()
+def _stat_inc(name: str):
+    with _llm_stats_lock:
+        LLM_STATS[name] += 1
+
+def _err_outcome(err) -> str:
+    # recusas locais (circuito aberto, sem orçamento) não são erros do modelo
+    return err if err in ("circuit_open", "deadline") else "error"
+
+def _record_llm(stage, outcome, t0=None, resp=None, key=None):
+    """Registra a chamada no LLMUsage do documento corrente (stage, tokens, latência, desfecho)."""
+    usage = current_usage()
+    if usage is None:
+        return
+    i_tok, o_tok, c_tok = usage_from_response(resp) if resp is not None else (0, 0, 0)
+    ms = (time.perf_counter() - t0) * 1000 if t0 is not None else 0
+    usage.record(stage, outcome, i_tok, o_tok, c_tok, ms, key)
 
 # ---------------- helpers de texto ----------------
 import unicodedata as _ud
@@ -80,11 +137,8 @@ def sanitize_value_text(text: str) -> str:
         s = rx.sub(r"^[^:]*:\s*", "", s)
     return s.strip()
 
-def page_text_from_words(words_xy, max_chars=2000):
-    def yc(w): return 0.5*(w[1]+w[3])
-    def xc(w): return 0.5*(w[0]+w[2])
-    seq = sorted(words_xy, key=lambda w: (yc(w), xc(w)))
-    text = " ".join(str(w[4]) for w in seq if str(w[4]).strip())
+def page_text_from_words(pw, max_chars=2000):
+    text = " ".join(t for t in (pw.text[i] for i in pw.reading_order()) if t.strip())
     if len(text) > max_chars:
         text = text[:max_chars]
     return text
@@ -100,87 +154,44 @@ def _schema_keys_null(schema: dict) -> dict:
 
 # ---------------- LLM por campo (fallback) ----------------
 def llm_extract_value(key: str, context: str):
-    try:
-        LLM_STATS["attempts"] += 1
-    except Exception:
-        pass
+    _stat_inc("attempts")
+    prof = current_profile()
 
-    if not ENABLE_LLM_FALLBACK:
-        print(f"[LLM] skip (disabled) key={key!r}")
+    if not (ENABLE_LLM_FALLBACK and prof.llm):
+        log_field_event(log, "llm.value", key=key, outcome="skip", reason="disabled")
         return None
     if not context or not str(context).strip():
-        print(f"[LLM] skip (empty_context) key={key!r}")
+        log_field_event(log, "llm.value", key=key, outcome="skip", reason="empty_context")
         return None
 
     ctx = str(context).strip()
     if len(ctx) > 320:
         ctx = ctx[:320]
 
-    k = (key or "").lower()
-    RX_PHONE = rx.compile(r"\b(?:\(?\d{2}\)?\s*)?\d{4,5}[-\s]?\d{4}\b")
-    RX_NUM   = rx.compile(r"\b\d{3,6}\b")
-    RX_CPF   = rx.compile(r"\b\d{3}\.?(\d{3}\.){1}\d{3}-?\d{2}\b")
-    RX_DATE  = rx.compile(r"\b([0-3]?\d)[/.-]([01]?\d)[/.-]([12]\d{3})\b")
-
-    def _first(rx_pat):
-        m = rx_pat.search(ctx)
-        return m.group(0) if m else None
-
-    if "telefone" in k:
-        hit = _first(RX_PHONE)
-        if hit:
-            print(f"[LLM] fast-path telefone key={key!r} -> {hit}")
-            try: LLM_STATS["success"] += 1
-            except Exception: pass
-            return hit
-
-    if any(t in k for t in ("inscricao", "n_registro", "registro", "oab")):
-        hit = _first(RX_NUM)
+    # fast-path tipado (mesmos padrões/validadores do estágio de campos tipados)
+    ftype = infer_field_type(key)
+    if ftype:
+        hit = find_typed(ftype, ctx)
         if hit:
-            print(f"[LLM] fast-path num key={key!r} -> {hit}")
-            try: LLM_STATS["success"] += 1
-            except Exception: pass
-            return hit
-
-    if "cpf" in k:
-        hit = _first(RX_CPF)
-        if hit:
-            print(f"[LLM] fast-path cpf key={key!r} -> {hit}")
-            try: LLM_STATS["success"] += 1
-            except Exception: pass
-            return hit
-
-    if "data" in k:
-        hit = _first(RX_DATE)
-        if hit:
-            print(f"[LLM] fast-path data key={key!r} -> {hit}")
-            try: LLM_STATS["success"] += 1
-            except Exception: pass
+            log_field_event(log, "llm.value", key=key, outcome="fast_path", type=ftype, chars=len(hit))
+            _stat_inc("success")
+            _record_llm("value", "fast_path", key=key)
             return hit
 
     start_t = time.perf_counter()
     client = _get_openai_client()
     if not client:
-        print(f"[LLM] skip (no_client) key={key!r}")
+        log_field_event(log, "llm.value", key=key, outcome="skip", reason="no_client")
+        _record_llm("value", "no_client", key=key)
         return None
 
-    system_msg = (
-        "Você é um extrator. Dado um trecho de OCR possivelmente ruidoso, "
-        "retorne SOMENTE o valor do campo especificado, sem comentários. "
-        "Se achar a informação no trecho, responda com o valor exato. "
-        "Se não existir no trecho, responda exatamente: null."
-    )
-    user_msg = f"Campo: {key}\nTrecho:\n{ctx}\nResponda apenas o valor, ou null."
-
     payload = dict(
         model=LLM_MODEL,
-        input=[
-            {"role": "system", "content": [{"type": "input_text", "text": system_msg}]},
-            {"role": "user",   "content": [{"type": "input_text", "text": user_msg}]},
-        ],
-        reasoning={"effort": LLM_REASONING_EFFORT},
+        input=value_input(key, ctx),
+        **cache_key("value"),
+        reasoning={"effort": prof.reasoning_effort},
         text={"verbosity": LLM_TEXT_VERBOSITY},
-        max_output_tokens=max(8, int(LLM_MAX_OUTPUT_TOKENS or 24)),
+        max_output_tokens=max(8, int(prof.value_max_tokens or 24)),
     )
 
     try:
@@ -188,13 +199,15 @@ def llm_extract_value(key: str, context: str):
             resp, err = _responses_create_safe(**payload)
             if err or not resp:
                 dur = time.perf_counter() - start_t
-                print(f"[LLM] error key={key!r} took={dur:.2f}s err={err or 'unknown'}")
+                log_event(log, logging.WARNING, "llm.value", key=key, outcome=_err_outcome(err), ms=int(dur*1000), err=err or "unknown")
+                _record_llm("value", _err_outcome(err), start_t, key=key)
                 return None
         else:
             resp = client.responses.create(**payload)
     except Exception as e:
         dur = time.perf_counter() - start_t
-        print(f"[LLM] exception key={key!r} took={dur:.2f}s err={e}")
+        log_event(log, logging.WARNING, "llm.value", key=key, outcome="error", ms=int(dur*1000), err=str(e))
+        _record_llm("value", "error", start_t, key=key)
         return None
 
     out = getattr(resp, "output_text", None)
@@ -211,76 +224,64 @@ def llm_extract_value(key: str, context: str):
 
     if not out:
         dur = time.perf_counter() - start_t
-        print(f"[LLM] empty_output key={key!r} took={dur:.2f}s")
+        log_field_event(log, "llm.value", key=key, outcome="empty_output", ms=int(dur*1000))
+        _record_llm("value", "empty_output", start_t, resp, key)
         return None
 
     val = out.strip().splitlines()[0].strip(" \t'\"")
     if val.lower() == "null" or val == "":
         dur = time.perf_counter() - start_t
-        print(f"[LLM] no_value key={key!r} took={dur:.2f}s -> null")
+        log_field_event(log, "llm.value", key=key, outcome="no_value", ms=int(dur*1000))
+        _record_llm("value", "no_value", start_t, resp, key)
         return None
 
     dur = time.perf_counter() - start_t
-    try:
-        LLM_STATS["success"] += 1
-    except Exception:
-        pass
-    shown = (val[:80] + "…") if len(val) > 80 else val
-    print(f"[LLM] key={key!r} took={dur:.2f}s -> {shown}")
+    _stat_inc("success")
+    _record_llm("value", "ok", start_t, resp, key)
+    log_field_event(log, "llm.value", key=key, outcome="ok", ms=int(dur*1000), chars=len(val))
     return val
 
 # -------- LLM em lote (página): preencher + sanitizar --------
 def llm_sanitize_and_fill_bulk(keys, page_text, current_values):
-    if not ENABLE_LLM_FALLBACK:
+    prof = current_profile()
+    if not (ENABLE_LLM_FALLBACK and prof.llm):
         return [ (current_values.get(k) or "").strip() or "null" for k in keys ]
     client = _get_openai_client()
     if not client:
-        print("[LLM-BULK] skip (no_client)")
+        log_event(log, logging.INFO, "llm.bulk", outcome="skip", reason="no_client")
+        _record_llm("bulk", "no_client")
         return [ (current_values.get(k) or "").strip() or "null" for k in keys ]
 
-    kv_lines = [f"{k}={(current_values.get(k) or '').strip()}" for k in keys]
-
-    system_msg = (
-        "Você é um extrator/sanitizador. Dado um TEXTO OCR e uma LISTA ordenada de chaves com valores brutos, "
-        "retorne, NA MESMA ORDEM DAS CHAVES, apenas os valores finais, separados por ponto e vírgula. "
-        "Regras:\n"
-        "- Se um valor bruto existir mas estiver sujo, normalize-o (datas dd/mm/aaaa; telefones com DDD; remova prefixos 'rótulo:' etc.).\n"
-        "- Se não houver valor no texto, escreva exatamente: null.\n"
-        "- Não invente valores. Não acrescente comentários. Apenas a lista de valores, separada por ';'."
-    )
-    user_msg = (
-        "TEXTO_OCR:\n"
-        f"{page_text}\n\n"
-        "CHAVES_E_VALORES_BRUTOS (na ordem):\n" + "\n".join(kv_lines) + "\n\n"
-        "Formato de resposta (apenas esta linha, sem espaços extras):\n"
-        "valor1;valor2;valor3;...\n"
-        "Use 'null' quando o valor não existir."
-    )
+    got = _batch_submit("bulk", {"keys": list(keys), "text": page_text, "effort": prof.reasoning_effort,
+                                 "values": {k: (current_values.get(k) or "").strip() for k in keys}})
+    if got is not None:
+        vals = [str(got.get(k) or "null").strip() or "null" for k in keys]
+        log_pairs(keys, current_values, vals)
+        return vals
 
     payload = dict(
         model=LLM_MODEL,
-        input=[
-            {"role": "system", "content": [{"type": "input_text", "text": system_msg}]},
-            {"role": "user",   "content": [{"type": "input_text", "text": user_msg}]},
-        ],
-        reasoning={"effort": LLM_REASONING_EFFORT},
+        input=bulk_input(keys, page_text, current_values),
+        **cache_key("bulk"),
+        reasoning={"effort": prof.reasoning_effort},
         text={"verbosity": LLM_TEXT_VERBOSITY},
         max_output_tokens=max(64, 8*len(keys))
     )
 
     t0 = time.perf_counter()
-    try: LLM_STATS["attempts"] += 1
-    except Exception: pass
+    _stat_inc("attempts")
 
     try:
         resp, err = _responses_create_safe(**payload)
         if err or not resp:
             dur = time.perf_counter() - t0
-            print(f"[LLM-BULK] error took={dur:.2f}s err={err or 'unknown'}")
+            log_event(log, logging.WARNING, "llm.bulk", outcome=_err_outcome(err), ms=int(dur*1000), err=err or "unknown")
+            _record_llm("bulk", _err_outcome(err), t0)
             return [ (current_values.get(k) or "").strip() or "null" for k in keys ]
     except Exception as e:
         dur = time.perf_counter() - t0
-        print(f"[LLM-BULK] exception took={dur:.2f}s err={e}")
+        log_event(log, logging.WARNING, "llm.bulk", outcome="error", ms=int(dur*1000), err=str(e))
+        _record_llm("bulk", "error", t0)
         return [ (current_values.get(k) or "").strip() or "null" for k in keys ]
 
     out = getattr(resp, "output_text", None)
@@ -297,7 +298,8 @@ def llm_sanitize_and_fill_bulk(keys, page_text, current_values):
 
     dur = time.perf_counter() - t0
     if not out:
-        print(f"[LLM-BULK] empty_output took={dur:.2f}s")
+        log_event(log, logging.WARNING, "llm.bulk", outcome="empty_output", ms=int(dur*1000))
+        _record_llm("bulk", "empty_output", t0, resp)
         return [ (current_values.get(k) or "").strip() or "null" for k in keys ]
 
     line = out.strip().splitlines()[0].strip()
@@ -308,11 +310,12 @@ def llm_sanitize_and_fill_bulk(keys, page_text, current_values):
 
     changed_ok = any((vals[i] or "").lower() != "null" and (vals[i] != (current_values.get(k) or "").strip()) for i, k in enumerate(keys))
     if changed_ok:
-        try: LLM_STATS["success"] += 1
-        except Exception: pass
+        _stat_inc("success")
+    _record_llm("bulk", "ok" if changed_ok else "no_value", t0, resp)
 
-    preview = ";".join(vals)[:100]
-    print(f"[LLM-BULK] took={dur:.2f}s -> {preview}{'…' if len(preview)==100 else ''}")
+    log_event(log, logging.INFO, "llm.bulk", outcome="ok" if changed_ok else "no_value", ms=int(dur*1000),
+              keys=len(keys), filled=sum(1 for v in vals if (v or "").lower() != "null"))
+    log_pairs(keys, current_values, vals)
     return vals
 
 # -------- NOVO: LLM final por SCHEMA (JSON extractor) --------
@@ -333,61 +336,54 @@ def _strip_to_json(text: str) -> str:
 
 def llm_extract_schema_json(full_text: str, missing_schema: dict) -> dict:
     """
-    Recebe o TEXTO completo do documento e um SCHEMA parcial (apenas os campos faltantes).
+    Recebe o TEXTO do documento (regiões de interesse compactadas, ou o texto completo
+    como fallback) e um SCHEMA parcial (apenas os campos faltantes).
     Pede à LLM para responder SOMENTE com o JSON no formato do schema.
     Retorna um dict (pode conter valores 'null' para não encontrados).
     """
-    if not ENABLE_LLM_FALLBACK or not missing_schema:
+    prof = current_profile()
+    if not (ENABLE_LLM_FALLBACK and prof.llm) or not missing_schema:
         return {}
     client = _get_openai_client()
     if not client:
-        print("[LLM-JSON] skip (no_client)")
+        log_event(log, logging.INFO, "llm.json", outcome="skip", reason="no_client")
+        _record_llm("json", "no_client")
         return {}
 
     # compacta texto para evitar tokens demais (mantém começo e fim)
-    MAX_TXT = 7000
+    MAX_TXT = prof.json_text_chars
     if len(full_text) > MAX_TXT:
         head = full_text[:MAX_TXT//2]
         tail = full_text[-MAX_TXT//2:]
         full_text = head + "\n...\n" + tail
 
-    prompt = (
-        "Você é um assistente de extração de dados (JSON extractor).\n"
-        "Extraia as informações solicitadas do texto de um documento PDF.\n"
-        "O texto pode estar desordenado.\n\n"
-        "TEXTO DO DOCUMENTO:\n"
-        "---\n"
-        f"{full_text}\n"
-        "---\n\n"
-        "SCHEMA JSON PARA EXTRAÇÃO:\n"
-        "(Responda *apenas* com o JSON. Se um campo não for encontrado, use 'null'.)\n\n"
-        f"{json.dumps(missing_schema, indent=2, ensure_ascii=False)}"
-    )
+    got = _batch_submit("json", {"schema": missing_schema, "text": full_text, "effort": prof.reasoning_effort})
+    if got is not None:
+        return got
 
     payload = dict(
         model=LLM_MODEL,
-        input=[
-            {"role": "system", "content": [{"type": "input_text", "text": "Responda apenas com JSON válido conforme o schema fornecido. Sem comentários."}]},
-            {"role": "user",   "content": [{"type": "input_text", "text": prompt}]},
-        ],
-        reasoning={"effort": LLM_REASONING_EFFORT},
+        input=json_input(missing_schema, full_text),
+        **cache_key("json", missing_schema),
+        reasoning={"effort": prof.reasoning_effort},
         text={"verbosity": LLM_TEXT_VERBOSITY},
         max_output_tokens=max(128, 16*max(1, len(missing_schema)))
     )
 
     t0 = time.perf_counter()
-    try: LLM_STATS["attempts"] += 1
-    except Exception: pass
+    _stat_inc("attempts")
 
     try:
         resp, err = _responses_create_safe(**payload)
         if err or not resp:
             dur = time.perf_counter() - t0
-            print(f"[LLM-JSON] error took={dur:.2f}s err={err or 'unknown'}")
+            log_event(log, logging.WARNING, "llm.json", outcome=_err_outcome(err), ms=int(dur*1000), err=err or "unknown")
+            _record_llm("json", _err_outcome(err), t0)
             return {}
     except Exception as e:
         dur = time.perf_counter() - t0
-        print(f"[LLM-JSON] exception took={dur:.2f}s err={e}")
+        log_event(log, logging.WARNING, "llm.json", outcome="error", ms=int(dur*1000), err=str(e))
+        _record_llm("json", "error", t0)
         return {}
 
     out = getattr(resp, "output_text", None)
@@ -404,21 +400,118 @@ def llm_extract_schema_json(full_text: str, missing_schema: dict) -> dict:
 
     dur = time.perf_counter() - t0
     if not out:
-        print(f"[LLM-JSON] empty_output took={dur:.2f}s")
+        log_event(log, logging.WARNING, "llm.json", outcome="empty_output", ms=int(dur*1000))
+        _record_llm("json", "empty_output", t0, resp)
         return {}
 
     js = _strip_to_json(out)
     try:
         obj = json.loads(js)
-        try: LLM_STATS["success"] += 1
-        except Exception: pass
-        preview = json.dumps(obj, ensure_ascii=False)[:120]
-        print(f"[LLM-JSON] took={dur:.2f}s -> {preview}{'…' if len(preview)==120 else ''}")
+        _stat_inc("success")
+        _record_llm("json", "ok", t0, resp)
+        log_event(log, logging.INFO, "llm.json", outcome="ok", ms=int(dur*1000), keys=len(missing_schema),
+                  filled=sum(1 for v in obj.values() if v not in (None, "", "null")) if isinstance(obj, dict) else 0)
         return obj if isinstance(obj, dict) else {}
     except Exception as e:
-        print(f"[LLM-JSON] invalid_json err={e}")
+        log_event(log, logging.WARNING, "llm.json", outcome="invalid_json", ms=int(dur*1000), err=str(e))
+        _record_llm("json", "invalid_json", t0, resp)
         return {}
 
+# -------- lote multi-documento (LLMBatcher) --------
+def _response_text(resp):
+    out = getattr(resp, "output_text", None)
+    if out:
+        return out
+    parts = []
+    for item in getattr(resp, "output", []) or []:
+        for c in getattr(item, "content", []) or []:
+            if getattr(c, "type", "") in ("output_text", "text"):
+                parts.append(getattr(c, "text", "") or "")
+    return "\n".join(p for p in parts if p).strip() or None
+
+def _batch_submit(kind: str, request: dict):
+    """
+    Pedido ao LLMBatcher do contexto; None = seguir pelo caminho individual (sem batcher, sem
+    orçamento, lote de 1, espera esgotada). A espera pelo lote vai até o fim do prazo do documento.
+    """
+    batcher = current_batcher()
+    if batcher is None:
+        return None
+    deadline = current_deadline()
+    if deadline is not None and deadline.llm_timeout() is None:
+        return None  # sem tempo para chamar: o caminho individual registra a degradação
+    got = batcher.submit(kind, {**request, "usage": current_usage(), "deadline": deadline},
+                         timeout=max(0.0, deadline.remaining()) if deadline is not None else None)
+    if got is None and deadline is not None and deadline.expired():
+        deadline.degrade(f"llm_batch_{kind}", "timeout")
+    return got
+
+def llm_batch_send(kind: str, requests: list) -> list:
+    """
+    Uma chamada para vários documentos: cada um vira uma seção '### DOC Dn' e a resposta é um
+    JSON {"Dn": {chave: valor|null}}. Devolve, na ordem de `requests`, o dict de cada documento
+    (None quando a seção não veio; o documento então refaz a chamada individual).
+    Tokens da chamada são rateados entre os documentos pelo tamanho da seção.
+    """
+    ids = [f"D{i + 1}" for i in range(len(requests))]
+    messages, sizes = batch_input(kind, ids, requests)
+    if kind == "bulk":
+        max_out = sum(max(64, 8 * len(r["keys"])) for r in requests)
+        shared = None
+    else:
+        max_out = sum(max(128, 16 * max(1, len(r["schema"]))) for r in requests)
+        shared = requests[0]["schema"] if all(r["schema"] == requests[0]["schema"] for r in requests) else None
+
+    payload = dict(
+        model=LLM_MODEL,
+        input=messages,
+        **cache_key(f"batch_{kind}", shared),
+        # documentos do lote podem ter perfis diferentes: vale o maior esforço pedido
+        reasoning={"effort": max((r.get("effort") or "minimal" for r in requests), key=_EFFORT_ORDER.index)},
+        text={"verbosity": LLM_TEXT_VERBOSITY},
+        max_output_tokens=max_out,
+    )
+    # a chamada roda no pool do batcher (fora do contexto dos documentos): o gateway recebe o prazo
+    # absoluto do documento com menos tempo sobrando, que limita timeout e retentativas. Sem nenhum
+    # documento com orçamento, o lote não sai (cada um cai no caminho individual, que recusa na hora)
+    deadlines = [r["deadline"] for r in requests if r.get("deadline") is not None]
+    budgeted = [d for d in deadlines if d.llm_timeout() is not None]
+    if deadlines and not budgeted and len(deadlines) == len(requests):
+        log_event(log, logging.INFO, f"llm.{kind}", outcome="deadline", batch=len(requests))
+        return [None] * len(requests)
+    batch_deadline = min(budgeted, key=lambda d: d.t_end) if budgeted else None
+
+    t0 = time.perf_counter()
+    _stat_inc("attempts")
+    with use_deadline(batch_deadline):
+        resp, err = _responses_create_safe(**payload)
+    ms = (time.perf_counter() - t0) * 1000
+    answers, outcome = [None] * len(requests), "error"
+    if not err and resp is not None:
+        try:
+            obj = json.loads(_strip_to_json(_response_text(resp) or ""))
+            if isinstance(obj, dict):
+                answers = [obj.get(did) if isinstance(obj.get(did), dict) else None for did in ids]
+                outcome = "ok"
+                _stat_inc("success")
+            else:
+                outcome = "invalid_json"
+        except Exception:
+            outcome = "invalid_json"
+
+    i_tok, o_tok, c_tok = usage_from_response(resp) if resp is not None else (0, 0, 0)
+    total = float(sum(sizes)) or 1.0
+    for req, size, ans in zip(requests, sizes, answers):
+        usage = req.get("usage")
+        if usage is not None:
+            share = size / total
+            usage.record(kind, outcome if ans is not None or outcome != "ok" else "no_value",
+                         round(i_tok * share), round(o_tok * share), round(c_tok * share), ms,
+                         batch=len(requests))
+    log_event(log, logging.INFO, f"llm.{kind}", outcome=outcome, batch=len(requests), ms=int(ms),
+              answered=sum(a is not None for a in answers), err=err)
+    return answers
+
 # ---------------- etiquetas/âncoras e leitura ----------------
 def label_variants(key_name: str) -> list[str]:
     base_words = camel_to_words(key_name)
@@ -438,23 +531,62 @@ def label_variants(key_name: str) -> list[str]:
     return sorted({rx.sub(r"\.+$", ".", rx.sub(r"\s+", " ", v).strip()) for v in V},
                   key=len, reverse=True)
 
-def find_anchor_by_label(words, label_text: str):
-    def nrm(s: str) -> str:
-        s = "".join(ch for ch in _ud.normalize("NFD", s) if _ud.category(ch) != "Mn")
-        s = rx.sub(r"[\p{P}\p{S}]+", " ", s)
-        s = rx.sub(r"\s+", " ", s).strip().lower()
-        return s
+# ---------------- pré-varredura de páginas ----------------
+_PRESCAN_LOOSE_TYPES = ("oab", "uf")  # padrões genéricos demais (qualquer número / sigla) para indicar página
 
-    norm_tokens = [nrm(w[4]) for w in words]
-    clean = [(i, t) for i, t in enumerate(norm_tokens) if t]
+@functools.lru_cache(maxsize=512)
+def _label_regex(key_name: str):
+    """Regex única com as variantes de rótulo da chave (palavra inteira, texto normalizado)."""
+    base = norm_txt(camel_to_words(key_name))
+    vs = [v for v in label_variants(key_name) if len(v.rstrip(".")) >= 3 or v == base]
+    if not vs:
+        return None
+    return rx.compile(r"(?<![a-z0-9])(?:" + "|".join(rx.escape(v) for v in vs) + r")(?![a-z0-9])")
+
+def prescan_pages(analysis, schema: dict, field_types=None, pages=None) -> dict:
+    """
+    Passada barata pela camada de texto (sem palavras/spans): para cada página (todas, ou só as de
+    `pages`), as chaves cujo rótulo (variantes de label_variants) ou valor tipado válido aparece nela.
+    analysis (analysis_cache.DocAnalysis) fornece o texto cru das páginas (cacheado).
+    Retorna {página: set(chaves)}.
+    """
+    field_types = infer_field_types(schema) if field_types is None else field_types
+    pats = {k: _label_regex(k) for k in schema}
+    relevance = {}
+    for pno in (range(analysis.n_pages) if pages is None else pages):
+        raw = analysis.text(pno)
+        norm = norm_txt(raw)
+        keys = {k for k, pat in pats.items() if pat is not None and pat.search(norm)}
+        keys |= {k for k, t in field_types.items()
+                 if k not in keys and t not in _PRESCAN_LOOSE_TYPES and find_typed(t, raw)}
+        if keys:
+            relevance[pno] = keys
+    return relevance
+
+def select_pages(n_pages: int, relevance: dict, fallback: int = PRESCAN_FALLBACK_PAGES) -> list:
+    """Páginas relevantes + as `fallback` primeiras, em ordem."""
+    return sorted(set(relevance) | set(range(min(fallback, n_pages))))
+
+def _nrm_label(s: str) -> str:
+    s = "".join(ch for ch in _ud.normalize("NFD", s) if _ud.category(ch) != "Mn")
+    s = rx.sub(r"[\p{P}\p{S}]+", " ", s)
+    s = rx.sub(r"\s+", " ", s).strip().lower()
+    return s
+
+def _label_tokens(pw):
+    return [(i, t) for i, t in enumerate(map(_nrm_label, pw.text)) if t]
+
+def find_anchor_by_label(pw, label_text: str):
+    # tokens normalizados calculados uma vez por página (reaproveitados por todas as chaves)
+    clean = pw.cached("label_tokens", _label_tokens)
     if not clean:
         return None
 
-    base = nrm(label_text.replace("_", " "))
+    base = _nrm_label(label_text.replace("_", " "))
     parts = [p for p in base.split() if p]
     variants = {base, "".join(parts)}
     abbr = " ".join(p[:4] + "." for p in parts)
-    variants.add(nrm(abbr)); variants.add(nrm(abbr.replace(".", "")))
+    variants.add(_nrm_label(abbr)); variants.add(_nrm_label(abbr.replace(".", "")))
 
     MAX_W = 8
     best = None
@@ -475,15 +607,9 @@ def find_anchor_by_label(words, label_text: str):
         return None
 
     _, _, _, i0, i1 = best
-    xs, ys, span = [], [], []
-    xs0, ys0, xs1, ys1 = [], [], [], []
-    for k in range(i0, i1 + 1):
-        x0, y0, x1, y1, _ = words[k]
-        xs.append(0.5*(x0+x1)); ys.append(0.5*(y0+y1)); span.append(k)
-        xs0.append(x0); ys0.append(y0); xs1.append(x1); ys1.append(y1)
-    ax = float(np.mean(xs)); ay = float(np.mean(ys))
-    span_bbox = (min(xs0), min(ys0), max(xs1), max(ys1))
-    return (ax, ay, span, span_bbox)
+    span = list(range(i0, i1 + 1))
+    ax = float(np.mean(pw.cx[i0:i1 + 1])); ay = float(np.mean(pw.cy[i0:i1 + 1]))
+    return (ax, ay, span, pw.bbox(span))
 
 def is_abbrev_token(t: str) -> bool:
     return bool(rx.match(r"^([A-Za-zÀ-ÿ]{1,4}\.)+$", t.strip()))
@@ -511,85 +637,36 @@ def label_score(label_text: str, right_has_value: bool, down_has_value: bool, bo
     if 2 <= len(s) <= 10: score += 1
     return score
 
-def extract_word_spans(page):
-    D = page.get_text("dict")
-    out = []
-    for block in D.get("blocks", []):
-        for line in block.get("lines", []):
-            for span in line.get("spans", []):
-                txt = span.get("text", "") or ""
-                words = [w for w in rx.split(r"(\s+)", txt) if w and not w.isspace()]
-                if not words:
-                    continue
-                x0,y0,x1,y1 = span["bbox"]
-                W = x1 - x0
-                step = max(1.0, W / max(1, len(words)))
-                cur = x0
-                is_bold = bool(span.get("flags", 0) & 2) or "Bold" in (span.get("font", "") or "")
-                for w in words:
-                    w0 = cur; w1 = cur + step
-                    out.append((float(w0), float(y0), float(w1), float(y1), w, is_bold))
-                    cur = w1
-    if not out:
-        base_words = page.get_text("words")
-        out = [(w[0],w[1],w[2],w[3],w[4],False) for w in base_words]
-    return out
-
-def find_generic_anchors(page, Y_BAND=18.0, RADIUS=220.0, GUTTER_PAD_X=10.0, GUTTER_W_MIN=60.0, GUTTER_W_FACTOR=0.6):
-    words_attr = extract_word_spans(page)
-    def ycenter(i):
-        x0,y0,x1,y1,_,_ = words_attr[i]
-        return 0.5*(y0+y1)
-    def same_line(i,j):
-        return abs(ycenter(i)-ycenter(j)) <= Y_BAND
+def find_generic_anchors(pw, Y_BAND=18.0, RADIUS=220.0, GUTTER_PAD_X=10.0, GUTTER_W_MIN=60.0, GUTTER_W_FACTOR=0.6):
+    N = len(pw)
+    cx, cy = pw.cx, pw.cy
+    has_value = np.fromiter((bool(rx.search(r"[A-Za-zÀ-ÿ0-9]", t)) for t in pw.text), dtype=bool, count=N)
 
     anchors = []
-    N = len(words_attr)
-    centers = [((w[0]+w[2])*0.5, (w[1]+w[3])*0.5) for w in words_attr]
-
     for i in range(N):
         for L in range(1,5):
             j = i + L - 1
             if j >= N: break
-            if not same_line(i, j): break
-            seq = words_attr[i:j+1]
-            txt = " ".join(t for *_, t, _ in seq).strip()
+            if abs(cy[i] - cy[j]) > Y_BAND: break
+            txt = " ".join(pw.text[i:j+1]).strip()
             if not looks_like_label(txt):
                 continue
 
-            xs0 = [s[0] for s in seq]; ys0 = [s[1] for s in seq]
-            xs1 = [s[2] for s in seq]; ys1 = [s[3] for s in seq]
-            x0,y0,x1,y1 = min(xs0), min(ys0), max(xs1), max(ys1)
+            x0,y0,x1,y1 = pw.bbox(range(i, j+1))
             ax = 0.5*(x0+x1); ay = 0.5*(y0+y1)
             lbl_w = max(1.0, x1 - x0)
-            gx0 = x0 - 10.0
-            gx1 = x0 + max(60.0, lbl_w * 0.60)
-
-            best_r = None
-            for k in range(N):
-                if i <= k <= j: continue
-                wx, wy = centers[k]
-                dx, dy = wx - ax, wy - ay
-                if dx <= 0 or abs(dy) > Y_BAND: continue
-                dist = math.hypot(dx, dy)
-                if dist > RADIUS: continue
-                if best_r is None or dx < best_r[1] - 1e-9:
-                    best_r = (k, dx, dist)
-            right_has = bool(best_r and rx.search(r"[A-Za-zÀ-ÿ0-9]", words_attr[best_r[0]][4]))
-
-            best_d = None
-            for k in range(N):
-                if i <= k <= j: continue
-                wx, wy = centers[k]
-                dy = wy - ay
-                if dy <= 0: continue
-                cx = wx
-                if not (gx0 <= cx <= gx1): continue
-                if best_d is None or dy < best_d[1] - 1e-9:
-                    best_d = (k, dy)
-            down_has = bool(best_d and rx.search(r"[A-Za-zÀ-ÿ0-9]", words_attr[best_d[0]][4]))
-
-            bold_like = any(s[-1] for s in seq)
+            gx0 = x0 - GUTTER_PAD_X
+            gx1 = x0 + max(GUTTER_W_MIN, lbl_w * GUTTER_W_FACTOR)
+
+            # vizinho mais próximo à direita (mesma faixa) e abaixo (dentro da calha), vetorizado
+            outside = np.ones(N, dtype=bool); outside[i:j+1] = False
+            dx = cx - ax; dy = cy - ay
+            m_r = outside & (dx > 0) & (np.abs(dy) <= Y_BAND) & (np.hypot(dx, dy) <= RADIUS)
+            right_has = bool(m_r.any() and has_value[np.flatnonzero(m_r)[np.argmin(dx[m_r])]])
+            m_d = outside & (dy > 0) & (cx >= gx0) & (cx <= gx1)
+            down_has = bool(m_d.any() and has_value[np.flatnonzero(m_d)[np.argmin(dy[m_d])]])
+
+            bold_like = bool(pw.bold[i:j+1].any())
             score = label_score(txt, right_has, down_has, bold_like)
             if score >= 2:
                 anchors.append({
@@ -611,7 +688,7 @@ def find_generic_anchors(page, Y_BAND=18.0, RADIUS=220.0, GUTTER_PAD_X=10.0, GUT
             kept.append(a); taken_pts.append((ax,ay)); continue
         if min(math.hypot(ax-x, ay-y) for (x,y) in taken_pts) >= 10.0:
             kept.append(a); taken_pts.append((ax,ay))
-    return kept, words_attr
+    return kept
 
 def bbox_iou(b1, b2):
     x0 = max(b1[0], b2[0]); y0 = max(b1[1], b2[1])
@@ -639,9 +716,8 @@ def repel_anchors_global(anchors):
         if ok: kept.append(a)
     return kept
 
-def calibrate_layout(words_xy):
-    h = np.array([w[3]-w[1] for w in words_xy], dtype=float)
-    h_med = float(np.median(h)) if len(h) else 16.0
+def calibrate_layout(pw):
+    h_med = float(np.median(pw.h)) if len(pw) else 16.0
     return {
         "Y_BAND":   max(10.0, 0.65*h_med),
         "GAP_MAX":  max(14.0, 1.30*h_med),
@@ -649,42 +725,40 @@ def calibrate_layout(words_xy):
         "RADIUS":   max(180.0, 7.5*h_med),
     }
 
-def nearest_right(ax, ay, centers, allowed, label_bbox, y_band, r_right):
+def nearest_right(ax, ay, pw, allowed, label_bbox, y_band, r_right):
     cut_x = label_bbox[2] + 2.0
-    best = None
-    for j in allowed:
-        wx, wy = centers[j]
-        if wx <= cut_x or abs(wy - ay) > y_band: continue
-        dx = wx - ax
-        dist = math.hypot(dx, wy - ay)
-        if dist > r_right: continue
-        cand = (j, dx, dist)
-        if best is None or dx < best[1] - 1e-9 or (math.isclose(dx, best[1]) and dist < best[2]-1e-9):
-            best = cand
-    return best
-
-def nearest_down(ax, ay, centers, allowed, gutter, y_band, r_down):
+    dx = pw.cx - ax; dy = pw.cy - ay
+    dist = np.hypot(dx, dy)
+    m = allowed & (pw.cx > cut_x) & (np.abs(dy) <= y_band) & (dist <= r_right)
+    if not m.any():
+        return None
+    idx = np.flatnonzero(m)
+    j = idx[np.lexsort((dist[idx], dx[idx]))[0]]
+    return (int(j), float(dx[j]), float(dist[j]))
+
+def nearest_down(ax, ay, pw, allowed, gutter, y_band, r_down):
     gx0, gx1 = gutter; gxc = 0.5*(gx0+gx1)
-    best = None
-    for j in allowed:
-        wx, wy = centers[j]
-        dy = wy - ay
-        if dy <= 0 or dy > 5*y_band: continue
-        cx = wx
-        if not (gx0 - 14.0 <= cx <= gx1 + 14.0): continue
-        dist = math.hypot(wx - ax, wy - ay)
-        if dist > r_down: continue
-        xdev = abs(cx - gxc)
-        cost = dy + 0.5 * xdev
-        if best is None or cost < best[1] - 1e-9 or (math.isclose(cost, best[1]) and dy < best[2]-1e-9):
-            best = (j, cost, dy, xdev)
-    return (best[0], best[2], best[1]) if best else None
+    dy = pw.cy - ay
+    dist = np.hypot(pw.cx - ax, dy)
+    m = (allowed & (dy > 0) & (dy <= 5*y_band) &
+         (pw.cx >= gx0 - 14.0) & (pw.cx <= gx1 + 14.0) & (dist <= r_down))
+    if not m.any():
+        return None
+    idx = np.flatnonzero(m)
+    cost = dy[idx] + 0.5 * np.abs(pw.cx[idx] - gxc)
+    k = np.lexsort((dy[idx], cost))[0]
+    return (int(idx[k]), float(dy[idx[k]]), float(cost[k]))
 
 def bbox_intersects(bb, cc, pad=2.0):
     x0 = max(bb[0]-pad, cc[0]-pad); y0 = max(bb[1]-pad, cc[1]-pad)
     x1 = min(bb[2]+pad, cc[2]+pad); y1 = min(bb[3]+pad, cc[3]+pad)
     return (x1 - x0) > 0 and (y1 - y0) > 0
 
+def words_intersecting(pw, bb, pad=2.0):
+    """Máscara das palavras cuja caixa intercepta bb (mesma regra de bbox_intersects)."""
+    return (((np.minimum(pw.x1, bb[2]) - np.maximum(pw.x0, bb[0])) > -2*pad) &
+            ((np.minimum(pw.y1, bb[3]) - np.maximum(pw.y0, bb[1])) > -2*pad))
+
 def looks_like_heading(token_text, h_token, h_med):
     if not token_text or rx.search(r"\d", token_text): return False
     caps = sum(ch.isupper() for ch in token_text if ch.isalpha())
@@ -692,147 +766,232 @@ def looks_like_heading(token_text, h_token, h_med):
     caps_ratio = (caps / max(1, letters))
     return caps_ratio > 0.85 and h_token > 1.25*h_med
 
-def reading_span_from_seed(words, centers, seed_idx, anchor_xy, gutter,
+def reading_span_from_seed(pw, seed_idx, anchor_xy, gutter,
                            blockers=None, cfg=None):
     ax, ay = anchor_xy
     gx0, gx1 = gutter
+    gxc = 0.5*(gx0+gx1)
 
     YB = (cfg or {}).get("Y_BAND", 18.0)
     GAP = (cfg or {}).get("GAP_MAX", 36.0)
     LJ  = (cfg or {}).get("LINE_JUMP", 32.0)
 
-    W = [{"i": i, "x0": w[0], "y0": w[1], "x1": w[2], "y1": w[3], "t": w[4]}
-         for i, w in enumerate(words)]
+    N = len(pw)
+    X0, Y0, X1, Y1, CX, CY, T = pw.x0, pw.y0, pw.x1, pw.y1, pw.cx, pw.cy, pw.text
 
-    def y_center(k): return 0.5*(W[k]["y0"]+W[k]["y1"])
-    def x_center(k): return 0.5*(W[k]["x0"]+W[k]["x1"])
-    def same_line(i, j): return abs(y_center(i) - y_center(j)) <= YB
+    ok = np.ones(N, dtype=bool)
+    for bb in blockers or ():
+        ok &= ~words_intersecting(pw, bb)
 
-    used = [seed_idx]
-    tokens_total = 1
-    lines_used = 1
+    used_mask = np.zeros(N, dtype=bool)
+    used = []
+    box = [math.inf, math.inf, -math.inf, -math.inf]
 
-    def bbox_of(idxs):
-        xs0 = [W[i]["x0"] for i in idxs]; ys0 = [W[i]["y0"] for i in idxs]
-        xs1 = [W[i]["x1"] for i in idxs]; ys1 = [W[i]["y1"] for i in idxs]
-        return (min(xs0), min(ys0), max(xs1), max(ys1))
+    def add(k):
+        used.append(k); used_mask[k] = True
+        box[0] = min(box[0], float(X0[k])); box[1] = min(box[1], float(Y0[k]))
+        box[2] = max(box[2], float(X1[k])); box[3] = max(box[3], float(Y1[k]))
 
-    def exceeds_geom(new_idxs):
-        x0,y0,x1,y1 = bbox_of(new_idxs)
-        w = x1 - x0; h = y1 - y0
-        if 420.0 and w > 420.0:  return True
-        if 140   and h > 140:    return True
-        return False
+    def exceeds_geom(k):
+        w = max(box[2], float(X1[k])) - min(box[0], float(X0[k]))
+        h = max(box[3], float(Y1[k])) - min(box[1], float(Y0[k]))
+        return w > 420.0 or h > 140
 
-    def ok_token(k):
-        if not blockers: return True
-        bbk = (W[k]["x0"], W[k]["y0"], W[k]["x1"], W[k]["y1"])
-        return not any(bbox_intersects(bbk, bb) for bb in blockers)
+    def next_right(cur, gap_max):
+        m = (~used_mask & ok & (np.abs(CY - CY[cur]) <= YB) &
+             (X0 > X1[cur]) & (X0 - X1[cur] <= gap_max))
+        if not m.any():
+            return None
+        idx = np.flatnonzero(m)
+        return int(idx[np.argmin(X0[idx])])
 
-    cur = seed_idx
-    right_count_this_line = 0
-    while True:
-        cands = []
-        for k in range(len(W)):
-            if k in used or not ok_token(k) or not same_line(cur, k):
-                continue
-            if W[k]["x0"] <= W[cur]["x1"]: continue
-            gap = W[k]["x0"] - W[cur]["x1"]
-            if gap <= GAP: cands.append(k)
-        if not cands: break
-        if 8 and right_count_this_line >= 8: break
-        if 20 and right_count_this_line >= 20: break
-        if True and rx.search(r"(?:[.;:]\s*$)", W[cur]["t"] or ""): break
-
-        next_k = min(cands, key=lambda k: (W[k]["x0"] - W[cur]["x1"], W[k]["x0"]))
-        cand_used = used + [next_k]
-        if 40 and (tokens_total + 1) > 40: break
-        if exceeds_geom(cand_used): break
-        used.append(next_k); cur = next_k
-        tokens_total += 1
-        right_count_this_line += 1
-
-    h_med = np.median([W[i]["y1"]-W[i]["y0"] for i in range(len(W))]) if W else 16.0
-    while True:
-        last = max(used, key=lambda k: y_center(k))
-        last_y = y_center(last)
-        cands = []
-        for k in range(len(W)):
-            if k in used: continue
-            yk = y_center(k)
-            if yk <= last_y or (yk - last_y) > 32.0: continue
-            cxk = x_center(k)
-            if gx0 <= cxk <= gx1 and ok_token(k):
-                cands.append(k)
-        if not cands: break
-        if 3 and lines_used >= 1 + 3: break
-        start_k = min(cands, key=lambda k: (abs(x_center(k) - 0.5*(gx0+gx1)), y_center(k)))
-        if looks_like_heading(W[start_k]["t"], W[start_k]["y1"]-W[start_k]["y0"], h_med): break
-        if 40 and (tokens_total + 1) > 40: break
-        if exceeds_geom(used + [start_k]): break
-        used.append(start_k); tokens_total += 1; lines_used += 1
-
-        cur = start_k
+    add(seed_idx)
+    tokens_total = 1
+    lines_used = 1
+
+    def walk_right(cur, gap_max):
+        nonlocal tokens_total
         right_count_this_line = 0
         while True:
-            candsR = []
-            for k in range(len(W)):
-                if k in used or not ok_token(k) or not same_line(cur, k): continue
-                if W[k]["x0"] <= W[cur]["x1"]: continue
-                gap = W[k]["x0"] - W[cur]["x1"]
-                if gap <= 36.0: candsR.append(k)
-            if not candsR: break
-            if 8 and right_count_this_line >= 8: break
-            if 20 and right_count_this_line >= 20: break
-            if True and rx.search(r"(?:[.;:]\s*$)", W[cur]["t"] or ""): break
-            next_k = min(candsR, key=lambda k: (W[k]["x0"] - W[cur]["x1"], W[k]["x0"]))
-            cand_used = used + [next_k]
-            if 40 and (tokens_total + 1) > 40: break
-            if exceeds_geom(cand_used): break
-            used.append(next_k); cur = next_k; tokens_total += 1; right_count_this_line += 1
+            next_k = next_right(cur, gap_max)
+            if next_k is None: break
+            if right_count_this_line >= 8: break
+            if rx.search(r"(?:[.;:]\s*$)", T[cur] or ""): break
+            if (tokens_total + 1) > 40: break
+            if exceeds_geom(next_k): break
+            add(next_k); cur = next_k
+            tokens_total += 1
+            right_count_this_line += 1
+
+    walk_right(seed_idx, GAP)
+
+    h_med = float(np.median(pw.h)) if N else 16.0
+    while True:
+        u = np.asarray(used)
+        last_y = CY[u[np.argmax(CY[u])]]
+        m = (~used_mask & ok & (CY > last_y) & (CY - last_y <= 32.0) &
+             (CX >= gx0) & (CX <= gx1))
+        if not m.any(): break
+        if lines_used >= 1 + 3: break
+        idx = np.flatnonzero(m)
+        start_k = int(idx[np.lexsort((CY[idx], np.abs(CX[idx] - gxc)))[0]])
+        if looks_like_heading(T[start_k], float(pw.h[start_k]), h_med): break
+        if (tokens_total + 1) > 40: break
+        if exceeds_geom(start_k): break
+        add(start_k); tokens_total += 1; lines_used += 1
+
+        walk_right(start_k, 36.0)
         if len(used) > 300: break
 
-    used_sorted = sorted(set(used), key=lambda k: (0.5*(W[k]["y0"]+W[k]["y1"]), 0.5*(W[k]["x0"]+W[k]["x1"])))
-    xs0 = [W[i]["x0"] for i in used_sorted]; ys0 = [W[i]["y0"] for i in used_sorted]
-    xs1 = [W[i]["x1"] for i in used_sorted]; ys1 = [W[i]["y1"] for i in used_sorted]
-    bbox = (min(xs0), min(ys0), max(xs1), max(ys1))
-    text = " ".join(W[i]["t"] for i in used_sorted)
+    used_sorted = sorted(set(used), key=lambda k: (CY[k], CX[k]))
+    bbox = pw.bbox(used_sorted)
+    text = " ".join(T[i] for i in used_sorted)
     return used_sorted, bbox, sanitize_value_text(text)
 
-def local_llm_context(words_xy, seed_idx, label_bbox, gutter, ay, y_band):
-    if not words_xy:
+def local_llm_context(pw, seed_idx, label_bbox, gutter, ay, y_band):
+    if not len(pw):
         return ""
-    x0_lbl, _, x1_lbl, _ = label_bbox
-    gx0, gx1 = gutter
-    gutter_w = max(1.0, gx1 - gx0)
-    wx0 = min(x1_lbl, gx0) - 10.0
-    wx1 = max(x1_lbl + 1.5*gutter_w, gx1 + 30.0)
-    wy0 = ay - 2.0*y_band
-    wy1 = ay + 5.0*y_band
-
-    def y_center(w): return 0.5*(w[1]+w[3])
-    def x_center(w): return 0.5*(w[0]+w[2])
-
-    cand = []
-    for w in words_xy:
-        cx, cy = x_center(w), y_center(w)
-        if wx0 <= cx <= wx1 and wy0 <= cy <= wy1:
-            cand.append(w)
-    cand_sorted = sorted(cand, key=lambda w: (y_center(w), x_center(w)))
-    text = " ".join(str(w[4]) for w in cand_sorted if str(w[4]).strip())
+    m = window_mask(pw, context_window(label_bbox, gutter, ay, y_band))
+    text = " ".join(t for t in (pw.text[i] for i in pw.reading_order(m)) if t.strip())
     if len(text) > 600:
         text = text[:600]
     return text
 
-def process_page(doc, page, words, anchor_names):
-    words_xy = [(float(w[0]), float(w[1]), float(w[2]), float(w[3]), str(w[4])) for w in words]
-    cfg = calibrate_layout(words_xy)
+def candidate_label_idxs(pw, key: str, limit: int = 3):
+    """Palavras que parecem o rótulo de um campo sem âncora (mesma palavra, prefixo ou abreviação)."""
+    parts = [p for p in norm_txt(camel_to_words(key)).split() if len(p) >= 2]
+    if not parts:
+        return []
+    scored = []
+    for i, t in pw.cached("label_tokens", _label_tokens):
+        t = t.replace(" ", "")  # "U.F." -> "u f" -> "uf"
+        best = 0
+        for p in parts:
+            if t == p: best = 3
+            elif len(t) < 3 or len(p) < 3: continue
+            elif t.startswith(p[:4]): best = max(best, 2)
+            elif p.startswith(t): best = max(best, 1)
+        if best:
+            scored.append((-best, i))
+    return [i for _, i in sorted(scored)[:limit]]
+
+def roi_windows(pw, results, keys):
+    """
+    Janelas de contexto para os prompts: primeiro campos ainda sem valor (âncora sem texto
+    ou rótulos candidatos na página), depois os campos já lidos (para sanitização).
+    Retorna (janelas, chaves sem janela nenhuma — sem âncora nem rótulo candidato na página).
+    """
+    y_band = pw.cached("layout", calibrate_layout)["Y_BAND"]
+    by_key = {r["key"]: r for r in results}
+    pending, resolved, orphans = [], [], set()
+
+    def to_line_end(win, label_bbox):
+        # "Rótulo: valor longo" na mesma linha: a janela vai até a última palavra da linha do rótulo
+        x1_lbl, cy_lbl = label_bbox[2], (label_bbox[1] + label_bbox[3]) / 2
+        same_line = (np.abs(pw.cy - cy_lbl) <= y_band / 2) & (pw.cx > x1_lbl)
+        if not same_line.any():
+            return win
+        return (win[0], max(win[1], float(pw.cx[same_line].max()) + 1.0), win[2], win[3])
+
+    for k in keys:
+        r = by_key.get(k)
+        if r is not None:
+            win = to_line_end(context_window(r["label_bbox"], r["gutter"], r["anchor"][1], y_band), r["label_bbox"])
+            (resolved if (r.get("text") or "").strip() else pending).append(win)
+            continue
+        lbl = candidate_label_idxs(pw, k)
+        if not lbl:
+            orphans.add(k)
+        for i in lbl:
+            x0, y0, x1, y1 = pw.bbox([i])
+            gutter = (x0 - 10.0, x0 + max(60.0, (x1 - x0) * 0.60))
+            pending.append(to_line_end(context_window((x0, y0, x1, y1), gutter, float(pw.cy[i]), y_band),
+                                       (x0, y0, x1, y1)))
+    return pending + resolved, orphans
+
+def resolve_typed_fields(pw, results, field_types):
+    """
+    Campos tipados (CPF, data, telefone...): candidatos validados da página inteira, presos
+    à âncora do campo (ou ao rótulo candidato). Se o span lido já contém um candidato, fica
+    com ele. Cada candidato é usado por no máximo uma chave. Tipos sem validador (LOOSE_TYPES)
+    só aceitam valor a até RADIUS do rótulo, à direita ou abaixo dele. Retorna {chave: valor}.
+    """
+    if not field_types or not len(pw):
+        return {}
+    cfg = pw.cached("layout", calibrate_layout)
+    y_band, radius = cfg["Y_BAND"], cfg["RADIUS"]
+    cands = scan_typed_candidates(pw, set(field_types.values()))
+    by_key = {r["key"]: r for r in results}
+
+    out = {}
+    used = set()
+    pairs = []
+    for k, t in field_types.items():
+        cs = cands.get(t) or []
+        if not cs:
+            continue
+        r = by_key.get(k)
+        if r is not None:
+            toks = set(r.get("tokens") or [])
+            inside = [n for n, c in enumerate(cs) if toks.intersection(c["idxs"]) and (t, n) not in used]
+            if inside:
+                out[k] = cs[inside[0]]["value"]; used.add((t, inside[0]))
+                continue
+            (x0, y0, x1, y1), (ax, ay) = r["label_bbox"], r["anchor"]
+        else:
+            lbl = candidate_label_idxs(pw, k, limit=1)
+            if not lbl:
+                if len(cs) == 1 and t not in LOOSE_TYPES:
+                    pairs.append((radius, k, 0))  # único valor desse tipo na página
+                continue
+            x0, y0, x1, y1 = pw.bbox(lbl)
+            ax, ay = float(pw.cx[lbl[0]]), float(pw.cy[lbl[0]])
+        loose = t in LOOSE_TYPES
+        for n, c in enumerate(cs):
+            d = math.hypot(c["cx"] - ax, c["cy"] - ay)
+            if c["cy"] < y0 - y_band or c["cx"] < x0 - 10.0:
+                if loose:
+                    continue
+                d *= 3.0  # valores acima/à esquerda do rótulo são improváveis
+            if d <= (radius if loose else 1.5 * radius):
+                pairs.append((d, k, n))
+
+    for d, k, n in sorted(pairs):
+        t = field_types[k]
+        if k in out or (t, n) in used:
+            continue
+        out[k] = cands[t][n]["value"]; used.add((t, n))
+    return out
+
+def process_page(pw, anchor_names, llm_values: bool = True):
+    cfg = pw.cached("layout", calibrate_layout)
+    value_schema_only = current_profile().value_schema_only
     local_YB, local_GAP, local_LJ, local_RAD = cfg["Y_BAND"], cfg["GAP_MAX"], cfg["LINE_JUMP"], cfg["RADIUS"]
 
-    anchors = []
+    # tabelas com grade (detectadas uma vez por página em DocAnalysis): chave que casa com cabeçalho
+    # de coluna ou rótulo de linha sai direto da célula, sem span nem LLM
+    table_results = resolve_table_fields(pw, pw.peek("tables"), anchor_names,
+                                         [camel_to_words(k) for k in anchor_names])
+    if table_results:
+        in_table = {r["key"] for r in table_results}
+        anchor_names = [k for k in anchor_names if k not in in_table]
+        table_words = set().union(*(r["label_span"] | set(r["tokens"]) for r in table_results))
+
+    # layout já visto no job: âncoras semeadas com a geometria do representante do cluster (conferidas
+    # no lugar); só as chaves que falham na conferência passam pela resolução completa abaixo
+    layouts = current_layouts()
+    anchors, solve, n_seeded, failed = [], list(anchor_names), 0, 0
+    if layouts is not None and anchor_names:
+        sig = pw.cached("fingerprint", fingerprint)
+        cid, geom = layouts.match(sig)
+        if geom:
+            anchors, solve, failed = seed_anchors(pw, geom, anchor_names,
+                                                  table_words if table_results else frozenset())
+            n_seeded = len(anchors)
+
     missing = []
-    for key in anchor_names:
-        hit = find_anchor_by_label(words_xy, key)
+    for key in solve:
+        hit = find_anchor_by_label(pw, key)
         if hit:
             ax, ay, span, bbox = hit
             x0, y0, x1, y1 = bbox
@@ -847,23 +1006,19 @@ def process_page(doc, page, words, anchor_names):
             missing.append(key)
 
     if True and missing:
-        gen_anchors, _ = find_generic_anchors(page, Y_BAND=local_YB, RADIUS=local_RAD,
-                                              GUTTER_PAD_X=10.0, GUTTER_W_MIN=60.0, GUTTER_W_FACTOR=0.60)
-        for key in missing:
-            # escolha fuzzy
-            best = None
-            for g in gen_anchors:
-                # fuzzy simples
-                A = norm_txt(key); B = norm_txt(g["key"])
-                tokens = set(rx.findall(r"[a-z0-9]+", A)) & set(rx.findall(r"[a-z0-9]+", B))
-                sim = len(tokens) / max(1, len(set(rx.findall(r"[a-z0-9]+", A)) | set(rx.findall(r"[a-z0-9]+", B))))
-                richness = 0.05 * (len((g["key"] or "").split()) - 1) + 0.01 * g.get("score", 0)
-                sim_adj = sim + richness
-                if best is None or sim_adj > best[0]:
-                    best = (sim_adj, g)
+        # catálogo de âncoras genéricas não depende do schema: uma vez por página (e persistido)
+        gen_anchors = pw.cached("generic_anchors", lambda p: find_generic_anchors(
+            p, Y_BAND=local_YB, RADIUS=local_RAD, GUTTER_PAD_X=10.0, GUTTER_W_MIN=60.0, GUTTER_W_FACTOR=0.60))
+        if gen_anchors and table_results:
+            gen_anchors = [g for g in gen_anchors if not (g["label_span"] & table_words)]
+        if gen_anchors:
+            # escolha fuzzy: cosseno de trigramas (chaves x âncoras numa única matmul) + casamento 1-para-1
+            S = cosine_matrix([camel_to_words(k) for k in missing], [g["key"] for g in gen_anchors])
+            richness = np.array([0.05 * (len((g["key"] or "").split()) - 1) + 0.01 * g.get("score", 0)
+                                 for g in gen_anchors], dtype=np.float32)
             thr = 0.35 if len(gen_anchors) > 12 else 0.30
-            if best and best[0] >= thr:
-                g = best[1]
+            for i, j, _ in assign_one_to_one(S + richness[None, :], thr):
+                key, g = missing[i], gen_anchors[j]
                 anchors.append({
                     "key": key, "anchor": g["anchor"], "label_span": g["label_span"],
                     "label_bbox": g["label_bbox"], "gutter": g["gutter"],
@@ -871,21 +1026,28 @@ def process_page(doc, page, words, anchor_names):
                 })
 
     anchors = repel_anchors_global(anchors)
-
-    centers = [((w[0]+w[2])*0.5, (w[1]+w[3])*0.5) for w in words_xy]
-    all_excluded = set().union(*(a["label_span"] for a in anchors)) if anchors else set()
-
-    results = []
-    taken = set()
+    if layouts is not None and anchor_names:
+        found = {a["key"]: a for a in anchors}
+        layouts.learn(cid, sig, {k: geometry_entry(pw, found[k]) if k in found else None for k in solve},
+                      seeded=n_seeded, failed=failed)
+
+    all_excluded = np.zeros(len(pw), dtype=bool)
+    for a in anchors + table_results:
+        all_excluded[list(a["label_span"])] = True
+
+    results = list(table_results)
+    taken = np.zeros(len(pw), dtype=bool)
+    for r in table_results:
+        taken[r["tokens"]] = True
     for a in sorted(anchors, key=lambda r: (r["anchor"][1], r["anchor"][0])):
         ax, ay = a["anchor"]
-        allowed = set(range(len(words_xy))) - all_excluded - taken
+        allowed = ~all_excluded & ~taken
 
         r_right = 0.0 if 0.0 and 0.0 > 0 else local_RAD
         r_down  = 0.0 if 0.0 and 0.0 > 0 else local_RAD
 
-        best_r = nearest_right(ax, ay, centers, allowed, a["label_bbox"], local_YB, r_right)
-        best_d = nearest_down(ax, ay, centers, allowed, a["gutter"], local_YB, r_down)
+        best_r = nearest_right(ax, ay, pw, allowed, a["label_bbox"], local_YB, r_right)
+        best_d = nearest_down(ax, ay, pw, allowed, a["gutter"], local_YB, r_down)
 
         seed_idx = None; direction = None
         if best_r and best_d:
@@ -900,8 +1062,8 @@ def process_page(doc, page, words, anchor_names):
         if seed_idx is None:
             # Só usa LLM se a âncora veio do schema (não âncora genérica inferida)
             llm_val = ""
-            if (not LLM_ONLY_MISSING_OR_COMPOSED) or str(a.get("origin","")).startswith("schema"):
-                ctx = local_llm_context(words_xy, None, a["label_bbox"], a["gutter"], ay, local_YB)
+            if llm_values and ((not value_schema_only) or str(a.get("origin","")).startswith("schema")):
+                ctx = local_llm_context(pw, None, a["label_bbox"], a["gutter"], ay, local_YB)
                 if ctx:
                     llm_val = llm_extract_value(a["key"], ctx) or ""
             results.append({**a, "seed": None, "tokens": [], "bbox": None,
@@ -910,21 +1072,296 @@ def process_page(doc, page, words, anchor_names):
 
 
         tokens, bbox, text = reading_span_from_seed(
-            words_xy, centers, seed_idx, a["anchor"], a["gutter"],
+            pw, seed_idx, a["anchor"], a["gutter"],
             blockers=blockers,
             cfg={"Y_BAND": local_YB, "GAP_MAX": local_GAP, "LINE_JUMP": local_LJ}
         )
 
-        if (text is None) or (str(text).strip() == ""):
-            ctx = local_llm_context(words_xy, seed_idx, a["label_bbox"], a["gutter"], ay, local_YB)
+        if llm_values and ((text is None) or (str(text).strip() == "")):
+            ctx = local_llm_context(pw, seed_idx, a["label_bbox"], a["gutter"], ay, local_YB)
             llm_val = llm_extract_value(a["key"], ctx) if ctx else None
             if llm_val is not None:
                 text = llm_val
 
-        taken.update(tokens)
+        taken[tokens] = True
         results.append({**a, "seed": seed_idx, "tokens": tokens, "bbox": bbox,
                         "text": text or "", "composed": len(tokens) > 1, "dir": direction})
-    return anchors, results, words_xy
+    return anchors, results
+
+# ---------------- modo especulativo ----------------
+def heuristic_confidence(r) -> float:
+    """Confiança do valor da heurística: célula de tabela = âncora do schema > span composto > âncora genérica."""
+    if not (r.get("text") or "").strip():
+        return 0.0
+    if str(r.get("origin", "")).startswith("table"):
+        return 0.9
+    if not str(r.get("origin", "")).startswith("schema"):
+        return 0.5
+    return 0.6 if r.get("composed") else 0.9
+
+_spec_pool = None
+_spec_pool_lock = threading.Lock()
+def _speculate(fn, *args):
+    """Roda fn em paralelo herdando o contexto (uso de LLM, logs, batcher) do documento."""
+    global _spec_pool
+    with _spec_pool_lock:
+        if _spec_pool is None:
+            _spec_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="llm-spec")
+    return _spec_pool.submit(contextvars.copy_context().run, fn, *args)
+
+def speculative_text(analysis, pages, max_tokens: int = ROI_TOKEN_BUDGET_JSON) -> str:
+    """
+    Texto compacto do documento, sem depender das âncoras: camada de texto de cada página (sem
+    palavras com caixa), uma fatia do orçamento por página; esgotado o orçamento, as demais páginas
+    nem são lidas.
+    """
+    per_page = max(150, max_tokens // max(1, len(pages)))
+    parts, left = [], max_tokens
+    for pno in pages:
+        if left < 20:
+            break
+        text, used = _clip_tokens(analysis.text(pno).split(), min(per_page, left))
+        if text:
+            parts.append(text)
+            left -= used
+    return "\n\n".join(parts)
+
+# ---------------- pipeline por documento ----------------
+def extract_document(doc, schema: dict, final_all_keys: bool = None, speculative: bool = False, deadline=None,
+                     mem_guard=None, prescan=None, analysis=None):
+    """
+    Roda a pipeline num documento já aberto:
+      1) Para cada página: âncoras -> reading span -> campos tipados -> normalizador -> LLM bulk sanitize/fill
+      2) Passo final: LLM JSON extractor nas regiões de interesse das páginas
+         (todas as chaves se final_all_keys; senão só as faltantes/compostas)
+    Campos tipados já validados e campos lidos de célula de tabela não passam pelos estágios LLM;
+    campos que o normalizador (normalize.py) põe na forma canônica do tipo não passam pelo bulk.
+    O perfil de extração do contexto (profiles.use_profile) decide quais estágios LLM rodam,
+    esforço, tetos de tokens e o máximo de páginas pela pipeline completa; final_all_keys=None
+    usa o do perfil.
+    speculative: o JSON extractor (todas as chaves, texto compacto) roda em paralelo com as
+    heurísticas e substitui os estágios LLM sequenciais; cada campo fica com o valor de maior
+    confiança e, se todas as chaves saírem confiáveis da heurística, a chamada é descartada.
+    deadline: estágios LLM sem orçamento mínimo são pulados (e as páginas restantes, se o prazo
+    estourar); o que a heurística achou é devolvido e os cortes ficam em deadline.degraded.
+    mem_guard (memory.MemoryGuard): páginas são lidas uma a uma e o TextPage de cada uma é solto
+    logo após a extração; se o item passar do teto de memória, as páginas restantes são puladas.
+    prescan (None = PAGE_PRESCAN): em documentos com mais de PRESCAN_MIN_PAGES páginas, só as
+    páginas onde a pré-varredura achou rótulo/valor do schema (mais as PRESCAN_FALLBACK_PAGES
+    primeiras) passam pelas âncoras e pelo LLM bulk, que recebe só as chaves vistas na página
+    (e as que não apareceram em nenhuma). As demais entram apenas no texto do passo final.
+    analysis (analysis_cache.DocAnalysis): texto, palavras, layout e âncoras genéricas das páginas
+    (independentes do schema); vindo do cache, só o casamento com o schema e o LLM rodam.
+    Retorna (dict com os campos do schema, tempos por página).
+    """
+    anchor_names = list(schema.keys())
+    field_types = infer_field_types(schema)
+    extracted = {k: None for k in anchor_names}
+    typed_done = set()  # campos tipados validados na página (sem LLM)
+    norm_types = value_types(schema)
+    norm_done = set()   # campos com valor canônico do normalizador (sem bulk LLM)
+    table_done = set()  # campos lidos direto de célula de tabela (sem LLM)
+    composed = set()
+    full_text = RollingText(3500, 3500)  # começo + fim do texto integral (limitado)
+    roi_text = RollingText(5000, 2000)   # regiões de interesse por página (prompt compacto)
+    page_times = []
+    conf = {}  # confiança do valor atual de cada chave
+    skipped = set()
+    prof = current_profile()
+    final_all_keys = prof.final_all_keys if final_all_keys is None else final_all_keys
+    enabled = {"value": prof.llm_value, "bulk": prof.llm_bulk, "json": prof.llm_json, "speculative": True}
+
+    def stage_ok(stage):
+        # estágio fora do perfil não roda (não é degradação); os demais só com orçamento e
+        # endpoint saudável (circuito aberto = só heurísticas)
+        if not (prof.llm and enabled.get(stage, True)):
+            return False
+        reason = None
+        if not GATEWAY.available():
+            reason = "circuit_open"
+        elif deadline is not None and not deadline.allows(LLM_MIN_CALL_S):
+            reason = "budget"
+        if reason is None:
+            return True
+        if stage not in skipped:
+            skipped.add(stage)
+            if deadline is not None:
+                deadline.degrade(stage, reason)
+            if reason == "circuit_open":
+                _record_llm(stage, "circuit_open")
+        return False
+
+    def final_json_expected():
+        # o passo final JSON deve rodar? (mesmas condições de stage_ok, sem registrar degradação) —
+        # com prazo, sobra para o bulk desta página e para o passo final
+        return (prof.llm and enabled["json"] and GATEWAY.available() and
+                (deadline is None or deadline.allows(2 * LLM_MIN_CALL_S)))
+
+    def clip(t):
+        return t[:2000] + "\n...\n" + t[-1000:] if len(t) > 3000 else t
+
+    analysis = analysis if analysis is not None else DocAnalysis(doc)
+    pages = list(range(len(doc)))
+    relevance = None
+    if (PAGE_PRESCAN if prescan is None else prescan) and len(doc) > PRESCAN_MIN_PAGES:
+        relevance = prescan_pages(analysis, schema, field_types)
+        pages = select_pages(len(doc), relevance)
+        unseen = set(anchor_names) - set().union(*relevance.values())
+        log_event(log, logging.INFO, "pages.prescan", total=len(doc), selected=len(pages), unseen=len(unseen))
+    if prof.max_pages and len(pages) > prof.max_pages:
+        # limite do perfil: as demais páginas só entram no texto do passo final
+        if deadline is not None:
+            deadline.degrade("pages", "profile", skipped=len(pages) - prof.max_pages, profile=prof.name)
+        pages = pages[:prof.max_pages]
+        if relevance is None:  # sem pré-varredura: toda chave vale em qualquer página
+            relevance, unseen = {}, set(anchor_names)
+
+    spec = None
+    if speculative and ENABLE_LLM_FALLBACK and stage_ok("speculative"):
+        # só texto (PageWords das páginas carregadas no laço, sob o prazo e o teto de memória)
+        spec = _speculate(llm_extract_schema_json, speculative_text(analysis, pages), _schema_keys_null(schema))
+
+    last = -1  # última página processada no laço (o resto do documento só entra no texto do passo final)
+    for i, pno in enumerate(pages):
+        if deadline is not None and i > 0 and deadline.expired():
+            deadline.degrade("pages", "expired", skipped=len(pages) - i)
+            break
+        if mem_guard is not None and i > 0 and not mem_guard.check(pno):
+            log_event(log, logging.WARNING, "pages.memory_limit", page=pno, limit_mb=mem_guard.limit_mb)
+            if deadline is not None:
+                deadline.degrade("pages", "memory", skipped=len(pages) - i)
+            break
+        # páginas puladas pela pré-varredura só contribuem com texto para o passo final
+        if relevance is not None:
+            for skipped_pno in range(pages[i - 1] + 1 if i else 0, pno):
+                full_text.add(clip(analysis.text(skipped_pno)))
+
+        t0 = time.perf_counter()
+        # texto + palavras com um TextPage só (solto em seguida), ou do cache de análise
+        raw, pw = analysis.page(pno)
+        ptxt = clip(raw)
+        full_text.add(ptxt)
+        last = pno
+        anchors, results = process_page(pw, anchor_names, llm_values=spec is None and stage_ok("value"))
+        typed = resolve_typed_fields(pw, results, {k: t for k, t in field_types.items() if k not in typed_done})
+        t1 = time.perf_counter()
+        page_times.append(t1 - t0)
+
+        # aplica engine
+        page_raw = {}
+        for r in results:
+            k = r["key"]
+            val = (r.get("text") or "").strip()
+            page_raw[k] = val
+            if r.get("composed"):
+                composed.add(k)
+            if k in extracted and (extracted[k] is None or str(extracted[k]).strip() == ""):
+                if val:
+                    extracted[k] = val
+                    conf[k] = heuristic_confidence(r)
+                    if str(r.get("origin", "")).startswith("table"):
+                        table_done.add(k)
+
+        # campos tipados: valor validado prevalece sobre o span bruto
+        for k, v in typed.items():
+            page_raw[k] = v
+            extracted[k] = v
+            conf[k] = 1.0
+            typed_done.add(k)
+
+        # normalizador determinístico: valor canônico do tipo (data, telefone, CPF, UF, nome...) sem bulk LLM
+        normed = normalize_values({k: t for k, t in norm_types.items() if page_raw.get(k)}, page_raw)
+        for k, v in normed.items():
+            if extracted.get(k) == page_raw[k]:  # o valor aplicado veio desta página
+                extracted[k] = v
+            page_raw[k] = v
+            norm_done.add(k)
+        if normed:
+            log_event(log, logging.INFO, "normalize.local", page=pno, fields=len(normed))
+
+        # LLM bulk sanitiza e tenta preencher (só o que não foi validado por tipo)
+        # chave sem janela (nenhuma âncora nem rótulo candidato, ex.: nome sem rótulo) ainda vazia: o
+        # restante da página entra depois das regiões, dentro do mesmo orçamento
+        windows, orphans = roi_windows(pw, results, anchor_names)
+        roi_text.add(build_roi_context(pw, windows, max(200, ROI_TOKEN_BUDGET_JSON // len(pages)),
+                                       fill_rest=any(not (extracted.get(k) or "").strip() for k in orphans)))
+        llm_keys = [k for k in anchor_names if k not in typed_done and k not in table_done and k not in norm_done and
+                    (relevance is None or k in relevance.get(pno, ()) or k in unseen)]
+        if not llm_keys or spec is not None or not stage_ok("bulk"):
+            continue
+        # sanitizador local (destilado do bulk): campo com valor bruto e regra confiável não vai ao LLM
+        # (e campo sem valor bruto fica para o passo final JSON, que já pede as chaves vazias, se ele
+        # for rodar: fora do perfil, circuito aberto ou prazo curto, continua no bulk)
+        sanitizer = get_sanitizer() if ENABLE_LLM_FALLBACK and prof.llm else None
+        page_vals = {}
+        if sanitizer is not None:
+            page_vals = sanitizer.confident(llm_keys, page_raw)
+            defer = final_json_expected()
+            llm_keys = [k for k in llm_keys if k not in page_vals and (page_raw.get(k) or not defer)]
+        if page_vals:
+            log_event(log, logging.INFO, "sanitizer.local", page=pno, local=len(page_vals), escalated=len(llm_keys))
+        if llm_keys:
+            page_text = (build_roi_context(pw, windows, ROI_TOKEN_BUDGET_BULK, fill_rest=bool(orphans.intersection(llm_keys)))
+                         or page_text_from_words(pw, max_chars=1800) or ptxt[:1800])
+            page_vals.update(zip(llm_keys, llm_sanitize_and_fill_bulk(llm_keys, page_text, page_raw)))
+        for k, v_model in page_vals.items():
+            v_model = (v_model or "").strip()
+            if v_model.lower() == "null":
+                v_model = ""
+            if v_model:
+                if extracted.get(k) is None or not str(extracted[k]).strip():
+                    extracted[k] = v_model
+                elif prof.sanitize_existing:
+                    extracted[k] = v_model
+
+    # páginas depois da última processada: fora da seleção ou não alcançadas (prazo/memória)
+    for skipped_pno in range(last + 1, len(doc)):
+        full_text.add(clip(analysis.text(skipped_pno)))
+
+    if spec is not None:
+        if all(conf.get(k, 0.0) >= SPEC_CONFIDENT for k in anchor_names):
+            if spec.cancel():
+                _record_llm("json", "cancelled")
+            log_event(log, logging.INFO, "llm.speculative", outcome="discarded", started=not spec.cancelled())
+        else:
+            try:
+                spec_vals = spec.result(timeout=max(0.0, deadline.remaining()) if deadline is not None else None)
+            except TimeoutError:
+                deadline.degrade("speculative", "timeout")
+                spec_vals = {}
+            merged = 0
+            for k in anchor_names:
+                v = spec_vals.get(k) if isinstance(spec_vals, dict) else None
+                v = str(v).strip() if v is not None else ""
+                if v and v.lower() != "null" and conf.get(k, 0.0) < SPEC_LLM_CONFIDENCE:
+                    extracted[k] = v
+                    merged += 1
+            log_event(log, logging.INFO, "llm.speculative", outcome="merged", fields=merged)
+        extracted.update(normalize_values(norm_types, extracted))
+        final = {k: (extracted.get(k) if extracted.get(k) not in ("", "null") else None) for k in anchor_names}
+        return final, page_times
+
+    # Passo final: JSON extractor (ROI das páginas; texto completo se vazio)
+    final_keys = [k for k in anchor_names if k not in typed_done and k not in table_done and
+                  (final_all_keys or not (extracted.get(k) or "").strip() or k in composed)]
+    if final_keys and stage_ok("json"):
+        json_filled = llm_extract_schema_json(roi_text.text() or full_text.text(), _schema_keys_null({k: schema.get(k) for k in final_keys}))
+
+        # aplica se vier valor não-nulo
+        for k in final_keys:
+            v = json_filled.get(k, None) if isinstance(json_filled, dict) else None
+            if isinstance(v, str):
+                v = v.strip()
+            if v is None or (isinstance(v, str) and v.lower() == "null") or v == "":
+                # mantém o do engine se já existir
+                continue
+            extracted[k] = str(v)
+
+    # valores do JSON extractor também saem na forma canônica do tipo
+    extracted.update(normalize_values(norm_types, extracted))
+    # normaliza None -> None real (não "null" string)
+    final = {k: (extracted.get(k) if extracted.get(k) not in ("", "null") else None) for k in anchor_names}
+    return final, page_times
 
 # ---------------- PATHS ----------------
 BASE = os.path.dirname(os.path.abspath(__file__)) if '__file__' in globals() else os.getcwd()
@@ -953,169 +1390,101 @@ def main():
 
         print(f"[+] PDF: {pdf_rel} | campos: {anchor_names}")
         doc = fitz.open(pdf_path)
-
-        # juntamos texto completo do doc para o passo final JSON extractor
-        full_text_parts = []
-
-        extracted = {k: None for k in anchor_names}
-        page_times = []
-        for pno in range(len(doc)):
-            page = doc[pno]
-            words = page.get_text("words")
-
-            # acumula texto integral (limite por pagina ~ 3000 chars para não explodir)
-            ptxt = (page.get_text("text") or "")
-            if len(ptxt) > 3000:
-                ptxt = ptxt[:2000] + "\n...\n" + ptxt[-1000:]
-            full_text_parts.append(ptxt)
-
-            t0 = time.perf_counter()
-            anchors, results, words_xy = process_page(doc, page, words, anchor_names)
-            t1 = time.perf_counter()
-            elapsed = t1 - t0
-            page_times.append(elapsed)
+        try:
+            # CLI: perfil balanced (JSON extractor final só nos campos faltantes ou compostos)
+            with track_usage() as usage, use_profile("balanced"):
+                result_json, page_times = extract_document(doc, schema)
+        finally:
+            doc.close()
+        llm = usage.summary()
+        for pno, elapsed in enumerate(page_times):
             print(f"  [tempo] página {pno+1}: {elapsed:.3f}s")
 
-            # (1) aplicar engine de âncoras
-            page_raw = {}
-            for r in results:
-                k = r["key"]
-                val = (r.get("text") or "").strip()
-                page_raw[k] = val
-                if k in extracted and (extracted[k] is None or str(extracted[k]).strip() == ""):
-                    if val:
-                        extracted[k] = val
-
-            # (2) LLM bulk por página (sanitiza + tenta preencher vazios)
-            page_text = page_text_from_words(words_xy, max_chars=1800) or (page.get_text("text") or "")[:1800]
-            bulk_vals = llm_sanitize_and_fill_bulk(anchor_names, page_text, page_raw)
-            for i, k in enumerate(anchor_names):
-                v_model = (bulk_vals[i] or "").strip()
-                if v_model.lower() == "null": v_model = ""
-                if v_model:
-                    if extracted.get(k) is None or not str(extracted[k]).strip():
-                        extracted[k] = v_model
-                    elif LLM_SANITIZE_EXISTING:
-                        extracted[k] = v_model
-
-        doc.close()
-
-        # (3) PASSO FINAL — JSON extractor no TEXTO COMPLETO para campos faltantes
-        missing_keys = [
-            k for k in anchor_names
-            if not (extracted.get(k) or "").strip()
-            or any(
-            r.get("key") == k and r.get("composed", False)
-            for r in results
-            )
-        ]
-        #missing_keys = anchor_names[:]  # passa o schema inteiro p/ re-sanitizar tudo
-
-        if missing_keys:
-            missing_schema = _schema_keys_null({k: schema.get(k, None) for k in missing_keys})
-            full_text = "\n\n".join(full_text_parts)
-            json_filled = llm_extract_schema_json(full_text, missing_schema)
-            # aplica somente se vier valor não-nulo
-            for k in missing_keys:
-                v = json_filled.get(k, None)
-                if isinstance(v, str):
-                    v = v.strip()
-                if v is None or (isinstance(v, str) and v.lower() == "null") or v == "":
-                    continue
-                extracted[k] = str(v)
-
         mean_time = statistics.mean(page_times) if page_times else 0.0
         print(f"  [média] {mean_time:.3f}s por página")
-        print(f"  [LLM] attempts={LLM_STATS['attempts']} success={LLM_STATS['success']}")
+        print(f"  [LLM] calls={llm['calls']} in={llm['input_tokens']} out={llm['output_tokens']} "
+              f"cached={llm['cached_tokens']} ms={llm['latency_ms']} cost=${llm['cost_usd']:.5f} "
+              f"| total attempts={LLM_STATS['attempts']} success={LLM_STATS['success']}")
 
-        result_json = {k: (extracted[k] if extracted[k] is not None else None) for k in anchor_names}
         all_outputs.append({
             "pdf": pdf_rel,
             "result": result_json,
             "timing": {
                 "per_page_seconds": [round(t, 6) for t in page_times],
                 "mean_seconds": round(mean_time, 6)
-            }
+            },
+            "llm": {k: v for k, v in llm.items() if k != "detail"},
         })
 
     print("\n=== JSON FINAL ===")
     print(json.dumps(all_outputs, ensure_ascii=False, indent=2))
 
-if __name__ == "__main__":
-    main()
 
+def _open_pdf(src):
+    # bytes -> stream em memória; caminho -> PyMuPDF lê do disco sob demanda (PDFs grandes)
+    if isinstance(src, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=src, filetype="pdf")
+    return fitz.open(os.fspath(src))
 
-def process_pdf_to_json(pdf_bytes: bytes, schema: dict) -> dict:
+def process_pdf_with_meta(pdf_bytes, schema: dict, speculative=None, deadline=None, mem_limit_mb=None,
+                          final_all_keys: bool = None, profile=None):
     """
-    Abre o PDF em memória, roda a pipeline:
-      1) Para cada página: âncoras -> reading span -> LLM bulk sanitize/fill
-      2) Passo final: LLM JSON extractor no TEXTO COMPLETO (re-sanitiza tudo)
-    Retorna um dict com os campos do schema. Campos não encontrados = None/strings vazias.
+    Abre o PDF (bytes ou caminho de arquivo) e roda a pipeline (ver extract_document);
+    profile: perfil de extração (nome ou ExtractionProfile; None = o do contexto/EXTRACTION_PROFILE).
+    speculative/final_all_keys=None usam o do perfil (speculative do perfil None = LLM_SPECULATIVE).
+    deadline (deadline.Deadline): orçamento do documento; chamadas LLM herdam timeouts dele.
+    mem_limit_mb: teto de crescimento de RSS do item (None = ITEM_MEM_LIMIT_MB; 0 desliga).
+    A análise das páginas independente do schema é lida/gravada no cache em disco
+    (ANALYSIS_CACHE, chave = sha256 do PDF): reprocessar o mesmo PDF com outro schema pula
+    extração de palavras, calibração de layout e âncoras genéricas.
+    Retorna (campos do schema, metadados): metadados trazem tempos por página e o uso de
+    LLM do documento (chamadas por estágio, tokens, latência, cache e custo estimado).
     """
     if not schema or not isinstance(schema, dict):
-        return {}
-
-    # Carrega o PDF do stream
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-
-    anchor_names = list(schema.keys())
-    extracted = {k: None for k in anchor_names}
-    full_text_parts = []
-    page_times = []
+        return {}, {}
 
-    for pno in range(len(doc)):
-        page = doc[pno]
-        # guarda texto integral da página (cortado)
-        ptxt = (page.get_text("text") or "")
-        if len(ptxt) > 3000:
-            ptxt = ptxt[:2000] + "\n...\n" + ptxt[-1000:]
-        full_text_parts.append(ptxt)
-
-        t0 = time.perf_counter()
-        words = page.get_text("words")
-        anchors, results, words_xy = process_page(doc, page, words, anchor_names)
-        t1 = time.perf_counter()
-        page_times.append(t1 - t0)
-
-        # aplica engine
-        page_raw = {}
-        for r in results:
-            k = r["key"]
-            val = (r.get("text") or "").strip()
-            page_raw[k] = val
-            if k in extracted and (extracted[k] is None or str(extracted[k]).strip() == ""):
-                if val:
-                    extracted[k] = val
-
-        # LLM bulk sanitiza e tenta preencher
-        page_text = page_text_from_words(words_xy, max_chars=1800) or (page.get_text("text") or "")[:1800]
-        bulk_vals = llm_sanitize_and_fill_bulk(anchor_names, page_text, page_raw)
-        for i, k in enumerate(anchor_names):
-            v_model = (bulk_vals[i] or "").strip()
-            if v_model.lower() == "null":
-                v_model = ""
-            if v_model:
-                if extracted.get(k) is None or not str(extracted[k]).strip():
-                    extracted[k] = v_model
-                elif True:  # LLM_SANITIZE_EXISTING
-                    extracted[k] = v_model
-
-    doc.close()
-
-    # Passo final: re-sanitizar tudo com JSON extractor no texto completo
-    full_text = "\n\n".join(full_text_parts)
-    json_filled = llm_extract_schema_json(full_text, _schema_keys_null(schema))
-
-    # aplica se vier valor não-nulo
-    for k in anchor_names:
-        v = json_filled.get(k, None) if isinstance(json_filled, dict) else None
-        if isinstance(v, str):
-            v = v.strip()
-        if v is None or (isinstance(v, str) and v.lower() == "null") or v == "":
-            # mantém o do engine se já existir
-            continue
-        extracted[k] = str(v)
+    t0 = time.perf_counter()
+    prof = current_profile() if profile is None else get_profile(profile)
+    if speculative is None:
+        speculative = LLM_SPECULATIVE if prof.speculative is None else prof.speculative
+    guard = MemoryGuard() if mem_limit_mb is None else MemoryGuard(mem_limit_mb)
+    doc = _open_pdf(pdf_bytes)
+    try:
+        key = pdf_hash(pdf_bytes) if ANALYSIS_STORE is not None else None
+        analysis = ANALYSIS_STORE.load(key, doc) if key else DocAnalysis(doc)
+        before = analysis.signature()
+        with track_usage() as usage, use_deadline(deadline), use_profile(prof):
+            final, page_times = extract_document(
+                doc, schema, speculative=speculative, deadline=deadline, mem_guard=guard,
+                analysis=analysis, final_all_keys=final_all_keys)
+        if key and analysis.signature() != before:
+            try:
+                ANALYSIS_STORE.save(key, analysis)
+            except OSError as e:  # disco cheio/sem permissão: o cache é só otimização
+                log_event(log, logging.WARNING, "analysis_cache.save_failed", err=str(e))
+    finally:
+        doc.close()
+    meta = {
+        "profile": prof.name,
+        "timing": {
+            "per_page_seconds": [round(t, 6) for t in page_times],
+            "total_ms": int((time.perf_counter() - t0) * 1000),
+        },
+        "llm": {**usage.summary(), "prompt_version": PROMPT_VERSION},
+        "memory": {**guard.summary(), "peak_rss_mb": round(peak_rss_mb(), 1)},
+        "analysis_cache": {"pages_hit": analysis.hits, "enabled": key is not None},
+    }
+    if deadline is not None:
+        meta["deadline"] = deadline.summary()
+    return final, meta
 
-    # normaliza None -> None real (não "null" string)
-    final = {k: (extracted.get(k) if extracted.get(k) not in ("", "null") else None) for k in anchor_names}
+def process_pdf_to_json(pdf_bytes, schema: dict, deadline=None, profile=None) -> dict:
+    """
+    Abre o PDF (bytes ou caminho) e roda a pipeline.
+    Retorna um dict com os campos do schema. Campos não encontrados = None.
+    """
+    final, _ = process_pdf_with_meta(pdf_bytes, schema, deadline=deadline, profile=profile)
     return final
+
+if __name__ == "__main__":
+    main()
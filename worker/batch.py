@@ -0,0 +1,237 @@
+# batch.py — processamento local em lote (sem Supabase): pool de processos, saída JSONL por documento
+#   python -m worker.batch dataset3.json --pdf-dir Data/pdfs -o out.jsonl --workers 4
+#   python -m worker.batch --glob "Data/pdfs/*.pdf" --schema schema.json -o out.jsonl --resume
+import os, sys, json, glob, time, hashlib, argparse, statistics
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+# o progresso no stderr é a interface; logs por chamada LLM ficariam misturados a ele
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from worker.profiles import PROFILES  # noqa: E402
+
+
+def load_items(dataset=None, pdf_dir=".", pattern=None, schema_path=None) -> list:
+    """
+    Itens {pdf, path, label, schema, profile, key}. dataset: lista JSON (formato do dataset3.json) ou
+    JSONL com pdf_path/extraction_schema/label (e extraction_profile opcional, que vence o --profile);
+    pdf_path é relativo a pdf_dir. Com pattern, todos os PDFs
+    do glob usam o schema de schema_path. key = pdf + hash do schema (identifica a linha no resume).
+    """
+    if pattern:
+        with open(schema_path, "r", encoding="utf-8") as f:
+            schema = json.load(f)
+        raw = [{"pdf_path": p, "extraction_schema": schema} for p in sorted(glob.glob(pattern, recursive=True))]
+        pdf_dir = ""
+    else:
+        with open(dataset, "r", encoding="utf-8") as f:
+            text = f.read()
+        try:
+            raw = json.loads(text)
+        except ValueError:
+            raw = [json.loads(line) for line in text.splitlines() if line.strip()]
+        if not isinstance(raw, list):
+            raise SystemExit("[ERR] dataset deve ser LISTA de itens (JSON) ou JSONL.")
+    items = []
+    for it in raw:
+        rel = it.get("pdf_path", "")
+        schema = it.get("extraction_schema") or {}
+        digest = hashlib.sha1(json.dumps(schema, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:12]
+        items.append({"pdf": rel, "path": os.path.join(pdf_dir, rel) if pdf_dir else rel,
+                      "label": it.get("label"), "schema": schema, "profile": it.get("extraction_profile"),
+                      "key": f"{rel}#{digest}"})
+    return items
+
+
+def done_keys(out_path: str) -> set:
+    """Chaves já concluídas sem erro em out_path (linha final truncada por queda é ignorada)."""
+    keys = set()
+    if not os.path.isfile(out_path):
+        return keys
+    with open(out_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue
+            if not row.get("error"):
+                keys.add(row.get("key"))
+    return keys
+
+
+_LAYOUTS = None  # clusters de layout do processo do pool (vale para a execução inteira)
+
+
+def _run_item(item: dict, profile: str) -> dict:
+    # roda no processo do pool; a pipeline é importada uma vez por processo
+    from worker.anchors_reading_span import process_pdf_with_meta
+    from worker.layout import LayoutCache, use_layouts
+    global _LAYOUTS
+    if _LAYOUTS is None:
+        _LAYOUTS = LayoutCache()
+    t0 = time.perf_counter()
+    row = {"key": item["key"], "pdf": item["pdf"], "label": item["label"]}
+    if not os.path.isfile(item["path"]):
+        return {**row, "result": None, "error": "pdf_not_found", "ms": 0}
+    try:
+        with use_layouts(_LAYOUTS):
+            result, meta = process_pdf_with_meta(item["path"], item["schema"], profile=item.get("profile") or profile)
+    except Exception as e:
+        return {**row, "result": None, "error": f"{type(e).__name__}: {e}",
+                "ms": int((time.perf_counter() - t0) * 1000)}
+    return {**row, "result": result, "error": None, "ms": int((time.perf_counter() - t0) * 1000),
+            "profile": meta.get("profile"), "timing": meta.get("timing"), "llm": {k: v for k, v in (meta.get("llm") or {}).items() if k != "detail"}}
+
+
+class Progress:
+    """Vazão e latência (p50/p95) ao vivo no stderr; no fim, o resumo."""
+
+    def __init__(self, total: int, skipped: int, stream=sys.stderr, every_s: float = 1.0):
+        self.total, self.skipped = total, skipped
+        self.stream, self.every_s = stream, every_s  # stream=None: só contabiliza
+        self.tty = stream is not None and stream.isatty()
+        self.t0 = time.perf_counter()
+        self.last = 0.0
+        self.lat = []
+        self.errors = 0
+
+    def add(self, row: dict):
+        self.lat.append(row.get("ms") or 0)
+        self.errors += bool(row.get("error"))
+        now = time.perf_counter()
+        if now - self.last >= self.every_s:
+            self.last = now
+            self._print(self.line(), final=False)
+
+    def line(self) -> str:
+        n = len(self.lat)
+        wall = max(1e-9, time.perf_counter() - self.t0)
+        lat = sorted(self.lat)
+        p50 = statistics.median(lat) if lat else 0
+        p95 = lat[int(0.95 * (n - 1))] if lat else 0
+        rate = n / wall
+        eta = (self.total - n) / rate if rate else 0
+        return (f"{n}/{self.total} docs ({self.skipped} já feitos) | {rate:.2f} docs/s | "
+                f"p50={p50:.0f}ms p95={p95:.0f}ms | erros={self.errors} | ETA {eta:.0f}s")
+
+    def _print(self, text, final):
+        if self.stream is None:
+            return
+        if self.tty:  # terminal: uma linha reescrita no lugar
+            self.stream.write("\r" + text + ("\n" if final else ""))
+        else:
+            self.stream.write(("concluído: " if final else "") + text + "\n")
+        self.stream.flush()
+
+    def close(self):
+        self._print(self.line(), final=True)
+
+
+def _pool(workers: int) -> ProcessPoolExecutor:
+    # spawn: os filhos não herdam threads (listener de log, pools) do processo pai
+    return ProcessPoolExecutor(workers, mp_context=mp.get_context("spawn"))
+
+
+def _error_row(item: dict, error: str) -> dict:
+    return {"key": item["key"], "pdf": item["pdf"], "label": item["label"], "result": None, "error": error, "ms": 0}
+
+
+def run_batch(items, out_path, workers=None, resume=False, profile="balanced", progress=True) -> dict:
+    """Processa items no pool e acrescenta uma linha JSONL por documento concluído em out_path."""
+    skip = done_keys(out_path) if resume else set()
+    todo = [it for it in items if it["key"] not in skip]
+    workers = workers or os.cpu_count() or 1
+    prog = Progress(len(todo), len(items) - len(todo), stream=sys.stderr if progress else None)
+    if resume and os.path.isfile(out_path) and os.path.getsize(out_path):
+        with open(out_path, "rb") as f:  # garante que a próxima linha não cola numa linha truncada
+            f.seek(-1, os.SEEK_END)
+            needs_nl = f.read(1) != b"\n"
+        if needs_nl:
+            with open(out_path, "a", encoding="utf-8") as out:
+                out.write("\n")
+
+    with open(out_path, "a" if resume else "w", encoding="utf-8") as out:
+        ex = _pool(workers)
+        pending = {}  # future -> item
+        queue = iter(todo)
+        # itens em voo quando um processo do pool morreu (segfault, OOM killer): refeitos um por vez
+        # num pool novo; o que derrubar o pool sozinho vira linha de erro
+        suspects, retried = [], set()
+        try:
+            while True:
+                if suspects:
+                    if not pending:
+                        it = suspects.pop(0)
+                        retried.add(it["key"])
+                        pending[ex.submit(_run_item, it, profile)] = it
+                else:
+                    # no máximo 2 itens por processo em voo (dataset grande não vira milhares de futures)
+                    while len(pending) < workers * 2:
+                        it = next(queue, None)
+                        if it is None:
+                            break
+                        pending[ex.submit(_run_item, it, profile)] = it
+                if not pending:
+                    break
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                broken = False
+                for fut in finished:
+                    it = pending.pop(fut)
+                    try:
+                        row = fut.result()
+                    except BrokenProcessPool as e:
+                        broken = True
+                        if it["key"] not in retried:
+                            suspects.append(it)
+                            continue
+                        row = _error_row(it, f"BrokenProcessPool: {e}")
+                    except Exception as e:
+                        row = _error_row(it, f"{type(e).__name__}: {e}")
+                    out.write(json.dumps(row, ensure_ascii=False) + "\n")
+                    out.flush()
+                    prog.add(row)
+                if broken:
+                    suspects.extend(pending.values())
+                    pending.clear()
+                    ex.shutdown(wait=False, cancel_futures=True)
+                    ex = _pool(workers)
+        except KeyboardInterrupt:
+            for fut in pending:
+                fut.cancel()
+            raise
+        finally:
+            ex.shutdown(cancel_futures=True)
+            prog.close()
+    return {"done": len(prog.lat), "skipped": len(items) - len(todo), "errors": prog.errors}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m worker.batch",
+                                 description="Extração local em lote, uma linha JSONL por documento.")
+    ap.add_argument("dataset", nargs="?", help="lista JSON (formato dataset3.json) ou JSONL de itens")
+    ap.add_argument("--pdf-dir", default=".", help="diretório base dos pdf_path do dataset")
+    ap.add_argument("--glob", help="PDFs por glob (em vez do dataset); requer --schema")
+    ap.add_argument("--schema", help="schema JSON usado com --glob")
+    ap.add_argument("-o", "--out", required=True, help="arquivo JSONL de saída (uma linha por documento)")
+    ap.add_argument("-w", "--workers", type=int, default=None, help="processos (padrão: nº de CPUs)")
+    ap.add_argument("--resume", action="store_true", help="pula documentos já concluídos sem erro em --out")
+    ap.add_argument("--profile", choices=sorted(PROFILES), default=None,
+                    help="perfil de extração (padrão: balanced, como o CLI; fast = só heurísticas)")
+    ap.add_argument("--all-keys", action="store_true", help="atalho para --profile accurate")
+    ap.add_argument("--quiet", action="store_true", help="sem progresso no stderr")
+    args = ap.parse_args(argv)
+    if bool(args.dataset) == bool(args.glob) or (args.glob and not args.schema):
+        ap.error("informe o dataset OU --glob com --schema")
+    items = load_items(args.dataset, args.pdf_dir, args.glob, args.schema)
+    profile = args.profile or ("accurate" if args.all_keys else "balanced")
+    try:
+        run_batch(items, args.out, args.workers, args.resume, profile, progress=not args.quiet)
+    except KeyboardInterrupt:
+        print("\n[interrompido] rode de novo com --resume para continuar", file=sys.stderr)
+        return 130
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+# deadline.py — orçamento de tempo ponta a ponta por documento (estágios checam o que resta)
+import os, time, threading, contextvars
+from contextlib import contextmanager
+
+DOC_DEADLINE_S = float(os.environ.get("DOC_DEADLINE_S", "10"))     # promessa do README: < 10 s por documento
+LLM_TIMEOUT_S = float(os.environ.get("LLM_TIMEOUT_S", "20"))       # teto por chamada (com ou sem deadline)
+LLM_MIN_CALL_S = float(os.environ.get("LLM_MIN_CALL_S", "1.5"))    # abaixo disso não vale abrir chamada
+
+
+class Deadline:
+    """Prazo absoluto (relógio monotônico) + registro dos estágios degradados por falta de tempo."""
+
+    def __init__(self, budget_s: float = DOC_DEADLINE_S):
+        self.budget_s = float(budget_s)
+        self.t_end = time.monotonic() + self.budget_s
+        self.degraded = []
+        self._lock = threading.Lock()
+
+    def remaining(self) -> float:
+        return self.t_end - time.monotonic()
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def allows(self, seconds: float) -> bool:
+        """Ainda há `seconds` de orçamento?"""
+        return self.remaining() >= seconds
+
+    def llm_timeout(self, reserve: float = 0.0):
+        """Timeout da próxima chamada LLM (None = não há tempo para chamar)."""
+        left = self.remaining() - reserve
+        if left < LLM_MIN_CALL_S:
+            return None
+        return min(LLM_TIMEOUT_S, left)
+
+    def degrade(self, stage: str, reason: str = "budget", **info):
+        with self._lock:
+            self.degraded.append({"stage": stage, "reason": reason,
+                                  "remaining_ms": int(self.remaining() * 1000), **info})
+
+    def summary(self) -> dict:
+        with self._lock:
+            degraded = list(self.degraded)
+        return {"budget_ms": int(self.budget_s * 1000), "remaining_ms": int(self.remaining() * 1000),
+                "degraded": degraded}
+
+
+_current_deadline = contextvars.ContextVar("deadline", default=None)
+
+def current_deadline():
+    return _current_deadline.get()
+
+@contextmanager
+def use_deadline(deadline):
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
@@ -0,0 +1,167 @@
+# field_types.py — tipos de campo (CPF, CNPJ, CEP, telefone, data...) com regex pré-compiladas e validação
+import bisect
+import datetime as _dt
+import unicodedata as _ud
+import regex as rx
+
+FIELD_TYPES = {}  # nome -> {"pattern", "validate", "key_hints", "key_exact", "desc_hints"}
+# padrões sem validador que casam com texto comum (sigla, qualquer número, qualquer valor com centavos):
+# só valem perto do rótulo do campo, nunca como "único valor do tipo na página"
+LOOSE_TYPES = ("moeda", "uf", "oab")
+
+def register_field_type(name, pattern, key_hints=(), desc_hints=(), validate=None, flags=0, key_exact=()):
+    """
+    Registra (ou substitui) um tipo de campo. key_hints casam com a chave inteira ou com o começo
+    dela ("data" -> data_nascimento, nunca uma palavra do meio); key_exact só com a chave inteira
+    ("estado", mas não estado_civil); desc_hints com a descrição do schema. A ordem de registro
+    define a prioridade da inferência.
+    """
+    FIELD_TYPES[name] = {
+        "pattern": rx.compile(pattern, flags),
+        "validate": validate,
+        "key_hints": tuple(key_hints),
+        "key_exact": tuple(key_exact),
+        "desc_hints": tuple(desc_hints),
+    }
+
+def _norm(s) -> str:
+    s = "".join(ch for ch in _ud.normalize("NFD", str(s or "")) if _ud.category(ch) != "Mn")
+    s = rx.sub(r"([a-z0-9])([A-Z])", r"\1 \2", s)
+    return rx.sub(r"[^a-z0-9]+", " ", s.lower()).strip()
+
+def _digits(s: str) -> str:
+    return rx.sub(r"\D", "", s)
+
+# ---------------- validadores ----------------
+def valid_cpf(s: str) -> bool:
+    d = _digits(s)
+    if len(d) != 11 or d == d[0] * 11:
+        return False
+    for n in (9, 10):
+        tot = sum(int(d[i]) * (n + 1 - i) for i in range(n))
+        if (tot * 10 % 11) % 10 != int(d[n]):
+            return False
+    return True
+
+def valid_cnpj(s: str) -> bool:
+    d = _digits(s)
+    if len(d) != 14 or d == d[0] * 14:
+        return False
+    for n, w in ((12, [5,4,3,2,9,8,7,6,5,4,3,2]), (13, [6,5,4,3,2,9,8,7,6,5,4,3,2])):
+        r = sum(int(d[i]) * w[i] for i in range(n)) % 11
+        if (0 if r < 2 else 11 - r) != int(d[n]):
+            return False
+    return True
+
+VALID_DDD = {11,12,13,14,15,16,17,18,19,21,22,24,27,28,31,32,33,34,35,37,38,41,42,43,44,45,46,47,48,49,
+             51,53,54,55,61,62,63,64,65,66,67,68,69,71,73,74,75,77,79,81,82,83,84,85,86,87,88,89,
+             91,92,93,94,95,96,97,98,99}
+def valid_phone(s: str) -> bool:
+    d = _digits(s)
+    if d.startswith("55") and len(d) in (12, 13):
+        d = d[2:]
+    return len(d) in (10, 11) and int(d[:2]) in VALID_DDD and (len(d) == 10 or d[2] == "9")
+
+def valid_date(s: str) -> bool:
+    m = rx.match(r"^\s*(\d{1,2})[/.-](\d{1,2})[/.-](\d{4})\s*$", s)
+    if not m:
+        return False
+    try:
+        _dt.date(int(m.group(3)), int(m.group(2)), int(m.group(1)))
+        return True
+    except ValueError:
+        return False
+
+UFS = ("AC","AL","AP","AM","BA","CE","DF","ES","GO","MA","MT","MS","MG","PA","PB",
+       "PR","PE","PI","RJ","RN","RS","RO","RR","SC","SP","SE","TO")
+
+# ---------------- tipos padrão (ordem = prioridade) ----------------
+register_field_type("cpf", r"(?<!\d)\d{3}\.?\d{3}\.?\d{3}-?\d{2}(?!\d)",
+                    key_hints=("cpf",), desc_hints=("cpf",), validate=valid_cpf)
+register_field_type("cnpj", r"(?<!\d)\d{2}\.?\d{3}\.?\d{3}/?\d{4}-?\d{2}(?!\d)",
+                    key_hints=("cnpj",), desc_hints=("cnpj",), validate=valid_cnpj)
+register_field_type("cep", r"(?<!\d)\d{2}\.?\d{3}-\d{3}(?!\d)|(?<=\bCEP:?\s*)\d{8}(?!\d)",
+                    key_hints=("cep",), desc_hints=("cep", "codigo postal"))
+register_field_type("email", r"\b[\w.+-]+@[\w-]+(?:\.[\w-]+)+\b",
+                    key_hints=("email", "e mail"), desc_hints=("e mail", "email"))
+register_field_type("telefone", r"(?<!\d)(?:\+?55\s*)?\(?\d{2}\)?\s*9?\s?\d{4}[-\s]?\d{4}(?!\d)",
+                    key_hints=("telefone", "celular", "fone", "tel", "whatsapp"),
+                    desc_hints=("telefone", "celular"), validate=valid_phone)
+register_field_type("data", r"(?<!\d)[0-3]?\d[/.-][01]?\d[/.-](?:19|20)\d{2}(?!\d)",
+                    key_hints=("data", "nascimento", "emissao", "validade", "vencimento", "dt"),
+                    desc_hints=("data", "dd mm"), validate=valid_date)
+register_field_type("moeda", r"R\$\s*-?\d{1,3}(?:\.\d{3})*,\d{2}(?!\d)|(?<![\d.,])-?\d{1,3}(?:\.\d{3})*,\d{2}(?![\d,])",
+                    key_hints=("valor", "saldo", "preco", "montante"),
+                    desc_hints=("valor", "reais", "saldo"))
+register_field_type("uf", r"\b(?:" + "|".join(UFS) + r")\b",
+                    key_hints=("uf", "seccional"), key_exact=("estado",),
+                    desc_hints=("uf", "sigla do estado", "unidade federativa"))
+register_field_type("oab", r"(?<![\d.])\d{1,3}(?:\.\d{3})+(?![\d.])|(?<![\d.,/-])\d{3,6}(?![\d.,/-])",
+                    key_hints=("inscricao", "oab"), desc_hints=("inscricao", "oab"))
+
+def infer_field_type(key: str, description=None):
+    """Tipo do campo pelo nome da chave (inteira ou o começo dela) ou, se não houver, pela descrição."""
+    key_text = _norm(key)
+    for name, ft in FIELD_TYPES.items():
+        if key_text in ft["key_exact"] or any(key_text == h or key_text.startswith(h + " ") for h in ft["key_hints"]):
+            return name
+    desc = " " + _norm(description) + " " if isinstance(description, str) else ""
+    if desc.strip():
+        for name, ft in FIELD_TYPES.items():
+            if any(f" {h.strip()} " in desc for h in ft["desc_hints"]):
+                return name
+    return None
+
+def infer_field_types(schema: dict) -> dict:
+    """{chave: tipo} apenas para as chaves com tipo reconhecido."""
+    out = {}
+    for k, desc in (schema or {}).items():
+        t = infer_field_type(k, desc)
+        if t:
+            out[k] = t
+    return out
+
+def find_typed(ftype: str, text: str):
+    """Primeira ocorrência válida do tipo no texto (ou None)."""
+    ft = FIELD_TYPES.get(ftype)
+    if not ft or not text:
+        return None
+    for m in ft["pattern"].finditer(text):
+        v = m.group(0).strip()
+        if ft["validate"] is None or ft["validate"](v):
+            return v
+    return None
+
+def scan_typed_candidates(pw, types):
+    """
+    Roda cada padrão UMA vez sobre o texto da página em ordem de leitura e devolve
+    {tipo: [{"value", "idxs", "cx", "cy"}]} com os índices das palavras que formam cada valor.
+    """
+    order = pw.reading_order(line_tol=6.0)
+    parts, starts, pos = [], [], 0
+    for i in order:
+        starts.append(pos)
+        parts.append(pw.text[i])
+        pos += len(pw.text[i]) + 1
+    text = " ".join(parts)
+
+    out = {}
+    for ftype in set(types):
+        ft = FIELD_TYPES.get(ftype)
+        if not ft:
+            continue
+        cands = []
+        for m in ft["pattern"].finditer(text):
+            v = m.group(0).strip()
+            if ft["validate"] is not None and not ft["validate"](v):
+                continue
+            # palavras cuja faixa de caracteres cruza o match
+            n0 = max(0, bisect.bisect_right(starts, m.start()) - 1)
+            n1 = bisect.bisect_left(starts, m.end())
+            idxs = [int(order[n]) for n in range(n0, n1) if starts[n] + len(parts[n]) > m.start()]
+            if not idxs:
+                continue
+            cands.append({"value": v, "idxs": idxs,
+                          "cx": float(pw.cx[idxs].mean()), "cy": float(pw.cy[idxs].mean())})
+        out[ftype] = cands
+    return out
@@ -0,0 +1,141 @@
+# layout.py — impressão digital de layout por página e reaproveitamento da geometria das âncoras dentro
+# de um job: documentos do mesmo gerador caem no mesmo cluster; a página que resolve as âncoras por
+# inteiro (representante) semeia as demais, que só conferem o rótulo no lugar e re-resolvem o que falhar
+import os, zlib, threading, contextvars
+from contextlib import contextmanager
+import numpy as np
+import regex as rx
+
+LAYOUT_REUSE = os.environ.get("LAYOUT_REUSE", "1") == "1"
+LAYOUT_GRID = float(os.environ.get("LAYOUT_GRID", "8"))            # quantização das posições (pt)
+LAYOUT_SIM_MIN = float(os.environ.get("LAYOUT_SIM_MIN", "0.6"))    # similaridade mínima para entrar no cluster
+LAYOUT_TOL = float(os.environ.get("LAYOUT_TOL", "3"))              # folga (pt) ao conferir o rótulo na página
+LAYOUT_MAX_CLUSTERS = int(os.environ.get("LAYOUT_MAX_CLUSTERS", "256"))
+LAYOUT_MIN_FEATURES = 6   # página com menos tokens tipo rótulo não entra (assinatura degenerada)
+LAYOUT_PERMS = 64         # tamanho da assinatura MinHash
+
+_LABEL_LIKE = rx.compile(r"^\P{N}*\p{L}{2,}\P{N}*$")  # letras e nenhum dígito (valores numéricos variam)
+_rng = np.random.default_rng(0x1A70)  # semente fixa: assinaturas comparáveis entre processos
+_MASKS = _rng.integers(0, 2**63, LAYOUT_PERMS, dtype=np.uint64)
+_MULTS = _rng.integers(0, 2**63, LAYOUT_PERMS, dtype=np.uint64) | np.uint64(1)
+
+
+def fingerprint(pw):
+    """
+    Assinatura MinHash (LAYOUT_PERMS x uint64) do conjunto {(texto, x, y quantizados)} dos tokens tipo
+    rótulo da página; None quando há poucos. A fração de posições iguais entre duas assinaturas estima
+    a similaridade de Jaccard dos conjuntos.
+    """
+    feats = {zlib.crc32(f"{t.lower()}|{round(float(x) / LAYOUT_GRID)}|{round(float(y) / LAYOUT_GRID)}".encode("utf-8"))
+             for t, x, y in zip(pw.text, pw.cx, pw.cy) if _LABEL_LIKE.match(t)}
+    if len(feats) < LAYOUT_MIN_FEATURES:
+        return None
+    h = np.fromiter(feats, dtype=np.uint64, count=len(feats))
+    with np.errstate(over="ignore"):
+        return ((h[None, :] ^ _MASKS[:, None]) * _MULTS[:, None]).min(axis=1)
+
+
+def similarity(a, b) -> float:
+    return float(np.mean(a == b)) if a is not None and b is not None else 0.0
+
+
+def geometry_entry(pw, anchor) -> dict:
+    """O que o representante guarda de uma âncora: palavras do rótulo, caixa, ponto e calha."""
+    span = sorted(anchor["label_span"])
+    return {"words": tuple(pw.text[i] for i in span), "label_bbox": tuple(anchor["label_bbox"]),
+            "anchor": tuple(anchor["anchor"]), "gutter": tuple(anchor["gutter"]),
+            "origin": anchor.get("origin", "schema"), "score": anchor.get("score", 10.0)}
+
+
+def seed_anchors(pw, geometry: dict, keys, exclude=frozenset()):
+    """
+    Âncoras das chaves a partir da geometria do cluster, conferidas na página: as palavras com centro
+    na caixa do rótulo (com folga LAYOUT_TOL) têm de ser exatamente as do representante. Devolve
+    (âncoras semeadas, chaves a resolver do zero, quantas falharam na conferência). Chave sem âncora
+    no representante também é resolvida (o membro pode tê-la).
+    """
+    seeded, solve, failed = [], [], 0
+    for key in keys:
+        g = geometry.get(key)
+        if g is None:
+            solve.append(key)
+            continue
+        x0, y0, x1, y1 = g["label_bbox"]
+        idx = np.flatnonzero((pw.cx >= x0 - LAYOUT_TOL) & (pw.cx <= x1 + LAYOUT_TOL) &
+                             (pw.cy >= y0 - LAYOUT_TOL) & (pw.cy <= y1 + LAYOUT_TOL)).tolist()
+        if not idx or tuple(pw.text[i] for i in idx) != g["words"] or exclude.intersection(idx):
+            solve.append(key)
+            failed += 1
+            continue
+        bb = pw.bbox(idx)
+        dx, dy = bb[0] - x0, bb[1] - y0
+        seeded.append({"key": key, "anchor": (g["anchor"][0] + dx, g["anchor"][1] + dy), "label_span": set(idx),
+                       "label_bbox": bb, "gutter": (g["gutter"][0] + dx, g["gutter"][1] + dx),
+                       "origin": g["origin"], "score": g["score"], "layout": True})
+    return seeded, solve, failed
+
+
+class LayoutCache:
+    """
+    Clusters de layout de um job (seguro entre threads). Cada cluster guarda a assinatura do
+    representante e a geometria por chave; chaves que o representante não achou (ou de outro schema)
+    são aprendidas com a primeira página do cluster que as resolve.
+    """
+
+    def __init__(self, sim_min: float = LAYOUT_SIM_MIN, max_clusters: int = LAYOUT_MAX_CLUSTERS):
+        self.sim_min = sim_min
+        self.max_clusters = max_clusters
+        self._sigs, self._geoms = [], []
+        self._lock = threading.Lock()
+        self.stats = {"pages": 0, "clusters": 0, "pages_reused": 0, "keys_seeded": 0, "keys_resolved": 0,
+                      "verify_failed": 0}
+
+    def match(self, sig):
+        """(id do cluster mais parecido com similaridade >= sim_min, ou None; cópia da geometria)."""
+        if sig is None:
+            return None, {}
+        with self._lock:
+            self.stats["pages"] += 1
+            if not self._sigs:
+                return None, {}
+            sims = (np.stack(self._sigs) == sig[None, :]).mean(axis=1)
+            best = int(np.argmax(sims))
+            if sims[best] < self.sim_min:
+                return None, {}
+            self.stats["pages_reused"] += 1
+            return best, dict(self._geoms[best])
+
+    def learn(self, cid, sig, entries: dict, seeded: int = 0, failed: int = 0):
+        """Guarda a geometria das chaves resolvidas (cria o cluster se a página não tinha)."""
+        if sig is None:
+            return
+        with self._lock:
+            self.stats["keys_seeded"] += seeded
+            self.stats["keys_resolved"] += len(entries)
+            self.stats["verify_failed"] += failed
+            if cid is None:
+                if len(self._sigs) >= self.max_clusters:
+                    return
+                self._sigs.append(sig)
+                self._geoms.append({})
+                cid = len(self._sigs) - 1
+                self.stats["clusters"] += 1
+            geom = self._geoms[cid]
+            for k, v in entries.items():
+                if v is not None:
+                    geom.setdefault(k, v)
+
+
+_current_layouts = contextvars.ContextVar("layout_cache", default=None)
+
+def current_layouts():
+    return _current_layouts.get()
+
+@contextmanager
+def use_layouts(cache):
+    """Páginas processadas dentro do bloco (nesta thread/tarefa e nas derivadas) usam/alimentam o cache."""
+    token = _current_layouts.set(cache if LAYOUT_REUSE else None)
+    try:
+        yield cache
+    finally:
+        _current_layouts.reset(token)
@@ -0,0 +1,131 @@
+# llm_batch.py — micro-batching de chamadas LLM entre documentos em paralelo no mesmo job
+import os, time, threading, contextvars
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextlib import contextmanager
+
+LLM_BATCH_WINDOW_MS = float(os.environ.get("LLM_BATCH_WINDOW_MS", "40"))   # espera por mais pedidos
+LLM_BATCH_MAX = int(os.environ.get("LLM_BATCH_MAX", "8"))                  # teto de documentos por prompt
+LLM_BATCH_TARGET_MS = float(os.environ.get("LLM_BATCH_TARGET_MS", "6000"))  # latência alvo por chamada
+LLM_BATCH_INFLIGHT = int(os.environ.get("LLM_BATCH_INFLIGHT", "4"))        # lotes em voo ao mesmo tempo
+
+
+class LLMBatcher:
+    """
+    Junta pedidos do mesmo tipo ("bulk", "json") feitos por documentos diferentes numa janela
+    curta e manda UM prompt multi-documento por lote. `send(kind, requests)` faz a chamada e
+    devolve uma lista alinhada com `requests` (None = documento sem resposta utilizável).
+
+    O tamanho do lote se ajusta pela latência observada: cai pela metade quando a chamada
+    passa do alvo e cresce de 1 em 1 enquanto fica abaixo de 70% dele. O piso é 2: com
+    lote de 1 todo pedido seguiria pelo caminho individual, nenhum lote seria medido de novo
+    e o batching ficaria desligado até o fim do job.
+    """
+
+    def __init__(self, send, window_ms=LLM_BATCH_WINDOW_MS, max_batch=LLM_BATCH_MAX,
+                 target_ms=LLM_BATCH_TARGET_MS, inflight=LLM_BATCH_INFLIGHT):
+        self.send = send
+        self.window = window_ms / 1000.0
+        self.max_cap = max(1, int(max_batch))
+        self.max_batch = self.max_cap
+        self.target_ms = target_ms
+        self.stats = {"requests": 0, "batches": 0, "singles": 0, "max_seen": 0, "timeouts": 0}
+        self._pending = []  # [(kind, request, future, t_submit)]
+        self._cv = threading.Condition()
+        self._closed = False
+        self._pool = ThreadPoolExecutor(max_workers=max(1, inflight), thread_name_prefix="llm-batch")
+        self._thread = threading.Thread(target=self._loop, name="llm-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, kind: str, request: dict, timeout=None):
+        """
+        Bloqueia até o lote do pedido ser respondido (no máximo `timeout` s: o que resta do prazo do
+        documento). Retorna a resposta do documento ou None quando o chamador deve seguir pelo
+        caminho individual (lote de 1, erro, seção ausente, espera esgotada).
+        """
+        fut = Future()
+        with self._cv:
+            if self._closed:
+                return None
+            self._pending.append((kind, request, fut, time.perf_counter()))
+            self.stats["requests"] += 1
+            self._cv.notify_all()
+        try:
+            return fut.result(timeout=timeout)
+        except FutureTimeout:
+            with self._cv:
+                self.stats["timeouts"] += 1
+            return None
+
+    def close(self):
+        with self._cv:
+            self._closed = True
+            self._cv.notify_all()
+        self._thread.join(timeout=5)
+        self._pool.shutdown(wait=True)
+
+    def _take_batch(self):
+        # espera o 1º pedido, depois até a janela dele fechar ou o lote do tipo encher
+        with self._cv:
+            while not self._pending and not self._closed:
+                self._cv.wait()
+            if not self._pending:
+                return None, []
+            kind, _, _, t_first = self._pending[0]
+            while not self._closed:
+                same = sum(1 for p in self._pending if p[0] == kind)
+                left = t_first + self.window - time.perf_counter()
+                if same >= self.max_batch or left <= 0:
+                    break
+                self._cv.wait(timeout=left)
+            batch, rest = [], []
+            for p in self._pending:
+                (batch if p[0] == kind and len(batch) < self.max_batch else rest).append(p)
+            self._pending = rest
+            return kind, batch
+
+    def _loop(self):
+        while True:
+            kind, batch = self._take_batch()
+            if not batch:
+                return
+            if len(batch) == 1:
+                # sozinho na janela: o documento faz a chamada normal (mesmo prompt do modo sem lote)
+                self.stats["singles"] += 1
+                batch[0][2].set_result(None)
+                continue
+            self.stats["batches"] += 1
+            self.stats["max_seen"] = max(self.stats["max_seen"], len(batch))
+            self._pool.submit(self._send, kind, batch)
+
+    def _send(self, kind, batch):
+        t0 = time.perf_counter()
+        try:
+            answers = self.send(kind, [p[1] for p in batch])
+        except Exception:
+            answers = [None] * len(batch)
+        self._adapt(len(batch), (time.perf_counter() - t0) * 1000)
+        for p, ans in zip(batch, list(answers) + [None] * (len(batch) - len(answers))):
+            p[2].set_result(ans)
+
+    def _adapt(self, size: int, ms: float):
+        with self._cv:
+            floor = min(2, self.max_cap)
+            if ms > self.target_ms and self.max_batch > floor:
+                self.max_batch = max(floor, min(self.max_batch, size) // 2)
+            elif ms < 0.7 * self.target_ms and self.max_batch < self.max_cap:
+                self.max_batch += 1
+
+
+_current_batcher = contextvars.ContextVar("llm_batcher", default=None)
+
+def current_batcher():
+    return _current_batcher.get()
+
+@contextmanager
+def use_batcher(batcher):
+    """Pedidos LLM feitos dentro do bloco (nesta thread/tarefa e nas derivadas) passam pelo batcher."""
+    token = _current_batcher.set(batcher)
+    try:
+        yield batcher
+    finally:
+        _current_batcher.reset(token)
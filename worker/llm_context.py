@@ -0,0 +1,93 @@
+# llm_context.py — monta o texto dos prompts a partir das regiões de interesse (ROI) da página
+import math
+import numpy as np
+import regex as rx
+
+# orçamentos (em tokens) do texto OCR enviado a cada estágio LLM
+ROI_TOKEN_BUDGET_BULK = 450
+ROI_TOKEN_BUDGET_JSON = 1800
+
+_encoding = None
+_encoding_loaded = False
+def _get_encoding():
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _encoding = None  # sem tiktoken: estimativa local abaixo
+    return _encoding
+
+_RX_PIECES = rx.compile(r"\p{L}+|\p{N}+|[^\s\p{L}\p{N}]")
+def count_tokens(text: str) -> int:
+    """Conta tokens com o tokenizer local (tiktoken) ou estima por pedaços de palavra."""
+    if not text:
+        return 0
+    enc = _get_encoding()
+    if enc is not None:
+        return len(enc.encode(text))
+    # palavras longas viram vários tokens BPE (~1 token a cada 4 letras)
+    return sum(max(1, math.ceil(len(p) / 4)) for p in _RX_PIECES.findall(text))
+
+def context_window(label_bbox, gutter, ay, y_band):
+    """Janela (wx0, wx1, wy0, wy1) ao redor de um rótulo — a mesma usada por local_llm_context."""
+    x0_lbl, _, x1_lbl, _ = label_bbox
+    gx0, gx1 = gutter
+    gutter_w = max(1.0, gx1 - gx0)
+    wx0 = min(x1_lbl, gx0) - 10.0
+    wx1 = max(x1_lbl + 1.5*gutter_w, gx1 + 30.0)
+    wy0 = ay - 2.0*y_band
+    wy1 = ay + 5.0*y_band
+    return (wx0, wx1, wy0, wy1)
+
+def window_mask(pw, win):
+    wx0, wx1, wy0, wy1 = win
+    return (pw.cx >= wx0) & (pw.cx <= wx1) & (pw.cy >= wy0) & (pw.cy <= wy1)
+
+def _clip_tokens(toks, budget: int):
+    """Palavras do começo que cabem no orçamento -> (texto, custo)."""
+    kept, used = [], 0
+    for t in toks:
+        c = count_tokens(t) + 1
+        if used + c > budget:
+            break
+        kept.append(t); used += c
+    return " ".join(kept), used
+
+def build_roi_context(pw, windows, max_tokens: int, line_tol: float = 6.0, fill_rest: bool = False) -> str:
+    """
+    Junta o texto das janelas (em ordem de prioridade) sem repetir palavras já cobertas,
+    parando quando o orçamento de tokens acaba. As regiões saem na ordem de leitura da página.
+    fill_rest: o orçamento que sobrar vai para o restante da página (palavras fora das janelas,
+    em ordem de leitura, depois das regiões) — para chaves sem janela nenhuma na página.
+    """
+    if not len(pw) or not (windows or fill_rest):
+        return ""
+    covered = np.zeros(len(pw), dtype=bool)
+    regions = []
+    budget = int(max_tokens)
+    for win in windows:
+        m = window_mask(pw, win) & ~covered
+        if not m.any():
+            continue
+        covered |= m
+        toks = [pw.text[i] for i in pw.reading_order(m, line_tol=line_tol) if pw.text[i].strip()]
+        text = " ".join(toks)
+        cost = count_tokens(text)
+        if cost > budget:
+            # corta a região no limite restante (palavra a palavra)
+            text, cost = _clip_tokens(toks, budget)
+        if text:
+            regions.append((win[2], win[0], text))
+            budget -= cost
+        if budget <= 0:
+            break
+    regions.sort()
+    if fill_rest and budget > 0 and not covered.all():
+        rest = [pw.text[i] for i in pw.reading_order(~covered, line_tol=line_tol) if pw.text[i].strip()]
+        text, _ = _clip_tokens(rest, budget)
+        if text:
+            regions.append((0, 0, text))
+    return "\n".join(t for _, _, t in regions)
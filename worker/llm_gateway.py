@@ -0,0 +1,227 @@
+# llm_gateway.py — porta única para o endpoint LLM: concorrência adaptativa (AIMD), retry com jitter,
+# circuit breaker e métricas do processo
+import os, time, random, threading
+from collections import deque
+
+LLM_CONCURRENCY_START = float(os.environ.get("LLM_CONCURRENCY_START", "8"))
+LLM_CONCURRENCY_MIN = float(os.environ.get("LLM_CONCURRENCY_MIN", "1"))
+LLM_CONCURRENCY_MAX = float(os.environ.get("LLM_CONCURRENCY_MAX", "32"))
+LLM_LATENCY_TARGET_MS = float(os.environ.get("LLM_LATENCY_TARGET_MS", "4000"))  # acima disso = congestionado
+LLM_DECREASE_WINDOW_S = float(os.environ.get("LLM_DECREASE_WINDOW_S", "1"))  # no máx. 1 redução por janela
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_S = float(os.environ.get("LLM_RETRY_BASE_S", "0.25"))
+LLM_RETRY_CAP_S = float(os.environ.get("LLM_RETRY_CAP_S", "4"))
+LLM_BREAKER_FAILURES = int(os.environ.get("LLM_BREAKER_FAILURES", "5"))      # falhas seguidas para abrir
+LLM_BREAKER_COOLDOWN_S = float(os.environ.get("LLM_BREAKER_COOLDOWN_S", "30"))
+
+RETRYABLE = ("rate_limit", "timeout", "server", "connection")
+
+
+def classify_error(e) -> str:
+    """rate_limit | timeout | server | connection | fatal (erros do SDK OpenAI ou de clientes compatíveis)."""
+    status = getattr(e, "status_code", None) or getattr(getattr(e, "response", None), "status_code", None)
+    name = type(e).__name__.lower()
+    if status == 429 or "ratelimit" in name:
+        return "rate_limit"
+    if "timeout" in name:
+        return "timeout"
+    if (isinstance(status, int) and status >= 500) or "internalserver" in name:
+        return "server"
+    if "connection" in name:
+        return "connection"
+    return "fatal"
+
+def _retry_after(e):
+    headers = getattr(getattr(e, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMGateway:
+    """
+    Todas as chamadas LLM do processo passam por aqui.
+      - limite de concorrência AIMD: +1/limite por sucesso rápido; metade em 429 ou latência acima
+        do alvo (no máximo uma redução por LLM_DECREASE_WINDOW_S, para não desabar numa rajada)
+      - retry com backoff exponencial "full jitter" para erros transitórios, respeitando o deadline
+      - circuit breaker: N falhas seguidas abrem o circuito por um cooldown; depois uma chamada de
+        prova (half-open) decide se fecha. Aberto = chamadas falham na hora e os documentos seguem
+        só com heurísticas.
+    """
+
+    def __init__(self):
+        self._cv = threading.Condition()
+        self.limit = LLM_CONCURRENCY_START
+        self.inflight = 0
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_inflight = False
+        self._last_decrease = 0.0
+        self._lat = deque(maxlen=200)
+        self.counters = {"requests": 0, "success": 0, "failures": 0, "retries": 0, "rate_limited": 0,
+                         "timeouts": 0, "server_errors": 0, "short_circuited": 0, "breaker_opens": 0}
+
+    # ---------------- circuit breaker ----------------
+    def available(self) -> bool:
+        """O endpoint está utilizável agora? (False = circuito aberto e ainda em cooldown)"""
+        with self._cv:
+            return self.state != "open" or time.monotonic() - self.opened_at >= LLM_BREAKER_COOLDOWN_S
+
+    def _admit(self) -> bool:
+        with self._cv:
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < LLM_BREAKER_COOLDOWN_S:
+                    return False
+                self.state = "half_open"
+            if self.state == "half_open":
+                if self._probe_inflight:
+                    return False
+                self._probe_inflight = True
+            return True
+
+    def _breaker_release(self):
+        # chamada não chegou ao endpoint (sem orçamento/fila): não conta como sucesso nem falha
+        with self._cv:
+            self._probe_inflight = False
+
+    def _breaker_result(self, ok: bool):
+        with self._cv:
+            self._probe_inflight = False
+            if ok:
+                self.consecutive_failures = 0
+                self.state = "closed"
+                return
+            self.consecutive_failures += 1
+            if self.state == "half_open" or self.consecutive_failures >= LLM_BREAKER_FAILURES:
+                if self.state != "open":
+                    self.counters["breaker_opens"] += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    # ---------------- concorrência adaptativa ----------------
+    def _acquire(self, timeout) -> bool:
+        end = None if timeout is None else time.monotonic() + timeout
+        with self._cv:
+            while self.inflight >= int(self.limit):
+                left = None if end is None else end - time.monotonic()
+                if left is not None and left <= 0:
+                    return False
+                self._cv.wait(timeout=left)
+            self.inflight += 1
+            return True
+
+    def _release(self, latency_ms=None, congested=False):
+        with self._cv:
+            self.inflight -= 1
+            now = time.monotonic()
+            if latency_ms is not None:
+                self._lat.append(latency_ms)
+            slow = latency_ms is not None and latency_ms > LLM_LATENCY_TARGET_MS
+            if congested or slow:
+                if now - self._last_decrease > LLM_DECREASE_WINDOW_S:
+                    self.limit = max(LLM_CONCURRENCY_MIN, self.limit / 2)
+                    self._last_decrease = now
+            elif latency_ms is not None:
+                self.limit = min(LLM_CONCURRENCY_MAX, self.limit + 1.0 / max(1.0, self.limit))
+            self._cv.notify_all()
+
+    # ---------------- chamada ----------------
+    def call(self, fn, kwargs: dict, deadline=None, default_timeout: float = 20.0, min_call_s: float = 0.0):
+        """
+        fn(**kwargs, timeout=...) com retry/AIMD/breaker. Retorna (resp, None) ou (None, erro):
+        erro "circuit_open" (curto-circuito) e "deadline" (sem orçamento) não chegam ao endpoint.
+        """
+        if not self._admit():
+            with self._cv:
+                self.counters["short_circuited"] += 1
+            return None, "circuit_open"
+
+        kwargs = dict(kwargs)
+        fixed = kwargs.pop("timeout", None)
+        last_err = None
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            t_call = fixed if fixed is not None else default_timeout
+            if deadline is not None:
+                left = deadline.llm_timeout()
+                if left is None:
+                    deadline.degrade("llm_call", "no_budget")
+                    if last_err is None:
+                        self._breaker_release()
+                        return None, "deadline"
+                    break
+                t_call = min(t_call, left)
+            if not self._acquire(t_call):
+                if deadline is not None:
+                    deadline.degrade("llm_call", "queue_timeout")
+                self._breaker_release()
+                return None, "llm_queue_timeout"
+
+            with self._cv:
+                self.counters["requests"] += 1
+            t0 = time.perf_counter()
+            try:
+                resp = fn(**kwargs, timeout=t_call)
+            except Exception as e:
+                kind = classify_error(e)
+                last_err = f"{type(e).__name__}: {e}"
+                self._release(congested=kind == "rate_limit")
+                with self._cv:
+                    self.counters["failures"] += 1
+                    self.counters["rate_limited"] += kind == "rate_limit"
+                    self.counters["timeouts"] += kind == "timeout"
+                    self.counters["server_errors"] += kind == "server"
+                if kind == "timeout" and deadline is not None:
+                    deadline.degrade("llm_call", "timeout", timeout_s=round(t_call, 2))
+                if kind not in RETRYABLE:
+                    self._breaker_result(True)  # erro do request (4xx), não do endpoint
+                    return None, last_err
+                if attempt == LLM_MAX_RETRIES:
+                    break
+                backoff = random.uniform(0, min(LLM_RETRY_CAP_S, LLM_RETRY_BASE_S * (2 ** attempt)))
+                backoff = max(backoff, _retry_after(e) or 0.0)
+                if deadline is not None and not deadline.allows(backoff + min_call_s):
+                    break
+                with self._cv:
+                    self.counters["retries"] += 1
+                time.sleep(backoff)
+                continue
+
+            self._release(latency_ms=(time.perf_counter() - t0) * 1000)
+            with self._cv:
+                self.counters["success"] += 1
+            self._breaker_result(True)
+            return resp, None
+
+        self._breaker_result(False)
+        return None, last_err
+
+    # ---------------- métricas ----------------
+    def metrics(self) -> dict:
+        with self._cv:
+            lat = sorted(self._lat)
+            p = (lambda q: lat[min(len(lat) - 1, int(q * (len(lat) - 1)))] if lat else 0.0)
+            return {
+                **self.counters,
+                "state": self.state,
+                "concurrency_limit": round(self.limit, 2),
+                "inflight": self.inflight,
+                "consecutive_failures": self.consecutive_failures,
+                "latency_p50_ms": round(p(0.5), 1),
+                "latency_p95_ms": round(p(0.95), 1),
+            }
+
+    def metrics_text(self, prefix: str = "llm_gateway") -> str:
+        """Formato de exposição do Prometheus."""
+        m = self.metrics()
+        states = {"closed": 0, "half_open": 1, "open": 2}
+        lines = [f"# TYPE {prefix}_state gauge", f"{prefix}_state {states[m.pop('state')]}"]
+        for k, v in m.items():
+            kind = "counter" if k in self.counters else "gauge"
+            name = f"{prefix}_{k}_total" if kind == "counter" else f"{prefix}_{k}"
+            lines += [f"# TYPE {name} {kind}", f"{name} {v}"]
+        return "\n".join(lines) + "\n"
+
+
+GATEWAY = LLMGateway()
@@ -0,0 +1,117 @@
+# llm_usage.py — contabilidade de uso/custo de LLM por documento
+import os, threading, contextvars
+from contextlib import contextmanager
+
+# preços por 1M de tokens (USD) do LLM_MODEL; sobrescreva via env se o modelo mudar
+PRICE_INPUT_PER_1M = float(os.environ.get("LLM_PRICE_INPUT_PER_1M", "0.25"))
+PRICE_CACHED_INPUT_PER_1M = float(os.environ.get("LLM_PRICE_CACHED_INPUT_PER_1M", "0.025"))
+PRICE_OUTPUT_PER_1M = float(os.environ.get("LLM_PRICE_OUTPUT_PER_1M", "2.00"))
+
+# desfechos resolvidos sem chegar ao modelo (não contam como chamada)
+NON_CALL_OUTCOMES = ("fast_path", "circuit_open", "deadline", "cancelled")
+
+
+class LLMUsage:
+    """Registro das chamadas LLM de UM documento (seguro entre threads)."""
+
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def record(self, stage, outcome="ok", input_tokens=0, output_tokens=0, cached_tokens=0,
+               latency_ms=0, key=None, batch=None):
+        call = {
+            "stage": stage,
+            "outcome": outcome,
+            "input_tokens": int(input_tokens or 0),
+            "output_tokens": int(output_tokens or 0),
+            "cached_tokens": int(cached_tokens or 0),
+            "cache_hit": bool(cached_tokens),
+            "latency_ms": int(latency_ms or 0),
+        }
+        if key is not None:
+            call["key"] = key
+        if batch:
+            call["batch"] = int(batch)  # chamada compartilhada por `batch` documentos (tokens rateados)
+        with self._lock:
+            self.calls.append(call)
+
+    def summary(self) -> dict:
+        with self._lock:
+            calls = list(self.calls)
+        out = {"calls": 0, "input_tokens": 0, "output_tokens": 0, "cached_tokens": 0,
+               "latency_ms": 0, "cost_usd": 0.0, "by_stage": {}, "by_outcome": {}, "detail": calls}
+        for c in calls:
+            out["by_outcome"][c["outcome"]] = out["by_outcome"].get(c["outcome"], 0) + 1
+            st = out["by_stage"].setdefault(c["stage"], {"calls": 0, "input_tokens": 0, "output_tokens": 0,
+                                                         "cached_tokens": 0, "latency_ms": 0})
+            for agg in (out, st):
+                agg["input_tokens"] += c["input_tokens"]
+                agg["output_tokens"] += c["output_tokens"]
+                agg["cached_tokens"] += c["cached_tokens"]
+                agg["latency_ms"] += c["latency_ms"]
+                if c["outcome"] not in NON_CALL_OUTCOMES:
+                    agg["calls"] += 1
+        out["cost_usd"] = round(estimate_cost(out["input_tokens"], out["output_tokens"], out["cached_tokens"]), 6)
+        # fração da entrada servida pelo cache de prefixo do provedor (prompts em worker/prompts.py)
+        out["cached_ratio"] = round(out["cached_tokens"] / out["input_tokens"], 3) if out["input_tokens"] else 0.0
+        return out
+
+
+def estimate_cost(input_tokens: int, output_tokens: int, cached_tokens: int = 0) -> float:
+    fresh = max(0, input_tokens - cached_tokens)
+    return (fresh * PRICE_INPUT_PER_1M + cached_tokens * PRICE_CACHED_INPUT_PER_1M
+            + output_tokens * PRICE_OUTPUT_PER_1M) / 1_000_000
+
+
+def usage_from_response(resp):
+    """(input_tokens, output_tokens, cached_tokens) de uma resposta da Responses API."""
+    u = getattr(resp, "usage", None)
+    if u is None:
+        return 0, 0, 0
+    details = getattr(u, "input_tokens_details", None)
+    cached = getattr(details, "cached_tokens", 0) if details is not None else 0
+    return (getattr(u, "input_tokens", 0) or 0, getattr(u, "output_tokens", 0) or 0, cached or 0)
+
+
+_current_usage = contextvars.ContextVar("llm_usage", default=None)
+
+def current_usage():
+    """LLMUsage do documento em processamento nesta thread/tarefa (ou None)."""
+    return _current_usage.get()
+
+@contextmanager
+def track_usage(usage=None):
+    usage = usage if usage is not None else LLMUsage()
+    token = _current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _current_usage.reset(token)
+
+
+# colunas de job_items/jobs que recebem o resumo de uso
+USAGE_COLUMNS = ("llm_calls", "llm_input_tokens", "llm_output_tokens", "llm_cached_tokens",
+                 "llm_latency_ms", "llm_cost_usd")
+
+def usage_columns(summary: dict) -> dict:
+    """Campos do update de job_items a partir de LLMUsage.summary()."""
+    summary = summary or {}
+    return {
+        "llm_usage": summary,
+        "llm_calls": summary.get("calls", 0),
+        "llm_input_tokens": summary.get("input_tokens", 0),
+        "llm_output_tokens": summary.get("output_tokens", 0),
+        "llm_cached_tokens": summary.get("cached_tokens", 0),
+        "llm_latency_ms": summary.get("latency_ms", 0),
+        "llm_cost_usd": summary.get("cost_usd", 0.0),
+    }
+
+def rollup_usage(rows) -> dict:
+    """Soma as colunas de uso de vários job_items (para o update de jobs)."""
+    out = {c: 0 for c in USAGE_COLUMNS}
+    for r in rows or []:
+        for c in USAGE_COLUMNS:
+            out[c] += float(r.get(c) or 0) if c == "llm_cost_usd" else int(r.get(c) or 0)
+    out["llm_cost_usd"] = round(out["llm_cost_usd"], 6)
+    return out
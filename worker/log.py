@@ -0,0 +1,107 @@
+# log.py — logging estruturado (níveis, correlação job/item, amostragem) com escrita fora da thread de extração
+import os, sys, json, time, random, atexit, logging, contextvars, queue
+import logging.handlers
+from contextlib import contextmanager
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "kv")                  # kv | json
+LOG_FIELD_SAMPLE = float(os.environ.get("LOG_FIELD_SAMPLE", "0.1"))  # fração dos eventos por campo
+
+_ctx = contextvars.ContextVar("log_ctx", default={})
+
+@contextmanager
+def log_context(**ids):
+    """Anexa ids de correlação (job_id, item_id...) a todo log emitido dentro do bloco."""
+    token = _ctx.set({**_ctx.get(), **{k: v for k, v in ids.items() if v is not None}})
+    try:
+        yield
+    finally:
+        _ctx.reset(token)
+
+def current_log_context() -> dict:
+    return dict(_ctx.get())
+
+
+class _ContextFilter(logging.Filter):
+    def filter(self, record):
+        record.ctx = _ctx.get()
+        if not hasattr(record, "fields"):
+            record.fields = {}
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    # não formata na thread de quem loga: só enfileira (formatação/escrita ficam no listener)
+    def prepare(self, record):
+        return record
+
+
+def _kv(v) -> str:
+    s = str(v)
+    return json.dumps(s, ensure_ascii=False) if (not s or any(c in s for c in ' ="\n')) else s
+
+
+class StructuredFormatter(logging.Formatter):
+    def __init__(self, fmt_kind: str = "kv"):
+        super().__init__()
+        self.kind = fmt_kind
+
+    def format(self, record):
+        base = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        data = {**base, **getattr(record, "ctx", {}), **getattr(record, "fields", {})}
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        if self.kind == "json":
+            return json.dumps(data, ensure_ascii=False, default=str)
+        return " ".join(f"{k}={_kv(v)}" for k, v in data.items())
+
+
+_listener = None
+def _setup():
+    global _listener
+    if _listener is not None:
+        return
+    root = logging.getLogger("worker")
+    # módulo importado como `log` e como `worker.log`: um único listener/handler por processo
+    if getattr(root, "_structured_listener", None) is not None:
+        _listener = root._structured_listener
+        return
+    q = queue.SimpleQueue()
+    out = logging.StreamHandler(sys.stdout)
+    out.setFormatter(StructuredFormatter(LOG_FORMAT))
+    _listener = logging.handlers.QueueListener(q, out, respect_handler_level=False)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    root.setLevel(LOG_LEVEL)
+    root.propagate = False
+    h = _QueueHandler(q)
+    h.addFilter(_ContextFilter())
+    root.addHandler(h)
+    root._structured_listener = _listener
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger sob o namespace 'worker' (um único listener em background escreve no stdout)."""
+    _setup()
+    return logging.getLogger(name if name.startswith("worker") else f"worker.{name}")
+
+def log_event(logger, level, event, **fields):
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={"fields": fields})
+
+def log_field_event(logger, event, level=logging.INFO, **fields):
+    """Eventos por campo (fast-path, skip, valor LLM): amostrados por LOG_FIELD_SAMPLE."""
+    if logger.isEnabledFor(level) and (LOG_FIELD_SAMPLE >= 1.0 or random.random() < LOG_FIELD_SAMPLE):
+        logger.log(level, event, extra={"fields": fields})
+
+def flush_logs():
+    """Drena a fila (útil em CLIs/benchmarks antes de sair ou medir)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener.start()
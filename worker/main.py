@@ -1,7 +1,7 @@
-import os, json, time, asyncio
-from typing import Dict, Any, List
+import os, json, time, asyncio, logging
+from typing import Dict, Any, List, Optional
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel
 from supabase import create_client, Client
 
@@ -15,32 +15,52 @@ WORKER_SECRET = os.environ["WORKER_SECRET"]
 # LLM (opcional)
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY", "")
 OPENAI_MODEL = os.environ.get("OPENAI_MODEL", "gpt-5-mini")
+# junta chamadas LLM de documentos em paralelo do mesmo job num prompt multi-documento
+LLM_BATCH = os.environ.get("LLM_BATCH", "1") == "1"
+PREFLIGHT_CONCURRENCY = int(os.environ.get("PREFLIGHT_CONCURRENCY", "4"))  # downloads+preflight simultâneos
 
 # -------- supabase client --------
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
 
 # -------- seu pipeline (copie seu arquivo para a pasta) --------
-from anchors_reading_span import process_pdf_to_json
+from worker.anchors_reading_span import process_pdf_with_meta, llm_batch_send
+from worker.llm_batch import LLMBatcher, use_batcher
+from worker.layout import LayoutCache, use_layouts
+from worker.llm_usage import usage_columns, rollup_usage
+from worker.deadline import Deadline
+from worker.llm_gateway import GATEWAY
+from worker.pdf_source import spooled_download, keep_download
+from worker.preflight import preflight_pdf, est_cost, est_weight, PREFLIGHT_COLUMNS
+from worker.profiling import profile_call, profile_mode, artifact_paths
+from worker.profiles import get_profile
+from worker.scheduler import AsyncScheduler
+from worker.log import get_logger, log_context, log_event
+
+log = get_logger("worker.main")
+
+# itens de todos os jobs do processo: round-robin entre jobs, menor custo primeiro no job
+SCHEDULER = AsyncScheduler()
+_preflight_sem = None
 
 app = FastAPI()
 
 class JobPayload(BaseModel):
     job_id: str
+    extraction_profile: Optional[str] = None  # fast | balanced | accurate (vence jobs/job_items)
 
 @app.get("/healthz")
 def health():
     return {"ok": True}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    # gateway LLM (limite de concorrência, retries, 429/5xx, circuit breaker) e fila de itens, para o Prometheus
+    return GATEWAY.metrics_text() + SCHEDULER.metrics_text()
+
 def _now_iso():
     import datetime as dt
     return dt.datetime.utcnow().isoformat() + "Z"
 
-async def _download_pdf(file_path: str) -> bytes:
-    res = supabase.storage.from_(BUCKET_DOCS).download(file_path)
-    if res is None:
-        raise RuntimeError(f"Failed to download: {file_path}")
-    return res
-
 async def _upload_json(path: str, obj: Any):
     data = json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
     supabase.storage.from_(BUCKET_RESULTS).upload(path, data, {
@@ -48,28 +68,75 @@ async def _upload_json(path: str, obj: Any):
         "upsert": "true",
     })
 
-async def _process_item(it: Dict[str, Any]) -> Dict[str, Any]:
+async def _preflight_item(it: Dict[str, Any]) -> Dict[str, Any]:
+    """Preenche as colunas de preflight do item (se ainda não tiver) e devolve a linha atualizada."""
+    global _preflight_sem
+    if it.get("pages") is not None:
+        return it
+    if _preflight_sem is None:
+        _preflight_sem = asyncio.Semaphore(PREFLIGHT_CONCURRENCY)
+    kept = None
+    async with _preflight_sem:
+        try:
+            # o PDF baixado fica guardado no item ("_pdf") e o processamento o reaproveita
+            kept = await asyncio.to_thread(keep_download, supabase, BUCKET_DOCS, it["file_path"])
+            pf = await asyncio.to_thread(preflight_pdf, kept.src, it.get("schema") or {},
+                                         it.get("extraction_profile"))
+        except Exception as e:  # o item ainda roda (no fim da fila); o erro real aparece no processamento
+            log_event(log, logging.WARNING, "item.preflight_failed", err=f"{type(e).__name__}: {e}")
+            return {**it, "_pdf": kept.hold() if kept is not None else None}
+    kept = kept.hold()
+    try:
+        supabase.table("job_items").update({k: pf[k] for k in PREFLIGHT_COLUMNS}).eq("id", it["id"]).execute()
+    except Exception as e:  # as colunas são só informativas; a fila usa o preflight em memória
+        log_event(log, logging.WARNING, "item.preflight_save_failed", err=f"{type(e).__name__}: {e}")
+    log_event(log, logging.INFO, "item.preflight", **pf)
+    return {**it, **pf, "_pdf": kept}
+
+async def _process_item(it: Dict[str, Any], profile=None) -> Dict[str, Any]:
     t0 = time.perf_counter()
-    supabase.table("job_items").update({"status": "running", "error_message": None}).eq("id", it["id"]).execute()
+    prof = get_profile(it.get("extraction_profile"))
+    deadline = Deadline(prof.deadline_s)  # prazo do perfil a partir do início do item (download incluso, se houver)
+    supabase.table("job_items").update({"status": "running", "error_message": None,
+                                        "extraction_profile": prof.name}).eq("id", it["id"]).execute()
 
-    pdf_bytes = await _download_pdf(it["file_path"])
     schema = it.get("schema") or {}
-    result_obj = process_pdf_to_json(pdf_bytes, schema)
+    # PDF guardado no preflight ou download em streaming (PDF grande vai para arquivo temporário)
+    # + pipeline em thread (CPU + I/O bloqueante; herda contexto de log e o batcher do job)
+    def run():
+        with it.get("_pdf") or spooled_download(supabase, BUCKET_DOCS, it["file_path"]) as src:
+            # profile: flamegraph (speedscope) + alocações só deste documento, sob demanda
+            return profile_call(profile, process_pdf_with_meta, src, schema, deadline=deadline,
+                                profile=prof, name=it.get("file_name") or it["id"])
+    (result_obj, meta), prof_art = await asyncio.to_thread(run)
 
     result_path = f"{it['job_id']}/{it['id']}.json"
     await _upload_json(result_path, result_obj)
+    profile_cols = {}
+    if prof_art:
+        paths = artifact_paths(result_path)
+        for kind, path in paths.items():
+            if prof_art[kind] is not None:
+                await _upload_json(path, prof_art[kind])
+        profile_cols["profile_path"] = paths["speedscope"]
+        log_event(log, logging.INFO, "item.profile", **{k: v for k, v in prof_art["summary"].items() if k != "top_functions"})
 
     dur_ms = int((time.perf_counter() - t0) * 1000)
+    usage = usage_columns(meta.get("llm"))
     supabase.table("job_items").update({
         "status": "done",
         "duration_ms": dur_ms,
-        "result_path": result_path
+        "result_path": result_path,
+        "degraded": (meta.get("deadline") or {}).get("degraded") or None,
+        **usage,
+        **profile_cols,
     }).eq("id", it["id"]).execute()
 
-    return {"id": it["id"], "ms": dur_ms}
+    return {"id": it["id"], "ms": dur_ms, "usage": usage}
 
-async def _run_job(job_id: str, concurrency: int = 3) -> Dict[str, Any]:
+async def _run_job(job_id: str, profile=None, extraction_profile=None) -> Dict[str, Any]:
     supabase.table("jobs").update({"status": "running", "updated_at": _now_iso()}).eq("id", job_id).execute()
+    job = supabase.table("jobs").select("*").eq("id", job_id).single().execute().data or {}
 
     r = supabase.table("job_items").select("*").eq("job_id", job_id).order("created_at", desc=False).execute()
     items: List[Dict[str, Any]] = r.data or []
@@ -78,40 +145,79 @@ async def _run_job(job_id: str, concurrency: int = 3) -> Dict[str, Any]:
         return {"ok": True, "processed": 0}
 
     done = err = 0
-    sem = asyncio.Semaphore(concurrency)
     results = []
 
     async def worker(it):
         nonlocal done, err
-        async with sem:
-            try:
-                out = await _process_item(it)
-                done += 1
-                supabase.table("jobs").update({
-                    "done_count": done, "error_count": err, "updated_at": _now_iso()
-                }).eq("id", job_id).execute()
-                results.append(out)
-            except Exception as e:
-                err += 1
-                supabase.table("job_items").update({
-                    "status": "error", "error_message": str(e)
-                }).eq("id", it["id"]).execute()
-                supabase.table("jobs").update({
-                    "error_count": err, "updated_at": _now_iso()
-                }).eq("id", job_id).execute()
-
-    await asyncio.gather(*(worker(it) for it in items))
+        try:
+            with log_context(job_id=job_id, item_id=it["id"]):
+                out = await _process_item(it, profile)
+                log_event(log, logging.INFO, "item.done", ms=out["ms"], llm_calls=out["usage"]["llm_calls"])
+            done += 1
+            results.append(out)
+            supabase.table("jobs").update({
+                "done_count": done, "error_count": err, "updated_at": _now_iso(),
+                **rollup_usage([r["usage"] for r in results]),
+            }).eq("id", job_id).execute()
+        except Exception as e:
+            err += 1
+            with log_context(job_id=job_id, item_id=it["id"]):
+                log.exception("item.error")
+            supabase.table("job_items").update({
+                "status": "error", "error_message": str(e)
+            }).eq("id", it["id"]).execute()
+            supabase.table("jobs").update({
+                "error_count": err, "updated_at": _now_iso()
+            }).eq("id", job_id).execute()
+        finally:
+            if it.get("_pdf") is not None:
+                it["_pdf"].release()
+
+    async def intake(it):
+        # cada item entra na fila assim que o preflight termina (não espera o job inteiro);
+        # perfil de extração: requisição > item > job > EXTRACTION_PROFILE
+        it = {**it, "extraction_profile": (extraction_profile or it.get("extraction_profile")
+                                           or job.get("extraction_profile"))}
+        with log_context(job_id=job_id, item_id=it["id"]):
+            it = await _preflight_item(it)
+        try:
+            return await SCHEDULER.submit(job_id, est_cost(it), it, worker, weight=est_weight(it))
+        except BaseException:
+            if it.get("_pdf") is not None:
+                it["_pdf"].release()
+            raise
+
+    batcher = LLMBatcher(llm_batch_send) if LLM_BATCH and len(items) > 1 else None
+    # clusters de layout do job: o primeiro documento de cada layout resolve as âncoras, os demais reaproveitam
+    layouts = LayoutCache()
+    try:
+        with use_batcher(batcher), use_layouts(layouts):
+            futures = await asyncio.gather(*(intake(it) for it in items))
+            await asyncio.gather(*futures)
+    finally:
+        if batcher is not None:
+            batcher.close()
+            log_event(log, logging.INFO, "llm.batcher", job_id=job_id, **batcher.stats)
+        log_event(log, logging.INFO, "layout.cache", job_id=job_id, **layouts.stats)
 
     supabase.table("jobs").update({
         "status": "error" if err else "done",
         "updated_at": _now_iso()
     }).eq("id", job_id).execute()
 
-    return {"ok": True, "processed": len(items), "done": done, "error": err, "items": results}
+    items_out = [{k: v for k, v in r.items() if k != "usage"} for r in results]
+    return {"ok": True, "processed": len(items), "done": done, "error": err, "items": items_out,
+            "llm": rollup_usage([r["usage"] for r in results])}
 
 @app.post("/process-job")
 async def process_job(req: Request, payload: JobPayload):
     if req.headers.get("x-worker-secret") != WORKER_SECRET:
         raise HTTPException(status_code=401, detail="unauthorized")
-    result = await _run_job(payload.job_id, concurrency=3)
+    if payload.extraction_profile:
+        try:
+            get_profile(payload.extraction_profile)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    # x-profile: cpu (só amostragem) ou 1/all (+ tracemalloc); artefatos ao lado do resultado
+    result = await _run_job(payload.job_id, profile_mode(req.headers.get("x-profile")), payload.extraction_profile)
     return JSONResponse(result)
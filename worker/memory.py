@@ -0,0 +1,96 @@
+# memory.py — teto de memória por item, medição de RSS e acumuladores de texto limitados
+import os, gc, resource
+from collections import deque
+import fitz  # PyMuPDF
+
+ITEM_MEM_LIMIT_MB = float(os.environ.get("ITEM_MEM_LIMIT_MB", "300"))  # crescimento de RSS permitido por item
+_PAGE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss_mb() -> float:
+    """RSS atual do processo (Linux: /proc/self/statm; senão o pico do getrusage)."""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE / (1024 * 1024)
+    except OSError:
+        return peak_rss_mb()
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Linux: KB
+
+def release_caches():
+    """Esvazia o cache de recursos do MuPDF (fontes/imagens decodificadas) e roda o GC."""
+    fitz.TOOLS.store_shrink(100)
+    gc.collect()
+
+
+class MemoryGuard:
+    """
+    Acompanha o crescimento de RSS desde o início do item. Acima de metade do teto esvazia os
+    caches; se continuar acima do teto, check() devolve False e a pipeline para de ler páginas.
+    Com itens em paralelo o RSS é do processo todo, então o teto é aproximado (conservador).
+    """
+
+    def __init__(self, limit_mb: float = ITEM_MEM_LIMIT_MB):
+        self.limit_mb = limit_mb
+        self.base = rss_mb()
+        self.peak_delta = 0.0
+        self.stopped_at_page = None
+
+    def check(self, pno=None) -> bool:
+        if not self.limit_mb:
+            return True
+        delta = rss_mb() - self.base
+        if delta > self.limit_mb / 2:
+            release_caches()
+            delta = rss_mb() - self.base
+        self.peak_delta = max(self.peak_delta, delta)
+        if delta > self.limit_mb:
+            self.stopped_at_page = pno
+            return False
+        return True
+
+    def summary(self) -> dict:
+        out = {"limit_mb": self.limit_mb, "peak_delta_mb": round(self.peak_delta, 1)}
+        if self.stopped_at_page is not None:
+            out["stopped_at_page"] = self.stopped_at_page
+        return out
+
+
+class RollingText:
+    """Começo fixo + janela final rolante, com teto de caracteres (texto de documentos longos)."""
+
+    def __init__(self, head_chars: int = 3500, tail_chars: int = 3500):
+        self.head_chars, self.tail_chars = head_chars, tail_chars
+        self.head = []
+        self.head_len = 0
+        self.tail = deque()
+        self.tail_len = 0
+        self.dropped = 0
+
+    def add(self, text: str):
+        if not text:
+            return
+        if self.head_len < self.head_chars:
+            take = text[:self.head_chars - self.head_len]
+            self.head.append(take)
+            self.head_len += len(take)
+            text = text[len(take):]
+            if not text:
+                return
+        self.tail.append(text)
+        self.tail_len += len(text)
+        while self.tail_len > self.tail_chars and len(self.tail) > 1:
+            self.tail_len -= len(self.tail.popleft())
+            self.dropped += 1
+        if self.tail_len > self.tail_chars:
+            self.tail[0] = self.tail[0][self.tail_len - self.tail_chars:]
+            self.tail_len = self.tail_chars
+            self.dropped += 1
+
+    def text(self, sep: str = "\n\n") -> str:
+        parts = list(self.head)
+        if self.dropped:
+            parts.append("...")
+        parts += list(self.tail)
+        return sep.join(p for p in parts if p)
@@ -0,0 +1,152 @@
+# normalize.py — normalização determinística de valores por tipo de campo (data dd/mm/aaaa, telefone com
+# DDD, CPF/CNPJ/CEP pontuados, UF, e-mail, moeda, nomes): o que o prompt bulk fazia, em CPU; campo
+# normalizado não vai ao bulk LLM (nem é sobrescrito por ele)
+import os
+import regex as rx
+
+from worker.field_types import infer_field_type, find_typed, _norm, _digits, UFS
+
+NORMALIZE_VALUES = os.environ.get("NORMALIZE_VALUES", "1") == "1"
+NORMALIZE_NAME_CASE = os.environ.get("NORMALIZE_NAME_CASE", "keep").lower()  # keep|upper|title
+NAME_MAX_WORDS = 8  # span maior que isso não parece nome (provavelmente pegou a linha vizinha)
+
+_NAME_KEY_HINTS = ("nome", "name")
+_NAME_DESC_HINTS = ("nome",)
+_LOWER_WORDS = {"da", "de", "do", "das", "dos", "e"}
+_MONTHS = {"jan": 1, "fev": 2, "mar": 3, "abr": 4, "mai": 5, "jun": 6, "jul": 7, "ago": 8, "set": 9,
+           "out": 10, "nov": 11, "dez": 12}
+_STATES = {
+    "acre": "AC", "alagoas": "AL", "amapa": "AP", "amazonas": "AM", "bahia": "BA", "ceara": "CE",
+    "distrito federal": "DF", "espirito santo": "ES", "goias": "GO", "maranhao": "MA", "mato grosso": "MT",
+    "mato grosso do sul": "MS", "minas gerais": "MG", "para": "PA", "paraiba": "PB", "parana": "PR",
+    "pernambuco": "PE", "piaui": "PI", "rio de janeiro": "RJ", "rio grande do norte": "RN",
+    "rio grande do sul": "RS", "rondonia": "RO", "roraima": "RR", "santa catarina": "SC", "sao paulo": "SP",
+    "sergipe": "SE", "tocantins": "TO",
+}
+_LABEL_PREFIX = rx.compile(r"^\s*[\p{L}º°ª.\-/ ]{1,30}:\s*")
+_EDGES = " \t.,;:-–—"
+
+
+def value_type(key: str, description=None):
+    """Tipo de normalização da chave: o de field_types ou "nome" (pelo nome da chave ou pela descrição)."""
+    t = infer_field_type(key, description)
+    if t:
+        return t
+    if set(_norm(key).split()).intersection(_NAME_KEY_HINTS):
+        return "nome"
+    desc = " " + _norm(description) + " " if isinstance(description, str) else ""
+    return "nome" if any(f" {h} " in desc for h in _NAME_DESC_HINTS) else None
+
+def value_types(schema: dict) -> dict:
+    """{chave: tipo} das chaves que o normalizador sabe tratar."""
+    out = {}
+    for k, desc in (schema or {}).items():
+        t = value_type(k, desc)
+        if t and t in _NORMALIZERS:
+            out[k] = t
+    return out
+
+
+def strip_label(raw: str) -> str:
+    """Tira rótulos residuais do começo ("CPF:", "Nº.:", "Resp.:") e pontuação das bordas."""
+    s = str(raw or "").strip()
+    for _ in range(2):
+        m = _LABEL_PREFIX.match(s)
+        if not m or m.end() >= len(s):
+            break
+        s = s[m.end():]
+    return s.strip(_EDGES)
+
+def _fmt(digits: str, tpl: str) -> str:
+    it = iter(digits)
+    return "".join(next(it) if ch == "9" else ch for ch in tpl)
+
+def _cpf(s):
+    v = find_typed("cpf", s)
+    return _fmt(_digits(v), "999.999.999-99") if v else None
+
+def _cnpj(s):
+    v = find_typed("cnpj", s)
+    return _fmt(_digits(v), "99.999.999/9999-99") if v else None
+
+def _cep(s):
+    v = find_typed("cep", s) or (s if rx.fullmatch(r"\d{8}", s) else None)
+    return _fmt(_digits(v), "99999-999") if v else None
+
+def _phone(s):
+    v = find_typed("telefone", s)
+    if not v:
+        return None
+    d = _digits(v)
+    if d.startswith("55") and len(d) in (12, 13):
+        d = d[2:]
+    return f"({d[:2]}) {d[2:-4]}-{d[-4:]}"
+
+def _date(s):
+    v = find_typed("data", s)
+    if v:
+        d, m, y = rx.split(r"[/.-]", v)
+        return f"{int(d):02d}/{int(m):02d}/{y}"
+    # "12 de março de 2023", "12 mar 2023"
+    m = rx.search(r"(?<!\d)([0-3]?\d)\s*(?:de\s+)?(\p{L}{3,})\.?\s*(?:de\s+)?((?:19|20)\d{2})(?!\d)", s, rx.I)
+    month = _MONTHS.get(_norm(m.group(2))[:3]) if m else None
+    if not month:
+        return None
+    v = f"{int(m.group(1)):02d}/{month:02d}/{m.group(3)}"
+    return v if find_typed("data", v) else None
+
+def _email(s):
+    v = find_typed("email", s)
+    return v.lower() if v else None
+
+def _money(s):
+    v = find_typed("moeda", s)
+    if not v:
+        return None
+    num = rx.sub(r"^R\$\s*", "", v)
+    return f"-R$ {num[1:]}" if num.startswith("-") else f"R$ {num}"
+
+def _uf(s):
+    if s.upper() in UFS:
+        return s.upper()
+    if _norm(s) in _STATES:
+        return _STATES[_norm(s)]
+    found = set(rx.findall(r"\b(?:" + "|".join(UFS) + r")\b", s))
+    return found.pop() if len(found) == 1 else None  # "Curitiba - PR": só se houver uma sigla
+
+def _name(s):
+    s = rx.sub(r"\s+", " ", s)
+    words = s.split()
+    if not words or len(words) > NAME_MAX_WORDS or not rx.fullmatch(r"[\p{L}'’.\- ]+", s):
+        return None
+    if NORMALIZE_NAME_CASE == "upper":
+        return s.upper()
+    if NORMALIZE_NAME_CASE == "title":
+        return " ".join(w.lower() if (i and w.lower() in _LOWER_WORDS) else w[:1].upper() + w[1:].lower()
+                        for i, w in enumerate(words))
+    return s
+
+_NORMALIZERS = {"cpf": _cpf, "cnpj": _cnpj, "cep": _cep, "telefone": _phone, "data": _date, "email": _email,
+                "moeda": _money, "uf": _uf, "nome": _name}
+
+
+def normalize_value(ftype: str, raw):
+    """Valor canônico do tipo, ou None quando o bruto não se encaixa (o campo segue para o LLM)."""
+    fn = _NORMALIZERS.get(ftype)
+    if fn is None or raw is None:
+        return None
+    s = strip_label(raw)
+    if not s or s.lower() == "null":
+        return None
+    return fn(s)
+
+def normalize_values(types: dict, values: dict) -> dict:
+    """{chave: valor canônico} das chaves com tipo cujo valor foi normalizado."""
+    if not NORMALIZE_VALUES:
+        return {}
+    out = {}
+    for k, t in types.items():
+        v = normalize_value(t, values.get(k))
+        if v is not None:
+            out[k] = v
+    return out
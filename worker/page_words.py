@@ -0,0 +1,103 @@
+# page_words.py — representação struct-of-arrays das palavras de uma página
+import sys
+import numpy as np
+
+TEXT_FONT_BOLD = 16  # bit de negrito nos flags de span do PyMuPDF
+
+
+class PageWords:
+    """
+    Palavras de UMA página em colunas contíguas (float32), montadas uma única vez
+    e repassadas a todos os estágios sem cópia. O índice i de cada array é o mesmo
+    índice usado em label_span/tokens/seed pelo resto da pipeline.
+    """
+    __slots__ = ("x0", "y0", "x1", "y1", "cx", "cy", "h", "text", "bold", "_cache")
+
+    def __init__(self, x0, y0, x1, y1, text, bold=None):
+        self.x0 = np.ascontiguousarray(x0, dtype=np.float32)
+        self.y0 = np.ascontiguousarray(y0, dtype=np.float32)
+        self.x1 = np.ascontiguousarray(x1, dtype=np.float32)
+        self.y1 = np.ascontiguousarray(y1, dtype=np.float32)
+        self.cx = (self.x0 + self.x1) * np.float32(0.5)
+        self.cy = (self.y0 + self.y1) * np.float32(0.5)
+        self.h = self.y1 - self.y0
+        self.text = tuple(sys.intern(str(t)) for t in text)
+        n = len(self.text)
+        self.bold = np.zeros(n, dtype=bool) if bold is None else np.ascontiguousarray(bold, dtype=bool)
+        self._cache = {}
+
+    def __len__(self):
+        return len(self.text)
+
+    @classmethod
+    def from_words(cls, words, bold=None):
+        """words no formato de page.get_text("words"): (x0, y0, x1, y1, texto, ...)."""
+        if not words:
+            return cls([], [], [], [], [], bold)
+        cols = list(zip(*((w[0], w[1], w[2], w[3], w[4]) for w in words)))
+        return cls(cols[0], cols[1], cols[2], cols[3], cols[4], bold)
+
+    @classmethod
+    def from_page(cls, page, textpage=None):
+        """
+        Extrai palavras (caixas exatas de get_text("words")) e marca negrito pelo span
+        que contém o centro de cada palavra. Usa um único TextPage para as duas leituras.
+        """
+        tp = textpage or page.get_textpage()
+        words = page.get_text("words", textpage=tp)
+        pw = cls.from_words(words)
+        if len(pw):
+            spans = []
+            D = page.get_text("dict", textpage=tp)
+            for block in D.get("blocks", []):
+                for line in block.get("lines", []):
+                    for span in line.get("spans", []):
+                        bold = bool(span.get("flags", 0) & TEXT_FONT_BOLD) or "Bold" in (span.get("font", "") or "")
+                        if bold:
+                            spans.append(span["bbox"])
+            if spans:
+                S = np.asarray(spans, dtype=np.float32)
+                inside = ((pw.cx[:, None] >= S[None, :, 0]) & (pw.cx[:, None] <= S[None, :, 2]) &
+                          (pw.cy[:, None] >= S[None, :, 1]) & (pw.cy[:, None] <= S[None, :, 3]))
+                pw.bold = inside.any(axis=1)
+        return pw
+
+    def bbox(self, idxs):
+        """Caixa envolvente (x0, y0, x1, y1) das palavras em idxs."""
+        idx = np.asarray(idxs, dtype=np.intp)
+        return (float(self.x0[idx].min()), float(self.y0[idx].min()),
+                float(self.x1[idx].max()), float(self.y1[idx].max()))
+
+    def reading_order(self, mask=None, line_tol=None):
+        """
+        Índices ordenados por (y centro, x centro), opcionalmente filtrados por máscara.
+        Com line_tol, palavras cujo centro está a até line_tol do início da linha são
+        tratadas como a mesma linha e ordenadas só por x.
+        """
+        order = np.lexsort((self.cx, self.cy))
+        if mask is not None:
+            order = order[mask[order]]
+        if line_tol is None or len(order) < 2:
+            return order
+        line_id = np.empty(len(order), dtype=np.intp)
+        cur, y_start = 0, self.cy[order[0]]
+        for n, i in enumerate(order):
+            if self.cy[i] - y_start > line_tol:
+                cur += 1; y_start = self.cy[i]
+            line_id[n] = cur
+        return order[np.lexsort((self.cx[order], line_id))]
+
+    def cached(self, name, fn):
+        """Valor derivado da página calculado uma vez (tokens normalizados etc.)."""
+        v = self._cache.get(name)
+        if v is None:
+            v = self._cache[name] = fn(self)
+        return v
+
+    def peek(self, name):
+        """Valor derivado já calculado, ou None (não calcula)."""
+        return self._cache.get(name)
+
+    def store(self, name, value):
+        """Grava um valor derivado calculado fora (restaurado do cache de análise em disco)."""
+        self._cache[name] = value
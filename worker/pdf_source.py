@@ -0,0 +1,159 @@
+# pdf_source.py — download do PDF em streaming para arquivo temporário (sem o PDF inteiro em memória)
+import os, tempfile, threading
+from contextlib import contextmanager
+
+SPOOL_MAX_MB = float(os.environ.get("PDF_SPOOL_MAX_MB", "8"))   # até aqui fica em memória (bytes)
+MAX_PDF_MB = float(os.environ.get("MAX_PDF_MB", "300"))         # acima disso o item falha sem processar
+PDF_TMP_DIR = os.environ.get("PDF_TMP_DIR") or None             # None = diretório temporário do sistema
+# PDFs baixados no preflight ficam guardados até a vez do item (sem segundo download); em memória até
+# este total no processo, o que passar vai para arquivo temporário em PDF_TMP_DIR
+PDF_KEEP_MEM_MB = float(os.environ.get("PDF_KEEP_MEM_MB", "64"))
+# no máximo tantos PDFs guardados no processo; passando disso, o PDF é solto após o preflight e o
+# processamento baixa de novo (o disco não cresce com o tamanho do job)
+PDF_KEEP_MAX = int(os.environ.get("PDF_KEEP_MAX", "16"))
+CHUNK = 1 << 20
+
+
+class PdfTooLarge(RuntimeError):
+    pass
+
+
+class _Spool:
+    """Acumula em memória até SPOOL_MAX_MB; passando disso, despeja num arquivo e segue gravando nele."""
+
+    def __init__(self):
+        self.buf = bytearray()
+        self.file = None
+        self.size = 0
+
+    def write(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.size > MAX_PDF_MB * 1024 * 1024:
+            raise PdfTooLarge(f"PDF maior que MAX_PDF_MB={MAX_PDF_MB:g}")
+        if self.file is None and self.size > SPOOL_MAX_MB * 1024 * 1024:
+            self.file = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf", dir=PDF_TMP_DIR)
+            self.file.write(self.buf)
+            self.buf = bytearray()
+        if self.file is not None:
+            self.file.write(chunk)
+        else:
+            self.buf += chunk
+
+    def result(self):
+        if self.file is not None:
+            self.file.close()
+            return self.file.name
+        return bytes(self.buf)
+
+    def cleanup(self):
+        if self.file is not None:
+            try:
+                self.file.close()
+                os.remove(self.file.name)
+            except OSError:
+                pass
+
+
+def _download(spool: _Spool, supabase, bucket: str, path: str, expires_in: int):
+    try:
+        url = supabase.storage.from_(bucket).create_signed_url(path, expires_in)["signedURL"]
+    except Exception:
+        url = None
+    if url:
+        import httpx
+        with httpx.stream("GET", url, timeout=60.0, follow_redirects=True) as r:
+            r.raise_for_status()
+            for chunk in r.iter_bytes(CHUNK):
+                spool.write(chunk)
+    else:
+        data = supabase.storage.from_(bucket).download(path)
+        if data is None:
+            raise RuntimeError(f"Failed to download: {path}")
+        for i in range(0, len(data), CHUNK):
+            spool.write(data[i:i + CHUNK])
+        del data
+
+
+@contextmanager
+def spooled_download(supabase, bucket: str, path: str, expires_in: int = 300):
+    """
+    Baixa `bucket/path` em streaming (URL assinada) e entrega bytes (PDF pequeno) ou o caminho de
+    um arquivo temporário (PDF grande, aberto pelo PyMuPDF direto do disco). O arquivo é apagado
+    na saída do bloco. Sem URL assinada, cai no download() do SDK e despeja no arquivo.
+    """
+    spool = _Spool()
+    try:
+        _download(spool, supabase, bucket, path, expires_in)
+        yield spool.result()
+    finally:
+        spool.cleanup()
+
+
+_kept_lock = threading.Lock()
+_kept_mem = 0    # bytes de PDFs guardados em memória (KeptPdf) no processo
+_kept_count = 0  # KeptPdf com vaga (PDF_KEEP_MAX)
+
+
+class KeptPdf:
+    """
+    PDF baixado no preflight e guardado até o processamento do item: `with kept as src:` entrega
+    bytes ou o caminho do arquivo temporário e libera tudo na saída (release() também, para o item
+    que não chega a processar). Bytes além de PDF_KEEP_MEM_MB no processo vão para disco. Sem vaga
+    (PDF_KEEP_MAX guardados), serve só ao preflight: hold() solta e devolve None.
+    """
+
+    def __init__(self, src):
+        global _kept_mem, _kept_count
+        self.mem = 0
+        with _kept_lock:
+            self.slot = _kept_count < PDF_KEEP_MAX
+            if self.slot:
+                _kept_count += 1
+        if self.slot and isinstance(src, (bytes, bytearray)):
+            with _kept_lock:
+                if _kept_mem + len(src) <= PDF_KEEP_MEM_MB * 1024 * 1024:
+                    _kept_mem += len(src)
+                    self.mem = len(src)
+            if not self.mem:
+                with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf", dir=PDF_TMP_DIR) as f:
+                    f.write(src)
+                src = f.name
+        self.src = src
+
+    def hold(self):
+        """O próprio KeptPdf, se ficou com vaga; senão solta já (o processamento baixa de novo) e devolve None."""
+        if self.slot:
+            return self
+        self.release()
+        return None
+
+    def release(self):
+        global _kept_mem, _kept_count
+        src, self.src = self.src, None
+        if src is None:
+            return
+        with _kept_lock:
+            _kept_mem -= self.mem
+            _kept_count -= self.slot
+        if isinstance(src, str):
+            try:
+                os.remove(src)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self.src
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def keep_download(supabase, bucket: str, path: str, expires_in: int = 300) -> KeptPdf:
+    """Como spooled_download, mas o PDF fica guardado (KeptPdf) até o chamador liberar."""
+    spool = _Spool()
+    try:
+        _download(spool, supabase, bucket, path, expires_in)
+        return KeptPdf(spool.result())
+    except BaseException:
+        spool.cleanup()
+        raise
@@ -0,0 +1,107 @@
+# preflight.py — análise barata do PDF antes da fila (páginas, palavras, camada de texto, chamadas
+# LLM estimadas) e custo estimado usado pelo escalonador (menor primeiro)
+import os, time
+
+from worker.anchors_reading_span import (prescan_pages, _open_pdf, ENABLE_LLM_FALLBACK,
+                                         PAGE_PRESCAN, PRESCAN_MIN_PAGES, PRESCAN_FALLBACK_PAGES)
+from worker.analysis_cache import DocAnalysis, STORE as ANALYSIS_STORE, pdf_hash
+from worker.profiles import get_profile
+from worker.memory import ITEM_MEM_LIMIT_MB
+from worker.pdf_source import SPOOL_MAX_MB
+
+# pesos do custo estimado (~segundos): chamada LLM, mil palavras analisadas, página aberta
+COST_PER_LLM_CALL = float(os.environ.get("PREFLIGHT_COST_LLM_CALL", "1.5"))
+COST_PER_1K_WORDS = float(os.environ.get("PREFLIGHT_COST_1K_WORDS", "0.3"))
+COST_PER_PAGE = float(os.environ.get("PREFLIGHT_COST_PAGE", "0.01"))
+
+# memória estimada do item (MB) para a admissão do escalonador: base da pipeline + PDF em memória
+# (até PDF_SPOOL_MAX_MB; acima disso o PyMuPDF lê do arquivo) + palavras com caixa no cache de análise
+ADMIT_MEM_BASE_MB = float(os.environ.get("ADMIT_MEM_BASE_MB", "25"))
+ADMIT_MB_PER_1K_WORDS = float(os.environ.get("ADMIT_MB_PER_1K_WORDS", "0.2"))
+
+# páginas lidas pelo preflight (a 1ª, a última e as demais espalhadas); palavras e páginas relevantes
+# do resto do documento são extrapoladas, então o custo do preflight não cresce com o documento
+PREFLIGHT_SAMPLE_PAGES = int(os.environ.get("PREFLIGHT_SAMPLE_PAGES", "8"))
+
+PREFLIGHT_COLUMNS = ("pages", "words", "has_text_layer", "est_llm_calls", "file_bytes")
+
+
+def sample_pages(n: int, k: int = PREFLIGHT_SAMPLE_PAGES) -> list:
+    """Até k páginas espalhadas pelo documento, sempre com a primeira e a última."""
+    if n <= k:
+        return list(range(n))
+    if k <= 1:
+        return [0]
+    return sorted({round(i * (n - 1) / (k - 1)) for i in range(k)})
+
+
+def preflight_pdf(src, schema: dict, profile=None) -> dict:
+    """
+    Só a camada de texto (sem palavras com caixa, âncoras ou LLM) de uma amostra de páginas
+    (sample_pages): nº de páginas, nº de palavras estimado, se há texto e quantas chamadas LLM a
+    pipeline deve fazer no perfil (bulk nas páginas que a pré-varredura selecionaria, estimadas
+    pela fração relevante da amostra, até o limite do perfil, + JSON final). O texto lido vai
+    para o cache de análise e é reaproveitado depois.
+    """
+    t0 = time.perf_counter()
+    prof = get_profile(profile)
+    file_bytes = len(src) if isinstance(src, (bytes, bytearray)) else os.path.getsize(src)
+    doc = _open_pdf(src)
+    try:
+        key = pdf_hash(src) if ANALYSIS_STORE is not None else None
+        analysis = ANALYSIS_STORE.load(key, doc) if key else DocAnalysis(doc)
+        before = analysis.signature()
+        n = len(doc)
+        sample = sample_pages(n)
+        sampled_words = sum(len(analysis.text(pno).split()) for pno in sample)
+        words = round(sampled_words * n / max(1, len(sample)))
+        has_text = sampled_words > 0
+        if PAGE_PRESCAN and n > PRESCAN_MIN_PAGES and schema:
+            relevant = len(prescan_pages(analysis, schema, pages=sample))
+            work_pages = min(n, max(min(PRESCAN_FALLBACK_PAGES, n), round(relevant * n / len(sample))))
+        else:
+            work_pages = n
+        if prof.max_pages:
+            work_pages = min(work_pages, prof.max_pages)
+        if key and analysis.signature() != before:
+            try:
+                ANALYSIS_STORE.save(key, analysis)
+            except OSError:
+                pass
+    finally:
+        doc.close()
+    if ENABLE_LLM_FALLBACK and prof.llm and schema:
+        est_llm = (work_pages * prof.llm_bulk if has_text else 0) + prof.llm_json
+    else:
+        est_llm = 0
+    return {"pages": n, "words": words, "has_text_layer": has_text, "est_llm_calls": est_llm,
+            "file_bytes": file_bytes, "sampled_pages": len(sample),
+            "preflight_ms": int((time.perf_counter() - t0) * 1000)}
+
+
+def est_cost(row: dict) -> float:
+    """Custo estimado do item (linha de job_items com as colunas do preflight); sem preflight = fim da fila."""
+    if row.get("pages") is None:
+        return float("inf")
+    return (COST_PER_LLM_CALL * (row.get("est_llm_calls") or 0) +
+            COST_PER_1K_WORDS * (row.get("words") or 0) / 1000 +
+            COST_PER_PAGE * row["pages"])
+
+
+def est_weight(row: dict) -> tuple:
+    """
+    Peso do item na admissão do escalonador: (memória MB, fração de CPU). A memória é limitada pelo
+    teto por item (ITEM_MEM_LIMIT_MB, que o MemoryGuard garante); a fração de CPU é a parte do custo
+    estimado que não é espera de LLM. Sem preflight = o pior caso (roda sem companhia pesada).
+    """
+    if row.get("pages") is None:
+        return (ITEM_MEM_LIMIT_MB or ADMIT_MEM_BASE_MB + SPOOL_MAX_MB, 1.0)
+    words = row.get("words") or 0
+    file_mb = (row.get("file_bytes") or 0) / (1024 * 1024)
+    mem = ADMIT_MEM_BASE_MB + (file_mb if file_mb <= SPOOL_MAX_MB else 0.0) + ADMIT_MB_PER_1K_WORDS * words / 1000
+    if ITEM_MEM_LIMIT_MB:
+        mem = min(mem, ITEM_MEM_LIMIT_MB)
+    cpu_s = COST_PER_1K_WORDS * words / 1000 + COST_PER_PAGE * row["pages"]
+    total = cpu_s + COST_PER_LLM_CALL * (row.get("est_llm_calls") or 0)
+    cpu = max(0.1, cpu_s / total) if total > 0 else 1.0
+    return (round(mem, 1), round(cpu, 3))
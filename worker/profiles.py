@@ -0,0 +1,81 @@
+# profiles.py — perfis de extração (fast / balanced / accurate): quais estágios LLM rodam, tetos de
+# tokens, esforço de raciocínio, limite de páginas e prazo, escolhidos por job/requisição
+import os, json, logging, contextvars
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+
+from worker.deadline import DOC_DEADLINE_S
+from worker.log import get_logger, log_event
+
+EXTRACTION_PROFILE = os.environ.get("EXTRACTION_PROFILE", "accurate")  # padrão do worker (sem perfil no job)
+
+
+@dataclass(frozen=True)
+class ExtractionProfile:
+    name: str
+    llm: bool = True                  # False = só heurísticas (nenhuma chamada LLM)
+    llm_value: bool = True            # LLM por campo quando o span sai vazio
+    llm_bulk: bool = True             # LLM por página: sanitiza e preenche
+    llm_json: bool = True             # JSON extractor final
+    final_all_keys: bool = True       # JSON extractor em todas as chaves (False: só faltantes/compostas)
+    sanitize_existing: bool = True    # valor do bulk sobrescreve o da heurística
+    value_schema_only: bool = True    # LLM por campo só em âncoras do schema (não nas genéricas)
+    speculative: bool | None = None   # None = LLM_SPECULATIVE
+    reasoning_effort: str = "minimal"  # minimal|low|medium|high
+    value_max_tokens: int = 80        # saída do LLM por campo
+    json_text_chars: int = 7000       # texto enviado ao JSON extractor (começo + fim)
+    max_pages: int = 0                # páginas pela pipeline completa (0 = todas as selecionadas)
+    deadline_s: float = DOC_DEADLINE_S
+
+
+PROFILES = {
+    # latência crítica: tudo na CPU (âncoras, spans, campos tipados), primeiras páginas relevantes
+    "fast": ExtractionProfile("fast", llm=False, llm_value=False, llm_bulk=False, llm_json=False,
+                              final_all_keys=False, max_pages=20),
+    # CLI/lote: passo final só nas chaves faltantes ou compostas
+    "balanced": ExtractionProfile("balanced", final_all_keys=False),
+    # backfill/servidor: todos os estágios, passo final em todas as chaves
+    "accurate": ExtractionProfile("accurate"),
+}
+
+log = get_logger("worker.profiles")
+
+# ajustes por perfil sem mudar código: EXTRACTION_PROFILES='{"accurate": {"reasoning_effort": "low", "deadline_s": 60}}'
+# JSON inválido ou campo desconhecido não derruba o import: fica no log e o perfil segue sem o ajuste
+try:
+    _overrides = json.loads(os.environ.get("EXTRACTION_PROFILES", "") or "{}")
+    if not isinstance(_overrides, dict):
+        raise ValueError("esperado um objeto JSON {perfil: {campo: valor}}")
+except (ValueError, TypeError) as e:
+    log_event(log, logging.ERROR, "profiles.env_invalid", env="EXTRACTION_PROFILES", err=f"{type(e).__name__}: {e}")
+    _overrides = {}
+for _name, _over in _overrides.items():
+    try:
+        PROFILES[_name] = replace(PROFILES.get(_name) or ExtractionProfile(_name), name=_name, **_over)
+    except TypeError as e:
+        log_event(log, logging.ERROR, "profiles.env_invalid", env="EXTRACTION_PROFILES", profile=_name,
+                  err=f"{type(e).__name__}: {e}")
+
+
+def get_profile(profile=None) -> ExtractionProfile:
+    """Nome (ou perfil pronto) -> ExtractionProfile; None/vazio = EXTRACTION_PROFILE. Nome desconhecido = ValueError."""
+    if isinstance(profile, ExtractionProfile):
+        return profile
+    name = str(profile or EXTRACTION_PROFILE).strip().lower()
+    if name not in PROFILES:
+        raise ValueError(f"perfil de extração desconhecido: {name!r} (use {', '.join(PROFILES)})")
+    return PROFILES[name]
+
+
+_current_profile = contextvars.ContextVar("extraction_profile", default=None)
+
+def current_profile() -> ExtractionProfile:
+    return _current_profile.get() or get_profile()
+
+@contextmanager
+def use_profile(profile):
+    token = _current_profile.set(get_profile(profile))
+    try:
+        yield _current_profile.get()
+    finally:
+        _current_profile.reset(token)
@@ -0,0 +1,184 @@
+# profiling.py — profiling sob demanda de um documento: amostragem de pilha (speedscope) + tracemalloc
+#   python -m worker.profiling doc.pdf schema.json -o /tmp/prof [--mode cpu]   # local: grava os artefatos
+# Desligado, profile_call() chama a função direto (nenhuma thread, hook ou tracemalloc).
+import os, sys, json, time, threading, tracemalloc
+from collections import Counter
+
+PROFILE_SAMPLE_MS = float(os.environ.get("PROFILE_SAMPLE_MS", "5"))   # intervalo de amostragem
+PROFILE_TOP_ALLOCS = int(os.environ.get("PROFILE_TOP_ALLOCS", "30"))  # linhas no relatório de alocação
+PROFILE_MAX_DEPTH = 128
+
+_tm_lock = threading.Lock()
+_tm_users = 0  # tracemalloc é global no processo: liga no 1º documento perfilado, desliga no último
+
+
+class SamplingProfiler:
+    """
+    Amostra a pilha de UMA thread (a que roda a pipeline) a cada interval_ms, via
+    sys._current_frames() numa thread auxiliar; pilhas idênticas são agregadas.
+    """
+
+    def __init__(self, thread_id=None, interval_ms: float = PROFILE_SAMPLE_MS):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval_ms / 1000
+        self.stacks = Counter()
+        self.weights = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+        self.t0 = self.t1 = None
+
+    def _sample(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and len(stack) < PROFILE_MAX_DEPTH:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            if stack:
+                key = tuple(reversed(stack))  # raiz -> folha
+                self.stacks[key] += 1
+                self.weights[key] += (now - last) * 1000
+            last = now
+
+    def start(self):
+        self.t0 = time.perf_counter()
+        self._thread = threading.Thread(target=self._sample, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.t1 = time.perf_counter()
+
+    def speedscope(self, name: str = "documento") -> dict:
+        """Arquivo no formato do speedscope (https://www.speedscope.app), perfil 'sampled' em ms."""
+        index, frames, samples, weights = {}, [], [], []
+        for stack, w in self.weights.items():
+            ids = []
+            for fr in stack:
+                if fr not in index:
+                    index[fr] = len(frames)
+                    frames.append({"name": fr[0], "file": fr[1], "line": fr[2]})
+                ids.append(index[fr])
+            samples.append(ids)
+            weights.append(round(w, 3))
+        total = round(sum(weights), 3)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name, "exporter": "worker.profiling", "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": [{"type": "sampled", "name": name, "unit": "milliseconds",
+                          "startValue": 0, "endValue": total, "samples": samples, "weights": weights}],
+        }
+
+    def top_functions(self, n: int = 15) -> list:
+        """Tempo próprio (folha) por função, para leitura rápida sem abrir o flamegraph."""
+        own = Counter()
+        for stack, w in self.weights.items():
+            own[stack[-1]] += w
+        total = sum(own.values()) or 1.0
+        return [{"function": f"{fr[0]} ({os.path.basename(fr[1])}:{fr[2]})", "ms": round(w, 1),
+                 "pct": round(100 * w / total, 1)} for fr, w in own.most_common(n)]
+
+
+def _tracemalloc_start():
+    global _tm_users
+    with _tm_lock:
+        if _tm_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(1)  # 1 quadro por alocação: basta para o relatório por linha e custa bem menos
+        else:
+            tracemalloc.reset_peak()
+        _tm_users += 1
+
+def _tracemalloc_stop(top: int) -> dict:
+    global _tm_users
+    with _tm_lock:
+        snap = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),  # pilhas guardadas pelo próprio amostrador
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        current, peak = tracemalloc.get_traced_memory()
+        _tm_users -= 1
+        if _tm_users == 0:
+            tracemalloc.stop()
+    stats = snap.statistics("lineno")
+    return {
+        "current_kb": round(current / 1024, 1), "peak_kb": round(peak / 1024, 1),
+        "note": "tracemalloc é global no processo: inclui alocações de outros itens em paralelo",
+        "top": [{"file": s.traceback[0].filename, "line": s.traceback[0].lineno,
+                 "size_kb": round(s.size / 1024, 1), "count": s.count} for s in stats[:top]],
+    }
+
+
+def profile_mode(value):
+    """Valor do header x-profile / flag jobs.profile -> None (desligado), "cpu" ou "all"."""
+    v = str(value if value is not None else "").strip().lower()
+    if v in ("", "0", "false", "no", "off", "none"):
+        return None
+    return "cpu" if v == "cpu" else "all"
+
+
+def profile_call(mode, fn, *args, name: str = "documento", **kwargs):
+    """
+    Roda fn(*args, **kwargs) sob o amostrador de pilha ("cpu", ~15% de custo) ou amostrador +
+    tracemalloc ("all"/True; alocações por linha, mas o código que aloca muito fica várias vezes
+    mais lento, o que distorce o flamegraph). Retorna (resultado, artefatos): artefatos None
+    quando desligado, senão {"speedscope": dict, "allocations": dict|None, "summary": dict}.
+    """
+    if not mode:
+        return fn(*args, **kwargs), None
+    mem = mode != "cpu"
+    if mem:
+        _tracemalloc_start()
+    prof = SamplingProfiler().start()
+    try:
+        result = fn(*args, **kwargs)
+    finally:
+        prof.stop()
+        allocs = _tracemalloc_stop(PROFILE_TOP_ALLOCS) if mem else None
+    summary = {"mode": "all" if mem else "cpu", "wall_ms": round((prof.t1 - prof.t0) * 1000, 1),
+               "samples": sum(prof.stacks.values()), "interval_ms": prof.interval * 1000,
+               "top_functions": prof.top_functions()}
+    if allocs:
+        summary["peak_alloc_kb"] = allocs["peak_kb"]
+        allocs["summary"] = summary
+    return result, {"speedscope": prof.speedscope(name), "allocations": allocs, "summary": summary}
+
+
+def artifact_paths(result_path: str) -> dict:
+    """Caminhos dos artefatos ao lado do JSON de resultado (x.json -> x.speedscope.json, x.allocs.json)."""
+    base = result_path[:-5] if result_path.endswith(".json") else result_path
+    return {"speedscope": f"{base}.speedscope.json", "allocations": f"{base}.allocs.json"}
+
+
+def main(argv=None):
+    import argparse
+    ap = argparse.ArgumentParser(prog="python -m worker.profiling")
+    ap.add_argument("pdf")
+    ap.add_argument("schema", help="arquivo JSON com o schema")
+    ap.add_argument("-o", "--out", default=".", help="diretório dos artefatos")
+    ap.add_argument("--mode", default="all", choices=("cpu", "all"), help="cpu = só amostragem (sem tracemalloc)")
+    args = ap.parse_args(argv)
+    from worker.anchors_reading_span import process_pdf_with_meta
+    with open(args.schema, "r", encoding="utf-8") as f:
+        schema = json.load(f)
+    (result, meta), art = profile_call(args.mode, process_pdf_with_meta, args.pdf, schema,
+                                       name=os.path.basename(args.pdf))
+    os.makedirs(args.out, exist_ok=True)
+    paths = artifact_paths(os.path.join(args.out, os.path.basename(args.pdf) + ".json"))
+    for kind, path in list(paths.items()):
+        if art[kind] is None:
+            del paths[kind]
+            continue
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(art[kind], f, ensure_ascii=False)
+    print(json.dumps({"result": result, "profile": art["summary"], "artifacts": paths}, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# prompts.py — prompts dos estágios LLM com prefixo estático e versionado (cache de prefixo do provedor):
+# instruções fixas (system) -> parte comum a um job (schema) -> conteúdo variável (texto OCR, valores) no fim
+import os, json, hashlib
+
+# mude a versão sempre que um texto estático mudar: entra na prompt_cache_key e em meta["llm"]
+PROMPT_VERSION = "2"
+# prompt_cache_key agrupa requisições com o mesmo prefixo no mesmo nó de cache do provedor;
+# 0 para gateways compatíveis com a Responses API que rejeitam o parâmetro
+LLM_PROMPT_CACHE_KEY = os.environ.get("LLM_PROMPT_CACHE_KEY", "1") == "1"
+
+_NORMALIZE_RULES = (
+    "- Se um valor bruto existir mas estiver sujo, normalize-o (datas dd/mm/aaaa; telefones com DDD; "
+    "remova prefixos 'rótulo:' etc.).\n"
+)
+
+VALUE_SYSTEM = (
+    "Você é um extrator. Dado um trecho de OCR possivelmente ruidoso, "
+    "retorne SOMENTE o valor do campo especificado, sem comentários. "
+    "Se achar a informação no trecho, responda com o valor exato. "
+    "Se não existir no trecho, responda exatamente: null.\n"
+    "Responda apenas o valor, ou null."
+)
+
+BULK_SYSTEM = (
+    "Você é um extrator/sanitizador. Dado um TEXTO OCR e uma LISTA ordenada de chaves com valores brutos, "
+    "retorne, NA MESMA ORDEM DAS CHAVES, apenas os valores finais, separados por ponto e vírgula. "
+    "Regras:\n"
+    + _NORMALIZE_RULES +
+    "- Se não houver valor no texto, escreva exatamente: null.\n"
+    "- Não invente valores. Não acrescente comentários. Apenas a lista de valores, separada por ';'.\n"
+    "Formato de resposta (apenas esta linha, sem espaços extras):\n"
+    "valor1;valor2;valor3;...\n"
+    "Use 'null' quando o valor não existir."
+)
+
+JSON_SYSTEM = (
+    "Você é um assistente de extração de dados (JSON extractor).\n"
+    "Extraia as informações pedidas no SCHEMA JSON a partir do TEXTO DO DOCUMENTO (texto de um PDF, "
+    "pode estar desordenado).\n"
+    "Responda *apenas* com JSON válido com as chaves do schema, sem comentários. "
+    "Se um campo não for encontrado, use null."
+)
+
+BATCH_BULK_SYSTEM = (
+    "Você é um extrator/sanitizador. Você receberá VÁRIOS documentos independentes, cada um numa seção "
+    "'### DOC <id>' com um TEXTO OCR e chaves com valores brutos. Trate cada seção isoladamente: use só o "
+    "texto daquela seção. Regras:\n"
+    + _NORMALIZE_RULES +
+    "- Se não houver valor no texto, use null.\n"
+    "- Não invente valores.\n"
+    "Responda APENAS com um JSON: {\"<id>\": {\"<chave>\": \"valor\" ou null, ...}, ...} "
+    "com todos os documentos e todas as chaves de cada um."
+)
+
+BATCH_JSON_SYSTEM = (
+    "Você é um assistente de extração de dados (JSON extractor). Você receberá VÁRIOS documentos "
+    "independentes, cada um numa seção '### DOC <id>' com o texto (pode estar desordenado). O schema a "
+    "extrair vem antes das seções quando é o mesmo para todos, senão dentro de cada seção. Use só o texto "
+    "da própria seção. Se um campo não for encontrado, use null.\n"
+    "Responda APENAS com um JSON: {\"<id>\": {<campos do schema daquele documento>}, ...}. Sem comentários."
+)
+
+
+def _msg(role: str, text: str) -> dict:
+    return {"role": role, "content": [{"type": "input_text", "text": text}]}
+
+def _schema_text(schema: dict) -> str:
+    # serialização estável (mesma ordem de chaves do schema): documentos do mesmo job geram o mesmo prefixo
+    return json.dumps(schema, indent=2, ensure_ascii=False)
+
+def cache_key(stage: str, shared=None) -> dict:
+    """
+    Campos extras do payload: prompt_cache_key = versão + estágio + hash da parte comum (schema/chaves),
+    para que os documentos de um mesmo job caiam no mesmo cache de prefixo. {} quando desligado.
+    """
+    if not LLM_PROMPT_CACHE_KEY:
+        return {}
+    key = f"p{PROMPT_VERSION}:{stage}"
+    if shared:
+        key += ":" + hashlib.sha1(json.dumps(shared, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+    return {"prompt_cache_key": key}
+
+
+def value_input(key: str, context: str) -> list:
+    return [_msg("system", VALUE_SYSTEM), _msg("user", f"Campo: {key}\nTrecho:\n{context}")]
+
+def bulk_input(keys, page_text: str, values: dict) -> list:
+    kv_lines = [f"{k}={(values.get(k) or '').strip()}" for k in keys]
+    return [_msg("system", BULK_SYSTEM),
+            _msg("user", f"TEXTO_OCR:\n{page_text}\n\nCHAVES_E_VALORES_BRUTOS (na ordem):\n" + "\n".join(kv_lines))]
+
+def json_input(schema: dict, text: str) -> list:
+    # schema ANTES do texto: é a parte que se repete entre os documentos do job
+    return [_msg("system", JSON_SYSTEM),
+            _msg("user", f"SCHEMA JSON PARA EXTRAÇÃO:\n{_schema_text(schema)}\n\nTEXTO DO DOCUMENTO:\n---\n{text}\n---")]
+
+def batch_input(kind: str, ids, requests):
+    """
+    Prompt multi-documento do LLMBatcher -> (input, tamanhos das seções). No JSON, schema igual
+    em todas as seções sobe para antes delas (prefixo comum); a seção fica só com o texto.
+    """
+    sections = []
+    if kind == "bulk":
+        for did, req in zip(ids, requests):
+            kv = "\n".join(f"{k}={req['values'].get(k, '')}" for k in req["keys"])
+            sections.append(f"### DOC {did}\nTEXTO_OCR:\n{req['text']}\n\nCHAVES_E_VALORES_BRUTOS:\n{kv}")
+        return [_msg("system", BATCH_BULK_SYSTEM), _msg("user", "\n\n".join(sections))], [len(s) for s in sections]
+    shared = all(r["schema"] == requests[0]["schema"] for r in requests)
+    for did, req in zip(ids, requests):
+        sec = f"### DOC {did}\nTEXTO DO DOCUMENTO:\n---\n{req['text']}\n---"
+        if not shared:
+            sec += f"\nSCHEMA:\n{json.dumps(req['schema'], ensure_ascii=False)}"
+        sections.append(sec)
+    head = f"SCHEMA JSON PARA EXTRAÇÃO (todos os documentos):\n{_schema_text(requests[0]['schema'])}\n\n" if shared else ""
+    return [_msg("system", BATCH_JSON_SYSTEM), _msg("user", head + "\n\n".join(sections))], [len(s) for s in sections]
@@ -1,8 +1,23 @@
 # worker/run_job.py
-import os, time, json, tempfile, uuid, traceback
+import os, time, json, tempfile, uuid, logging
 from supabase import create_client, Client
 from typing import List, Dict, Any
-from worker.anchors_reading_span import process_pdf_to_json
+from worker.anchors_reading_span import process_pdf_with_meta
+from worker.llm_usage import usage_columns, rollup_usage, USAGE_COLUMNS
+from worker.deadline import Deadline
+from worker.pdf_source import spooled_download, keep_download
+from worker.preflight import preflight_pdf, est_cost, est_weight, PREFLIGHT_COLUMNS
+from worker.profiling import profile_call, profile_mode, artifact_paths
+from worker.profiles import get_profile
+from worker.scheduler import ThreadScheduler
+from worker.layout import LayoutCache, use_layouts
+from worker.log import get_logger, log_context, log_event
+
+log = get_logger("worker.run_job")
+
+# itens de todos os jobs em andamento no processo (cada /process-job roda numa thread):
+# round-robin entre jobs, menor custo estimado primeiro dentro do job, SCHED_MAX_INFLIGHT por vez
+SCHEDULER = ThreadScheduler()
 
 SUPABASE_URL = os.environ["SUPABASE_URL"]
 SUPABASE_SERVICE_ROLE_KEY = os.environ["SUPABASE_SERVICE_ROLE_KEY"]
@@ -12,15 +27,12 @@ BUCKET_RESULTS = os.environ.get("BUCKET_RESULTS", "results")
 def _sb() -> Client:
     return create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
 
-def _download_pdf_bytes(supabase: Client, path: str) -> bytes:
-    # storage3 v2: download retorna bytes diretamente
-    data = supabase.storage.from_(BUCKET_DOCS).download(path)
-    return data
-
 def _upload_json_result(supabase: Client, job_id: str, file_name: str, result: Dict[str, Any]) -> str:
+    return _upload_json_at(supabase, f"{job_id}/{uuid.uuid4().hex}-{file_name}.json", result)
+
+def _upload_json_at(supabase: Client, result_rel: str, result: Any) -> str:
     # grava em arquivo temporário para evitar o erro do storage3 com BytesIO
     result_bytes = json.dumps(result, ensure_ascii=False, indent=2).encode("utf-8")
-    result_rel = f"{job_id}/{uuid.uuid4().hex}-{file_name}.json"
 
     with tempfile.NamedTemporaryFile(delete=False, suffix=".json") as tmp:
         tmp.write(result_bytes)
@@ -46,10 +58,11 @@ def _public_result_url(supabase: Client, path: str) -> str:
 
 def _update_job_counters(supabase: Client, job_id: str):
     # Reconta done/error no banco para atualizar o job
-    items = supabase.table("job_items").select("status").eq("job_id", job_id).execute().data or []
+    cols = ",".join(("status",) + USAGE_COLUMNS)
+    items = supabase.table("job_items").select(cols).eq("job_id", job_id).execute().data or []
     done = sum(1 for it in items if it["status"] == "done")
     err = sum(1 for it in items if it["status"] == "error")
-    supabase.table("jobs").update({"done_count": done, "error_count": err}).eq("id", job_id).execute()
+    supabase.table("jobs").update({"done_count": done, "error_count": err, **rollup_usage(items)}).eq("id", job_id).execute()
 
     # se terminou, marca job como done (ou error, caso tenha erros e você prefira)
     total = (supabase.table("jobs").select("total_count").eq("id", job_id).single().execute().data or {}).get("total_count", 0)
@@ -57,7 +70,27 @@ def _update_job_counters(supabase: Client, job_id: str):
         status = "done" if err == 0 else "error"
         supabase.table("jobs").update({"status": status}).eq("id", job_id).execute()
 
-def _process_item(supabase: Client, it: Dict[str, Any]):
+def _preflight_item(supabase: Client, it: Dict[str, Any]) -> Dict[str, Any]:
+    # páginas/palavras/camada de texto/chamadas LLM estimadas; já calculado = não refaz
+    if it.get("pages") is not None:
+        return it
+    # o PDF baixado fica guardado no item ("_pdf") e o processamento o reaproveita
+    kept = None
+    try:
+        kept = keep_download(supabase, BUCKET_DOCS, it["file_path"])
+        pf = preflight_pdf(kept.src, it.get("schema") or {}, it.get("extraction_profile"))
+    except Exception as e:  # o item ainda roda (no fim da fila); o erro real aparece no processamento
+        log_event(log, logging.WARNING, "item.preflight_failed", err=f"{type(e).__name__}: {e}")
+        return {**it, "_pdf": kept.hold() if kept is not None else None}
+    kept = kept.hold()
+    try:
+        supabase.table("job_items").update({k: pf[k] for k in PREFLIGHT_COLUMNS}).eq("id", it["id"]).execute()
+    except Exception as e:  # as colunas são só informativas; a fila usa o preflight em memória
+        log_event(log, logging.WARNING, "item.preflight_save_failed", err=f"{type(e).__name__}: {e}")
+    log_event(log, logging.INFO, "item.preflight", **pf)
+    return {**it, **pf, "_pdf": kept}
+
+def _process_item(supabase: Client, it: Dict[str, Any], profile=None):
     # it: row de job_items
     item_id = it["id"]
     file_name = it["file_name"]
@@ -66,25 +99,41 @@ def _process_item(supabase: Client, it: Dict[str, Any]):
 
     start = time.perf_counter()
     try:
+        prof = get_profile(it.get("extraction_profile"))
+        deadline = Deadline(prof.deadline_s)  # prazo do perfil a partir do início do item
+        log_event(log, logging.INFO, "item.start", file=file_name, profile=prof.name)
         # marca running
-        supabase.table("job_items").update({"status": "running", "error_message": None}).eq("id", item_id).execute()
-
-        # baixa pdf
-        pdf_bytes = _download_pdf_bytes(supabase, file_path)
+        supabase.table("job_items").update({"status": "running", "error_message": None,
+                                            "extraction_profile": prof.name}).eq("id", item_id).execute()
 
-        # roda pipeline
-        result = process_pdf_to_json(pdf_bytes, schema)
+        # PDF guardado no preflight ou download em streaming (grande -> arquivo temporário, apagado no fim)
+        with it.get("_pdf") or spooled_download(supabase, BUCKET_DOCS, file_path) as src:
+            (result, meta), prof_art = profile_call(profile, process_pdf_with_meta, src, schema,
+                                                    deadline=deadline, profile=prof, name=file_name)
 
-        # sobe json
+        # sobe json (+ flamegraph/alocações ao lado, se perfilado)
         result_path = _upload_json_result(supabase, it["job_id"], file_name, result)
+        profile_cols = {}
+        if prof_art:
+            paths = artifact_paths(result_path)
+            for kind, path in paths.items():
+                if prof_art[kind] is not None:
+                    _upload_json_at(supabase, path, prof_art[kind])
+            profile_cols["profile_path"] = paths["speedscope"]
+            log_event(log, logging.INFO, "item.profile",
+                      **{k: v for k, v in prof_art["summary"].items() if k != "top_functions"})
 
         dur_ms = int((time.perf_counter() - start) * 1000)
         supabase.table("job_items").update({
             "status": "done",
             "duration_ms": dur_ms,
             "result_path": result_path,
-            "error_message": None
+            "error_message": None,
+            "degraded": (meta.get("deadline") or {}).get("degraded") or None,
+            **usage_columns(meta.get("llm")),
+            **profile_cols,
         }).eq("id", item_id).execute()
+        log_event(log, logging.INFO, "item.done", ms=dur_ms, llm_calls=meta.get("llm", {}).get("calls", 0))
     except Exception as e:
         dur_ms = int((time.perf_counter() - start) * 1000)
         supabase.table("job_items").update({
@@ -92,9 +141,12 @@ def _process_item(supabase: Client, it: Dict[str, Any]):
             "duration_ms": dur_ms,
             "error_message": f"{type(e).__name__}: {e}"
         }).eq("id", item_id).execute()
-        traceback.print_exc()
+        log.exception("item.error", extra={"fields": {"ms": dur_ms}})
+    finally:
+        if it.get("_pdf") is not None:
+            it["_pdf"].release()
 
-def run_job_id(job_id: str):
+def run_job_id(job_id: str, profile=None, extraction_profile=None):
     sb = _sb()
 
     # pega items do job (status != done/error)
@@ -114,7 +166,30 @@ def run_job_id(job_id: str):
     job_row = sb.table("jobs").select("*").eq("id", job_id).single().execute().data
     if job_row and job_row.get("status") == "queued":
         sb.table("jobs").update({"status": "running"}).eq("id", job_id).execute()
+    # profiling sob demanda: argumento (header x-profile) ou coluna jobs.profile
+    profile = profile_mode(profile if profile is not None else (job_row or {}).get("profile"))
 
-    for it in items:
-        _process_item(sb, it)
+    def run(it):
+        _process_item(sb, it, profile)
         _update_job_counters(sb, job_id)
+
+    # cada item entra na fila assim que o preflight termina; a fila já vai processando.
+    # perfil de extração: requisição > item > job > EXTRACTION_PROFILE
+    # clusters de layout do job (o submit copia o contexto: os itens enxergam o mesmo cache)
+    futures = []
+    layouts = LayoutCache()
+    with use_layouts(layouts):
+        for it in items:
+            it = {**it, "extraction_profile": (extraction_profile or it.get("extraction_profile")
+                                               or (job_row or {}).get("extraction_profile"))}
+            with log_context(job_id=job_id, item_id=it["id"]):
+                it = _preflight_item(sb, it)
+                try:
+                    futures.append(SCHEDULER.submit(job_id, est_cost(it), it, run, weight=est_weight(it)))
+                except BaseException:
+                    if it.get("_pdf") is not None:
+                        it["_pdf"].release()
+                    raise
+    for fut in futures:
+        fut.result()
+    log_event(log, logging.INFO, "layout.cache", job_id=job_id, **layouts.stats)
@@ -0,0 +1,263 @@
+# sanitizer_model.py — sanitizador local destilado do bulk LLM: regras de edição aprendidas de pares
+# (chave, valor bruto, valor do LLM) — prefixos de rótulo removidos, formato pela forma dos dígitos,
+# caixa/aparas — e aplicadas em CPU; campo sem regra confiável (ou sem valor bruto) continua no LLM
+#   treino:    python -m worker.sanitizer_model train pares.jsonl [...] --out sanitizer.json
+#   avaliação: python -m worker.sanitizer_model eval pares_holdout.jsonl
+import os, sys, json, argparse, threading
+from collections import Counter, defaultdict
+import regex as rx
+
+from worker.field_types import infer_field_type, _norm, _digits
+from worker.log import get_logger, log_event
+
+import logging
+log = get_logger("worker.sanitizer")
+
+MODEL_VERSION = 1
+# modelo treinado com pares reais (SANITIZER_PAIRS_LOG + train); vazio (padrão) = desligado, todo campo
+# vai ao bulk LLM. O worker não traz modelo: regras de documentos sintéticos pulariam o LLM em tráfego real
+SANITIZER_MODEL = os.environ.get("SANITIZER_MODEL", "")
+SANITIZER_MIN_CONF = float(os.environ.get("SANITIZER_MIN_CONF", "0.9"))  # abaixo disso o campo vai ao LLM
+# JSONL onde o bulk LLM grava os pares (chave, bruto, sanitizado): dados de treino do próximo modelo
+SANITIZER_PAIRS_LOG = os.environ.get("SANITIZER_PAIRS_LOG", "")
+MIN_SUPPORT = 3          # pares mínimos numa condição da chave; abaixo disso vale a condição global ("*")
+MIN_PREFIX_SUPPORT = 2   # vezes que um rótulo precisa ter sido removido pelo LLM para virar regra
+_LOWER_WORDS = {"da", "de", "do", "das", "dos", "e"}
+# span que é só rótulo ("E-mail:", "Nº.:", "U.F.:"): a heurística leu o rótulo vizinho, nunca é valor
+_LABEL_ONLY = rx.compile(r"[\p{L}º°ª.\-/ ]{1,30}:")
+
+
+def _cls(key: str) -> str:
+    """Classe da chave: o tipo inferido pelo nome (cpf, data...) ou o próprio nome normalizado."""
+    return infer_field_type(key) or _norm(key)
+
+def _trim(s: str) -> str:
+    return s.strip(" \t.,;:-–—")
+
+def _title(s: str) -> str:
+    words = s.lower().split()
+    return " ".join(w if (i and w in _LOWER_WORDS) else w[:1].upper() + w[1:] for i, w in enumerate(words))
+
+def _shape(s: str) -> str:
+    return rx.sub(r"\d", "9", s)
+
+def _cond(s: str) -> str:
+    """Condição em que a regra é aprendida: forma exata para valores só com dígitos, traços para texto."""
+    has_d, has_l = bool(rx.search(r"\d", s)), bool(rx.search(r"\p{L}", s))
+    if has_d and not has_l:
+        return "num:" + _shape(s)
+    n = len(s.split())
+    return f"txt:{int(':' in s)}:{1 if n <= 1 else 2 if n <= 4 else 5}:{int(has_d)}"
+
+def _is_null(v) -> bool:
+    return v is None or str(v).strip().lower() in ("", "null")
+
+def _op(s: str, out: str) -> str:
+    """Edição que leva o bruto (já sem rótulo) ao valor do LLM."""
+    if _is_null(out):
+        return "null"
+    out = out.strip()
+    t = _trim(s)
+    if out == t:  # inclui o bruto já aparado: "Regular" e "Regular." caem na mesma regra
+        return "trim"
+    if out == s:
+        return "keep"
+    if out == t.upper():
+        return "upper"
+    if out == _title(t):
+        return "title"
+    if _digits(out) and _digits(out) == _digits(s) and not rx.search(r"\p{L}", out):
+        return "fmt:" + _shape(out)
+    return "other"
+
+def _apply(op: str, s: str):
+    if op == "null":
+        return "null"
+    if op == "keep":
+        return s
+    if op == "trim":
+        return _trim(s)
+    if op == "upper":
+        return _trim(s).upper()
+    if op == "title":
+        return _title(_trim(s))
+    if op.startswith("fmt:"):
+        tpl, digits = op[4:], _digits(s)
+        if tpl.count("9") != len(digits):
+            return None
+        it = iter(digits)
+        return "".join(next(it) if ch == "9" else ch for ch in tpl)
+    return None
+
+
+class SanitizerModel:
+    """Prefixos de rótulo aprendidos + distribuição de edições por (classe da chave, condição do valor)."""
+
+    def __init__(self, data: dict):
+        self.prefixes = set(data.get("prefixes", ()))
+        self.classes = data.get("classes", {})
+        self.pairs = data.get("pairs", 0)
+        self._max_prefix_words = max((len(p.split()) for p in self.prefixes), default=0)
+
+    @classmethod
+    def load(cls, path: str):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != MODEL_VERSION:
+            raise ValueError(f"versão do modelo {data.get('version')} != {MODEL_VERSION}")
+        return cls(data)
+
+    def strip_prefix(self, raw: str) -> str:
+        """Remove do começo o rótulo aprendido mais longo (com ':'/'-' e espaços em seguida)."""
+        s = raw.strip()
+        words = list(rx.finditer(r"\S+", s))
+        for n in range(min(self._max_prefix_words, len(words) - 1), 0, -1):
+            if _norm(s[:words[n - 1].end()]) in self.prefixes:
+                return rx.sub(r"^[\s:\-–—]+", "", s[words[n - 1].end():]).strip()
+        return s
+
+    def predict(self, key: str, raw: str):
+        """
+        (valor, confiança); valor None quando não há regra. Confiança = acertos / (suporte + 1).
+        Span só de rótulo e regra que descarta o valor ("null") nunca são resolvidos aqui: o LLM
+        decide se o valor existe no texto.
+        """
+        if _is_null(raw) or _LABEL_ONLY.fullmatch(raw.strip()):
+            return None, 0.0
+        s = self.strip_prefix(raw)
+        cond = _cond(s)
+        dist = self.classes.get(_cls(key), {}).get(cond) or {}
+        if sum(dist.values()) < MIN_SUPPORT:
+            dist = self.classes.get("*", {}).get(cond) or {}
+        if not dist:
+            return None, 0.0
+        op, n = max(dist.items(), key=lambda kv: kv[1])
+        value = _apply(op, s)
+        if value is None or op == "null" or not value.strip():
+            return None, 0.0
+        return value, n / (sum(dist.values()) + 1)
+
+    def confident(self, keys, raw_values: dict, min_conf: float = SANITIZER_MIN_CONF) -> dict:
+        """{chave: valor} das chaves com previsão >= min_conf (as demais seguem para o LLM)."""
+        out = {}
+        for k in keys:
+            value, conf = self.predict(k, raw_values.get(k) or "")
+            if value is not None and conf >= min_conf:
+                out[k] = value
+        return out
+
+
+def train(pairs) -> dict:
+    """Pares {"key", "raw", "out"} -> dados do modelo (JSON)."""
+    pairs = [p for p in pairs if not _is_null(p.get("raw"))]
+    prefixes = Counter()
+    for p in pairs:
+        raw, out = p["raw"].strip(), (p.get("out") or "").strip()
+        if _is_null(out):
+            continue
+        i = raw.lower().find(out.lower())
+        label = _norm(raw[:i]) if i > 0 else ""
+        if label and len(label.split()) <= 4:
+            prefixes[label] += 1
+    model = SanitizerModel({"prefixes": [p for p, n in prefixes.items() if n >= MIN_PREFIX_SUPPORT]})
+    classes = defaultdict(lambda: defaultdict(Counter))
+    for p in pairs:
+        s = model.strip_prefix(p["raw"])
+        op, cond = _op(s, p.get("out")), _cond(s)
+        classes[_cls(p["key"])][cond][op] += 1
+        classes["*"][cond][op] += 1
+    return {"version": MODEL_VERSION, "pairs": len(pairs), "prefixes": sorted(model.prefixes),
+            "classes": {c: {cond: dict(ops) for cond, ops in conds.items()} for c, conds in sorted(classes.items())}}
+
+
+def evaluate(model: SanitizerModel, pairs, min_conf: float = SANITIZER_MIN_CONF) -> dict:
+    """Cobertura (campos resolvidos localmente) e concordância com o LLM nesses campos."""
+    pairs = [p for p in pairs if not _is_null(p.get("raw"))]
+    local = agree = 0
+    for p in pairs:
+        value, conf = model.predict(p["key"], p["raw"])
+        if value is None or conf < min_conf:
+            continue
+        local += 1
+        want = "null" if _is_null(p.get("out")) else p["out"].strip()
+        agree += value == want
+    return {"pairs": len(pairs), "local": local, "coverage": round(local / max(1, len(pairs)), 3),
+            "agreement": round(agree / max(1, local), 3)}
+
+
+_model = None
+_model_lock = threading.Lock()
+_model_loaded = False
+
+def get_sanitizer():
+    """Modelo do SANITIZER_MODEL (carregado uma vez por processo); None se desligado ou ausente."""
+    global _model, _model_loaded
+    if _model_loaded:
+        return _model
+    with _model_lock:
+        if not _model_loaded:
+            if SANITIZER_MODEL:
+                try:
+                    _model = SanitizerModel.load(SANITIZER_MODEL)
+                except (OSError, ValueError) as e:
+                    log_event(log, logging.WARNING, "sanitizer.load", outcome="unavailable", path=SANITIZER_MODEL,
+                              err=str(e))
+            _model_loaded = True
+    return _model
+
+def set_sanitizer(model):
+    """Troca o modelo (SanitizerModel ou None = desligado)."""
+    global _model, _model_loaded
+    _model, _model_loaded = model, True
+
+
+_pairs_lock = threading.Lock()
+
+def log_pairs(keys, raw_values: dict, outputs):
+    """Grava em SANITIZER_PAIRS_LOG os pares do bulk LLM com valor bruto (o que o modelo pode aprender)."""
+    if not SANITIZER_PAIRS_LOG:
+        return
+    lines = [json.dumps({"key": k, "raw": (raw_values.get(k) or "").strip(), "out": None if _is_null(v) else str(v).strip()},
+                        ensure_ascii=False)
+             for k, v in zip(keys, outputs) if not _is_null(raw_values.get(k))]
+    if not lines:
+        return
+    try:
+        with _pairs_lock, open(SANITIZER_PAIRS_LOG, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+    except OSError as e:
+        log_event(log, logging.WARNING, "sanitizer.pairs_log", outcome="error", err=str(e))
+
+
+def _read_pairs(paths):
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="treino/avaliação do sanitizador local")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    t = sub.add_parser("train")
+    t.add_argument("pairs", nargs="+", help="JSONL de pares (SANITIZER_PAIRS_LOG)")
+    t.add_argument("--out", default=SANITIZER_MODEL)
+    e = sub.add_parser("eval")
+    e.add_argument("pairs", nargs="+")
+    e.add_argument("--model", default=SANITIZER_MODEL)
+    e.add_argument("--min-conf", type=float, default=SANITIZER_MIN_CONF)
+    args = ap.parse_args(argv)
+    if args.cmd == "train":
+        data = train(_read_pairs(args.pairs))
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1, sort_keys=True)
+        print(f"{data['pairs']} pares, {len(data['prefixes'])} prefixos, {len(data['classes'])} classes -> {args.out}")
+    else:
+        print(json.dumps(evaluate(SanitizerModel.load(args.model), list(_read_pairs(args.pairs)), args.min_conf)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
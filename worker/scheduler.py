@@ -0,0 +1,260 @@
+# scheduler.py — fila justa entre jobs (round-robin) com menor-custo-primeiro dentro de cada job e
+# admissão ponderada (memória/CPU estimadas por item contra orçamentos e RSS observado);
+# versão asyncio (main.py) e com threads (run_job.py)
+import os, heapq, asyncio, threading, itertools, contextvars
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from worker.memory import rss_mb
+
+SCHED_MAX_INFLIGHT = int(os.environ.get("SCHED_MAX_INFLIGHT", "8"))  # teto de itens em execução no processo
+# orçamentos da admissão: soma das memórias estimadas (MB) e das frações de CPU dos itens em execução
+SCHED_MEM_BUDGET_MB = float(os.environ.get("SCHED_MEM_BUDGET_MB", "600"))
+SCHED_CPU_BUDGET = float(os.environ.get("SCHED_CPU_BUDGET", str(os.cpu_count() or 1)))
+# RSS do processo acima do qual nenhum item novo entra (VM de 1 GB); 0 desliga
+SCHED_RSS_LIMIT_MB = float(os.environ.get("SCHED_RSS_LIMIT_MB", "850"))
+SCHED_RSS_POLL_S = 0.25  # item barrado só pelo RSS: reavalia nesse intervalo (o RSS cai sem evento)
+# item da vez que não coube e foi ultrapassado por itens de outros jobs este nº de vezes: ganha reserva
+# (nada mais entra até ele caber; com nada em execução ele sempre cabe)
+SCHED_MAX_BYPASS = int(os.environ.get("SCHED_MAX_BYPASS", "8"))
+
+
+class FairQueue:
+    """
+    Um heap (custo estimado, ordem de chegada) por job; pop() alterna entre os jobs com itens na
+    fila, então o job de 1 documento não espera o lote de 2.000 páginas de outro usuário terminar.
+    """
+
+    def __init__(self):
+        self.jobs = OrderedDict()
+        self._seq = itertools.count()
+
+    def push(self, job_id, cost: float, entry):
+        heapq.heappush(self.jobs.setdefault(job_id, []), (cost, next(self._seq), entry))
+
+    def pop(self, job_id=None):
+        """
+        (job_id, entry) do próximo job da vez (ou do job pedido), ou None com a fila vazia. O job
+        atendido vai para o fim da vez; os que estavam antes dele mantêm o lugar.
+        """
+        if not self.jobs:
+            return None
+        if job_id is None:
+            job_id = next(iter(self.jobs))
+        heap = self.jobs[job_id]
+        _, _, entry = heapq.heappop(heap)
+        if heap:
+            self.jobs.move_to_end(job_id)
+        else:
+            del self.jobs[job_id]
+        return job_id, entry
+
+    def heads(self):
+        """(job_id, entry) do item de menor custo de cada job, na ordem da vez (round-robin)."""
+        return ((job_id, heap[0][2]) for job_id, heap in self.jobs.items())
+
+    def __len__(self):
+        return sum(len(h) for h in self.jobs.values())
+
+    def depth(self) -> dict:
+        return {job_id: len(h) for job_id, h in self.jobs.items()}
+
+
+class Admission:
+    """
+    Cobra de cada item o peso (memória MB, fração de CPU) estimado no preflight contra os
+    orçamentos. A memória também é conferida no RSS observado: o crescimento real desde o último
+    momento ocioso dividido pela memória estimada em execução dá o fator de correção da estimativa,
+    e o item só entra se RSS atual + memória estimada x fator couber em rss_limit_mb. Com nada em
+    execução o item entra sempre: o pesado que não cabe roda sozinho (em série) em vez de travar a
+    fila. Sem peso (None) o item só conta no teto de itens.
+    """
+
+    def __init__(self, mem_budget_mb: float = SCHED_MEM_BUDGET_MB, cpu_budget: float = SCHED_CPU_BUDGET,
+                 rss_limit_mb: float = SCHED_RSS_LIMIT_MB, rss=rss_mb):
+        self.mem_budget_mb, self.cpu_budget, self.rss_limit_mb = mem_budget_mb, cpu_budget, rss_limit_mb
+        self.rss = rss
+        self.mem_used, self.cpu_used, self.running = 0.0, 0.0, 0
+        self.idle_rss = None   # RSS medido ao admitir com nada em execução
+        self.mem_factor = 1.0  # RSS real / memória estimada (>= 1), da última avaliação
+        self.blocked_rss = 0   # avaliações em que o RSS barrou um item que cabia nos orçamentos
+
+    def fits(self, weight) -> bool:
+        if self.running == 0 or weight is None:
+            return True
+        mem, cpu = weight
+        if self.mem_used + mem > self.mem_budget_mb or self.cpu_used + cpu > self.cpu_budget + 1e-9:
+            return False
+        if self.rss_limit_mb:
+            now = self.rss()
+            if self.idle_rss is not None and self.mem_used > 0:
+                self.mem_factor = max(1.0, (now - self.idle_rss) / self.mem_used)
+            if now + mem * self.mem_factor > self.rss_limit_mb:
+                self.blocked_rss += 1
+                return False
+        return True
+
+    def acquire(self, weight):
+        if self.running == 0 and self.rss_limit_mb:
+            self.idle_rss = self.rss()
+        self.running += 1
+        if weight is not None:
+            self.mem_used += weight[0]
+            self.cpu_used += weight[1]
+
+    def release(self, weight):
+        self.running -= 1
+        if weight is not None:
+            self.mem_used -= weight[0]
+            self.cpu_used -= weight[1]
+
+    def stats(self) -> dict:
+        return {"mem_used_mb": round(self.mem_used, 1), "cpu_used": max(0.0, round(self.cpu_used, 2)),
+                "mem_factor": round(self.mem_factor, 2), "blocked_rss": self.blocked_rss}
+
+
+class _Metrics:
+    _bypass = (None, 0)  # (entry da vez que não coube, quantas vezes foi ultrapassada)
+
+    def _next_admissible(self):
+        """
+        Com a trava da fila: percorre o item de menor custo de cada job na ordem da vez e admite o
+        primeiro que couber (máx. de itens + orçamentos), senão None. O pesado da vez não trava os
+        jobs de trás; ultrapassado SCHED_MAX_BYPASS vezes, ninguém mais passa na frente dele.
+        """
+        if self.inflight >= self.max_inflight:
+            return None
+        first, (starving, bypassed) = None, self._bypass
+        for job_id, entry in self.queue.heads():
+            if self.admission.fits(entry[4]):
+                break
+            if first is None:
+                first = entry
+                if entry is starving and bypassed >= SCHED_MAX_BYPASS:
+                    return None  # reserva: espera os itens em execução liberarem espaço
+        else:
+            return None
+        if first is None:
+            self._bypass = (None, 0)
+        else:
+            self._bypass = (first, bypassed + 1 if first is starving else 1)
+            self.bypassed += 1
+        self.queue.pop(job_id)
+        self.inflight += 1
+        self.admission.acquire(entry[4])
+        return entry
+
+    def _wait_timeout(self):
+        # fila vazia ou itens em execução a liberar: acorda por notify; barrado pelo RSS: reavalia
+        return SCHED_RSS_POLL_S if len(self.queue) and self.admission.running else None
+
+    def stats(self) -> dict:
+        return {"inflight": self.inflight, "queued": self.queue.depth(), "bypassed": self.bypassed,
+                **self.admission.stats()}
+
+    def metrics_text(self, prefix: str = "scheduler") -> str:
+        """Formato de exposição do Prometheus (itens em execução e na fila, orçamento em uso)."""
+        st = self.stats()
+        return (f"# TYPE {prefix}_inflight gauge\n{prefix}_inflight {st['inflight']}\n"
+                f"# TYPE {prefix}_queued gauge\n{prefix}_queued {sum(st['queued'].values())}\n"
+                f"# TYPE {prefix}_queued_jobs gauge\n{prefix}_queued_jobs {len(st['queued'])}\n"
+                f"# TYPE {prefix}_mem_used_mb gauge\n{prefix}_mem_used_mb {st['mem_used_mb']}\n"
+                f"# TYPE {prefix}_cpu_used gauge\n{prefix}_cpu_used {st['cpu_used']}\n"
+                f"# TYPE {prefix}_bypassed_total counter\n{prefix}_bypassed_total {st['bypassed']}\n")
+
+
+class AsyncScheduler(_Metrics):
+    """submit() devolve um Future com o resultado de `await fn(item)`; admissão ponderada por Admission."""
+
+    def __init__(self, max_inflight: int = SCHED_MAX_INFLIGHT, admission: Admission = None):
+        self.max_inflight = max_inflight
+        self.admission = admission or Admission()
+        self.queue = FairQueue()
+        self.inflight = 0
+        self.bypassed = 0  # itens admitidos na frente de um item da vez que não cabia
+        self._cond = None
+        self._workers = []
+
+    def _ensure_workers(self):
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        self._workers = [w for w in self._workers if not w.done()]
+        while len(self._workers) < self.max_inflight:
+            self._workers.append(asyncio.get_running_loop().create_task(self._worker()))
+
+    async def submit(self, job_id, cost: float, item, fn, weight=None) -> asyncio.Future:
+        """weight = (memória MB, fração de CPU) estimados (preflight.est_weight); None = só conta no teto."""
+        self._ensure_workers()
+        fut = asyncio.get_running_loop().create_future()
+        # o item roda no contexto de quem submeteu (log_context, batcher do job)
+        async with self._cond:
+            self.queue.push(job_id, cost, (item, fn, fut, contextvars.copy_context(), weight))
+            self._cond.notify()
+        return fut
+
+    async def _worker(self):
+        while True:
+            async with self._cond:
+                while (entry := self._next_admissible()) is None:
+                    try:
+                        await asyncio.wait_for(self._cond.wait(), self._wait_timeout())
+                    except asyncio.TimeoutError:
+                        pass
+            item, fn, fut, ctx, weight = entry
+            try:
+                res = await asyncio.get_running_loop().create_task(fn(item), context=ctx)
+                if not fut.done():
+                    fut.set_result(res)
+            except Exception as e:
+                if not fut.done():
+                    fut.set_exception(e)
+            finally:
+                async with self._cond:
+                    self.inflight -= 1
+                    self.admission.release(weight)
+                    self._cond.notify_all()
+
+class ThreadScheduler(_Metrics):
+    """Mesma política com threads: submit() devolve concurrent.futures.Future de fn(item)."""
+
+    def __init__(self, max_inflight: int = SCHED_MAX_INFLIGHT, admission: Admission = None):
+        self.max_inflight = max_inflight
+        self.admission = admission or Admission()
+        self.queue = FairQueue()
+        self.inflight = 0
+        self.bypassed = 0  # itens admitidos na frente de um item da vez que não cabia
+        self._cond = threading.Condition()
+        self._threads = []
+
+    def submit(self, job_id, cost: float, item, fn, weight=None) -> Future:
+        fut = Future()
+        with self._cond:
+            if len(self._threads) < self.max_inflight:
+                t = threading.Thread(target=self._worker, name=f"sched-{len(self._threads)}", daemon=True)
+                self._threads.append(t)
+                t.start()
+            self.queue.push(job_id, cost, (item, fn, fut, contextvars.copy_context(), weight))
+            self._cond.notify()
+        return fut
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while (entry := self._next_admissible()) is None:
+                    self._cond.wait(self._wait_timeout())
+            item, fn, fut, ctx, weight = entry
+            try:
+                if fut.set_running_or_notify_cancel():
+                    fut.set_result(ctx.run(fn, item))
+            except Exception as e:
+                fut.set_exception(e)
+            finally:
+                with self._cond:
+                    self.inflight -= 1
+                    self.admission.release(weight)
+                    self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {"inflight": self.inflight, "queued": self.queue.depth(), "bypassed": self.bypassed,
+                    **self.admission.stats()}
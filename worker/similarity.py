@@ -0,0 +1,66 @@
+# similarity.py — similaridade cosseno de trigramas de caracteres (TF-IDF com hashing) em NumPy
+import zlib
+import unicodedata as _ud
+import numpy as np
+import regex as rx
+
+NGRAM_DIM = 2048  # buckets do hashing de trigramas
+NGRAM_N = 3
+
+def _norm(s) -> str:
+    s = "".join(ch for ch in _ud.normalize("NFD", str(s or "")) if _ud.category(ch) != "Mn")
+    s = rx.sub(r"([a-z0-9])([A-Z])", r"\1 \2", s).replace("_", " ")
+    return rx.sub(r"[^a-z0-9]+", " ", s.lower()).strip()
+
+def _ngram_ids(text: str, n: int = NGRAM_N, dim: int = NGRAM_DIM):
+    # bordas com espaço: início/fim de palavra viram trigramas próprios (" no", "me ")
+    s = f" {_norm(text)} "
+    if len(s) < n:
+        return []
+    return [zlib.crc32(s[i:i + n].encode("utf-8")) % dim for i in range(len(s) - n + 1)]
+
+def tfidf_matrix(texts, dim: int = NGRAM_DIM):
+    """Linhas L2-normalizadas (float32) com TF-IDF dos trigramas de cada texto."""
+    M = np.zeros((len(texts), dim), dtype=np.float32)
+    for r, t in enumerate(texts):
+        ids = _ngram_ids(t, dim=dim)
+        if ids:
+            np.add.at(M[r], ids, 1.0)
+    df = np.count_nonzero(M, axis=0).astype(np.float32)
+    idf = np.log((1.0 + len(texts)) / (1.0 + df)) + 1.0
+    M *= idf[None, :]
+    norms = np.linalg.norm(M, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return M / norms
+
+def cosine_matrix(a_texts, b_texts, dim: int = NGRAM_DIM):
+    """Matriz |a| x |b| de cossenos, com IDF calculado sobre os dois conjuntos juntos."""
+    if not a_texts or not b_texts:
+        return np.zeros((len(a_texts), len(b_texts)), dtype=np.float32)
+    M = tfidf_matrix(list(a_texts) + list(b_texts), dim=dim)
+    A, B = M[:len(a_texts)], M[len(a_texts):]
+    return A @ B.T
+
+def assign_one_to_one(S, thr: float):
+    """
+    Casamento guloso 1-para-1 pela maior pontuação: cada linha e cada coluna são usadas
+    no máximo uma vez e só pares com S >= thr entram. Retorna [(i, j, score)].
+    """
+    if S.size == 0:
+        return []
+    order = np.argsort(-S, axis=None, kind="stable")
+    rows_used = np.zeros(S.shape[0], dtype=bool)
+    cols_used = np.zeros(S.shape[1], dtype=bool)
+    out = []
+    for flat in order:
+        i, j = divmod(int(flat), S.shape[1])
+        score = float(S[i, j])
+        if score < thr:
+            break
+        if rows_used[i] or cols_used[j]:
+            continue
+        rows_used[i] = cols_used[j] = True
+        out.append((i, j, score))
+        if rows_used.all() or cols_used.all():
+            break
+    return out
@@ -0,0 +1,108 @@
+# tables.py — tabelas com grade da página (PyMuPDF find_tables), indexadas pelas palavras da PageWords:
+# chave do schema que casa com cabeçalho de coluna ou rótulo de linha sai direto da célula (sem span/LLM)
+import os
+import numpy as np
+import fitz  # PyMuPDF
+
+from worker.similarity import cosine_matrix, assign_one_to_one
+
+TABLE_STAGE = os.environ.get("TABLE_STAGE", "1") == "1"
+TABLE_MIN_RULES = int(os.environ.get("TABLE_MIN_RULES", "3"))      # traços horizontais E verticais p/ procurar tabela
+TABLE_MATCH_MIN = float(os.environ.get("TABLE_MATCH_MIN", "0.55"))  # cosseno mínimo chave x cabeçalho/rótulo
+
+if hasattr(fitz, "no_recommend_layout"):
+    fitz.no_recommend_layout()  # find_tables imprime uma sugestão de pacote no stdout (quebraria o JSON do CLI)
+
+
+def has_rules(page) -> bool:
+    """Pré-filtro barato (get_cdrawings, ~0,2 ms): find_tables só roda em páginas com grade desenhada."""
+    h = v = 0
+    for d in page.get_cdrawings():
+        for it in d.get("items", ()):
+            if it[0] == "l":
+                (x0, y0), (x1, y1) = it[1], it[2]
+                if abs(y0 - y1) < 1.0:
+                    h += 1
+                elif abs(x0 - x1) < 1.0:
+                    v += 1
+            elif it[0] == "re":
+                h += 2; v += 2
+        if h >= TABLE_MIN_RULES and v >= TABLE_MIN_RULES:
+            return True
+    return False
+
+
+def detect_tables(page, pw) -> list:
+    """
+    Tabelas da página como grades de índices de palavras da PageWords:
+    [{"bbox": (x0, y0, x1, y1), "boxes": [[caixa|None por coluna] por linha], "cells": [[[idx...]]]}].
+    Palavra entra na célula que contém o seu centro. Sem grade (has_rules) = [] sem chamar find_tables.
+    """
+    if not len(pw) or not has_rules(page):
+        return []
+    out = []
+    for tab in page.find_tables(strategy="lines").tables:
+        if tab.row_count < 2 or tab.col_count < 2:
+            continue
+        boxes, cells = [], []
+        for row in tab.rows:
+            boxes.append([tuple(map(float, c)) if c else None for c in row.cells])
+            cells.append([(np.flatnonzero((pw.cx >= c[0]) & (pw.cx <= c[2]) & (pw.cy >= c[1]) & (pw.cy <= c[3]))
+                           .tolist() if c else []) for c in row.cells])
+        out.append({"bbox": tuple(map(float, tab.bbox)), "boxes": boxes, "cells": cells})
+    return out
+
+
+def _mask(pw, idxs):
+    m = np.zeros(len(pw), dtype=bool)
+    m[idxs] = True
+    return m
+
+def _cell_text(pw, idxs) -> str:
+    return " ".join(pw.text[i] for i in pw.reading_order(_mask(pw, idxs), line_tol=3.0)) if idxs else ""
+
+
+def _candidates(pw, tables):
+    """
+    Rótulos possíveis e a célula de valor de cada um: cabeçalho (1ª linha) -> 1ª célula não vazia
+    abaixo na coluna; rótulo de linha (1ª coluna) -> 1ª célula não vazia à direita na linha.
+    """
+    cands = []
+    for tab in tables:
+        cells, boxes = tab["cells"], tab["boxes"]
+        for c, hdr in enumerate(cells[0]):
+            below = next((r for r in range(1, len(cells)) if cells[r][c]), None)
+            if hdr and below is not None:
+                cands.append((hdr, boxes[0][c], cells[below][c], boxes[below][c], "col"))
+        for r in range(1, len(cells)):
+            lbl = cells[r][0]
+            right = next((c for c in range(1, len(cells[r])) if cells[r][c]), None)
+            if lbl and right is not None:
+                cands.append((lbl, boxes[r][0], cells[r][right], boxes[r][right], "row"))
+    return [c for c in cands if any(ch.isalpha() for ch in _cell_text(pw, c[0]))]
+
+
+def resolve_table_fields(pw, tables, keys, key_texts) -> list:
+    """
+    Casa as chaves (key_texts: texto de cada chave, ex. camel_to_words) com cabeçalhos/rótulos das
+    tabelas (cosseno de trigramas, 1-para-1, >= TABLE_MATCH_MIN) e devolve resultados no formato do
+    process_page: label_span/label_bbox = célula do rótulo; tokens/bbox/text = célula do valor.
+    """
+    if not tables or not keys:
+        return []
+    cands = _candidates(pw, tables)
+    if not cands:
+        return []
+    S = cosine_matrix(list(key_texts), [_cell_text(pw, c[0]) for c in cands])
+    out = []
+    for i, j, score in assign_one_to_one(S, TABLE_MATCH_MIN):
+        lbl, lbl_box, val, val_box, kind = cands[j]
+        lbl_bbox = lbl_box or pw.bbox(lbl)
+        out.append({
+            "key": keys[i], "anchor": ((lbl_bbox[0] + lbl_bbox[2]) / 2, (lbl_bbox[1] + lbl_bbox[3]) / 2),
+            "label_span": set(lbl), "label_bbox": lbl_bbox, "gutter": (lbl_bbox[0], lbl_bbox[2]),
+            "origin": f"table:{kind}", "score": round(score, 3),
+            "seed": val[0], "tokens": list(val), "bbox": pw.bbox(val), "text": _cell_text(pw, val),
+            "composed": False, "dir": "down" if kind == "col" else "right",
+        })
+    return out